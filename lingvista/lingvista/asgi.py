@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lingvista.settings')
+# Профиль ASGI: асинхронные view и без постоянных соединений - под ASGI Django
+# открывает соединение на каждый запрос и не переиспользует его (docs/asgi.md)
+os.environ.setdefault('LINGVISTA_ASYNC_VIEWS', '1')
+os.environ.setdefault('LINGVISTA_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
+
+# WAL для SQLite - здесь, а не в каждом соединении (settings.SQLITE_JOURNAL_MODE)
+from lingvista_web.signals import set_journal_mode  # noqa: E402
+
+set_journal_mode()
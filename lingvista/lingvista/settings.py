@@ -42,7 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lingvista_web.metrics.MetricsMiddleware',
+    'lingvista_web.content_cache.ContentVersionMiddleware',  # версия программы - раз на запрос
     'django.middleware.security.SecurityMiddleware',
+    'lingvista_web.assets.StaticFilesMiddleware',  # только при STATIC_PIPELINE
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,13 +56,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'lingvista.urls'
 
+# Кэширующий загрузчик шаблонов и прогрев при старте. В режиме DEBUG Django
+# сам кэширует шаблоны и сбрасывает кэш при автоперезагрузке.
+TEMPLATE_CACHE = os.environ.get('LINGVISTA_TEMPLATE_CACHE', '0' if DEBUG else '1') == '1'
+TEMPLATE_WARMUP = TEMPLATE_CACHE
+PAGE_CACHE_TIMEOUT = 300  # кэш страниц для анонимных пользователей, секунды
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [
-            'lingvista_app/templates'
-        ],
-        'APP_DIRS': True,
+        'DIRS': [],
+        'APP_DIRS': not TEMPLATE_CACHE,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -70,19 +77,72 @@ TEMPLATES = [
         },
     },
 ]
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
 
 WSGI_APPLICATION = 'lingvista.wsgi.application'
+ASGI_APPLICATION = 'lingvista.asgi.application'
+
+# Асинхронные версии частых view; lingvista/asgi.py включает их по умолчанию (docs/asgi.md)
+ASYNC_VIEWS = os.environ.get('LINGVISTA_ASYNC_VIEWS', '0') == '1'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль БД выбирается переменной окружения LINGVISTA_DB: 'sqlite' (по умолчанию) или 'postgres'
+DATABASE_PROFILE = os.environ.get('LINGVISTA_DB', 'sqlite')
+
+if DATABASE_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'lingvista'),
+            'USER': os.environ.get('POSTGRES_USER', 'lingvista'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0,  # при пуле соединений должно быть 0
+            'OPTIONS': {
+                # Пул соединений psycopg (Django 5.1+, нужен пакет psycopg[pool])
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 20)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.environ.get('LINGVISTA_CONN_MAX_AGE', 600)),
+            'OPTIONS': {
+                'timeout': 20,  # секунды ожидания блокировки на уровне драйвера
+                # BEGIN IMMEDIATE: запись берёт блокировку сразу, без ошибок при её повышении
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
+
+# PRAGMA для каждого нового соединения SQLite (lingvista_web/signals.py).
+# Ожидание блокировки задаёт только 'timeout' драйвера выше, busy_timeout здесь не нужен.
+# LINGVISTA_SQLITE_TUNING=0 отключает их, например для сравнения в loadtest_tasks.
+SQLITE_TUNING = os.environ.get('LINGVISTA_SQLITE_TUNING', '1') == '1'
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+} if SQLITE_TUNING else {}
+# Режим журнала хранится в заголовке файла БД, поэтому ставится один раз при старте
+# сервера (wsgi.py, asgi.py, loadtest_tasks), а не в каждом соединении manage.py
+SQLITE_JOURNAL_MODE = 'WAL' if SQLITE_TUNING else None
 
 
 # Password validation
@@ -111,6 +171,9 @@ LANGUAGE_CODE = 'en-us'
 
 TIME_ZONE = 'UTC'
 
+# Часовой пояс, в котором считаются сутки для серий (ActivityDay, rollover_streaks)
+STREAK_TIME_ZONE = os.environ.get('LINGVISTA_STREAK_TIME_ZONE', TIME_ZONE)
+
 USE_I18N = True
 
 USE_TZ = True
@@ -124,6 +187,27 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     (BASE_DIR / 'lingvista_web' / 'static').as_posix(),
 ]
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Продакшен-статика (lingvista_web/assets.py): хэшированные имена, бандлы CSS, .gz/.br
+# при collectstatic и отдача из STATIC_ROOT с Cache-Control immutable.
+# Для .br нужен пакет brotli. По умолчанию включено при DEBUG = False.
+STATIC_PIPELINE = os.environ.get('LINGVISTA_STATIC_PIPELINE', '0' if DEBUG else '1') == '1'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'lingvista_web.assets.PipelineStaticFilesStorage' if STATIC_PIPELINE
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Бандлы CSS для тега {% css_bundle %}, порядок файлов = порядок каскада
+STATIC_BUNDLES = {
+    'base': ['css/base.css', 'css/navbar.css', 'css/footer.css'],
+    'main_page': ['css/base.css', 'css/navbar.css', 'css/footer.css', 'css/main_page.css'],
+    'langlevel_page': ['css/base.css', 'css/navbar.css', 'css/footer.css', 'css/langlevel_page.css'],
+    'account_page': ['css/base.css', 'css/navbar.css', 'css/footer.css', 'css/account_page.css'],
+}
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -134,8 +218,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'  # Имя URL для страницы входа
 
+# Хранение сессий, переменная LINGVISTA_SESSIONS: 'cached_db' (по умолчанию) - кэш с записью в БД,
+# 'db' - только БД, 'signed_cookies' - подписанная cookie без обращений к серверному хранилищу
+SESSION_PROFILE = os.environ.get('LINGVISTA_SESSIONS', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_PROFILE]
+SESSION_SAVE_EVERY_REQUEST = False  # сессия пишется только при изменении
+
+# Общий для всех процессов кэш, переменная LINGVISTA_CACHE_URL: redis://host:6379/0 (нужен пакет redis)
+# или memcached://host:11211 (нужен пакет pymemcache). Без неё у каждого процесса свой locmem-кэш
+CACHE_URL = os.environ.get('LINGVISTA_CACHE_URL')
+SHARED_CACHE = bool(CACHE_URL)
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache'
+            if CACHE_URL.startswith('memcached://') else 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL.removeprefix('memcached://'),
+        }
+    }
+
+# request.user с профилем берётся из кэша (lingvista_web/auth.py). Только при общем кэше:
+# сброс записи при смене пароля или is_active должен быть виден всем процессам. None - без кэша
+AUTHENTICATION_BACKENDS = ['lingvista_web.auth.CachedModelBackend']
+AUTH_USER_CACHE_ALIAS = 'default' if SHARED_CACHE else None
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Кэш учебного контента (lingvista_web/content_cache.py); версия программы общая, в БД (ContentVersion)
+CONTENT_CACHE = {
+    'BACKEND': os.environ.get('LINGVISTA_CONTENT_CACHE', 'lru'),  # 'lru' или 'django'
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 512,
+}
+
+# Готовые страницы пользователей для conditional_page (lingvista_web/conditional.py):
+# LRU в памяти процесса, MAX_ENTRIES ограничивает память. LINGVISTA_USER_PAGE_CACHE=0 отключает
+USER_PAGE_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': int(os.environ.get('LINGVISTA_USER_PAGE_CACHE_SIZE', 256)),
+} if os.environ.get('LINGVISTA_USER_PAGE_CACHE', '1') == '1' else None
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
-if not DEBUG:
-    from django.conf.urls.static import static
-    urlpatterns += static(MEDIA_URL, document_root=MEDIA_ROOT)
+
+# Отдача аудио через lingvista_web/media.py: None - Django, 'sendfile' - X-Sendfile,
+# 'accel' - X-Accel-Redirect для nginx (см. docs/nginx-media.conf)
+MEDIA_OFFLOAD = os.environ.get('LINGVISTA_MEDIA_OFFLOAD') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Метрики запросов (lingvista_web/metrics.py), отдаются на /metrics персоналу и по токену
+# (Authorization: Bearer $LINGVISTA_METRICS_TOKEN). METRICS_ALLOWED_IPS - только без обратного
+# прокси: за ним все запросы приходят с 127.0.0.1 (в docs/nginx-media.conf /metrics закрыт)
+METRICS_TOKEN = os.environ.get('LINGVISTA_METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = []
+METRICS_SLOW_REQUEST_MS = 500
+METRICS_TRACE_SAMPLE_RATE = 0.01
+METRICS_N_PLUS_ONE_THRESHOLD = 5  # одинаковых SQL за запрос
+
+# Пул процессов для обработки загрузок (lingvista_web/workers.py)
+BACKGROUND_WORKERS = 2
+
+# Фоновое сжатие загруженного аудио (lingvista_web/transcoding.py), нужен ffmpeg.
+# По умолчанию выключено; без FFMPEG_BINARY в PATH задачи не ставятся, даже если включено
+AUDIO_TRANSCODING = os.environ.get('LINGVISTA_AUDIO_TRANSCODING', '0') == '1'
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
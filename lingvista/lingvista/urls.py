@@ -1,28 +1,38 @@
 from django.contrib import admin
 from django.urls import path
-from lingvista_web import views
+from lingvista_web import async_views, views
+from lingvista_web.metrics import metrics_view
 from django.contrib.auth import views as auth_views
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Под ASGI частые страницы обслуживаются асинхронными версиями (lingvista_web/async_views.py)
+hot_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.main_page, name='main_page'),
-    path('tasks_lesson<str:lesson>/', views.tasks_view, name='tasks'),
+    path('<str:level>_lessons_page/tasks_lesson<int:lesson>/', hot_views.tasks_view, name='tasks'),
     path('login_page/', views.login_view, name='login'),
     path('registry_page/', views.register_view, name='register'),
-    path('langlevel_page/', views.langlevel_view, name='langlevel'),
-    path('account_page/', views.profile_view, name='profile_view'),
+    path('langlevel_page/', hot_views.langlevel_view, name='langlevel'),
+    path('account_page/', hot_views.profile_view, name='profile_view'),
     path('logout/', auth_views.LogoutView.as_view(next_page='main_page'), name='logout'),
     path('password_reset/', auth_views.PasswordResetView.as_view(template_name='registration/password_reset_form.html'), name='password_reset'),
     path('password_reset/done/', auth_views.PasswordResetDoneView.as_view(template_name='registration/password_reset_done.html'), name='password_reset_done'),
     path('reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(template_name='registration/password_reset_confirm.html'), name='password_reset_confirm'),
     path('reset/done/', auth_views.PasswordResetCompleteView.as_view(template_name='registration/password_reset_complete.html'), name='password_reset_complete'),
     path('accountedit_page/', views.edit_profile, name='edit_profile'),
-    path('<str:level>_lessons_page/', views.lessons_view, name='lessons'),
+    path('<str:level>_lessons_page/', hot_views.lessons_view, name='lessons'),
     path('profile/', views.profile, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
-    path('profile/history/', views.profile_history, name='profile_history'),
+    path('audio/<int:pk>/', hot_views.audio_view, name='audio'),
+    path('metrics', metrics_view, name='metrics'),
+    path('search/', views.search_api, name='search'),
+    path('analytics/api/', views.analytics_api, name='analytics_api'),
+    path('profile/history/', hot_views.profile_history, name='profile_history'),
+    path('profile/history/api/', hot_views.profile_history_api, name='profile_history_api'),
+    path('profile/history/export/', hot_views.profile_history_export, name='profile_history_export'),
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lingvista.settings')
 
 application = get_wsgi_application()
+
+# WAL для SQLite - здесь, а не в каждом соединении (settings.SQLITE_JOURNAL_MODE)
+from lingvista_web.signals import set_journal_mode  # noqa: E402
+
+set_journal_mode()
@@ -1,8 +1,196 @@
-from django.contrib import admin
-from .models import LanguageLevel, Lesson, Task, UserTasksProgress, Profile
-
-admin.site.register(LanguageLevel)
-admin.site.register(Lesson)
-admin.site.register(Task)
-admin.site.register(UserTasksProgress)
-admin.site.register(Profile)
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+from .analytics import recompute
+from .models import (
+    Achievement, Audio, LanguageLevel, Lesson, LessonStats, Profile, ProgressSnapshot, Task, TaskStats,
+    UserProgress, UserTasksProgress,
+)
+
+COUNT_LIMIT = 10000  # дальше строки в списке не считаются
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimate_rows(model):
+    """Примерное число строк таблицы без COUNT(*)."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    # SQLite: максимальный id берётся из индекса первичного ключа; удалённые строки не вычитаются
+    return model.objects.aggregate(high=Max('pk'))['high'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц: без фильтров - оценка размера, с фильтрами - COUNT до COUNT_LIMIT."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return queryset[:COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # второй COUNT(*) по всей таблице
+    list_per_page = 50
+    ordering = ('-pk',)
+    sortable_by = ()  # сортировка по неиндексированным колонкам на миллионах строк - полный проход
+
+
+class LevelFilter(admin.SimpleListFilter):
+    # Варианты из LEVEL_CHOICES, а не SELECT DISTINCT по всей таблице
+    title = 'уровень'
+    parameter_name = 'level'
+
+    def lookups(self, request, model_admin):
+        return LanguageLevel.LEVEL_CHOICES
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(level=self.value())
+        return queryset
+
+
+def _invalidate_snapshots(user_ids):
+    # Снимки пересоберутся при следующем обращении (progress.get_snapshot)
+    return ProgressSnapshot.objects.filter(user_id__in=user_ids).delete()[0]
+
+
+@admin.register(LanguageLevel)
+class LanguageLevelAdmin(admin.ModelAdmin):
+    list_display = ('level', 'description')
+    ordering = ('level',)
+
+
+@admin.register(Lesson)
+class LessonAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'language_level', 'lesson_number', 'title')
+    list_select_related = ('language_level',)
+    list_filter = ('language_level',)
+    search_fields = ('title',)
+    ordering = ('language_level__level', 'lesson_number')
+    actions = ['reset_progress']
+
+    @admin.action(description='Сбросить прогресс пользователей по выбранным урокам')
+    @transaction.atomic
+    def reset_progress(self, request, queryset):
+        deleted = 0
+        lessons = list(queryset.values_list('language_level__level', 'lesson_number'))
+        for level, number in lessons:
+            progress = UserTasksProgress.objects.filter(level=level, lesson=number)
+            _invalidate_snapshots(progress.values('user_id'))
+            deleted += progress.delete()[0]
+        UserProgress.objects.filter(task__lesson__in=queryset).delete()
+        recompute(lessons=lessons)
+        self.message_user(request, f'Удалено результатов уроков: {deleted}', messages.SUCCESS)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'lesson', 'position', 'question', 'audio', 'correct_rate')
+    list_select_related = ('lesson__language_level', 'audio', 'stats')
+    list_filter = ('lesson__language_level',)
+    autocomplete_fields = ('lesson',)
+    raw_id_fields = ('audio',)
+    search_fields = ('question',)
+
+    @admin.display(description='верных ответов, %')
+    def correct_rate(self, obj):
+        stats = getattr(obj, 'stats', None)  # без строки счётчиков - задание ещё не решали
+        return stats.correct_rate if stats else None
+
+
+@admin.register(Audio)
+class AudioAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'audio_file', 'duration')
+    search_fields = ('title',)
+    readonly_fields = ('renditions', 'duration', 'peaks')
+
+
+@admin.register(UserTasksProgress)
+class UserTasksProgressAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'level', 'lesson', 'result', 'date_completed')
+    list_select_related = ('user',)
+    list_filter = (LevelFilter,)  # индекс (level, lesson)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)
+    actions = ['reset_progress']
+
+    @admin.action(description='Сбросить выбранные результаты')
+    @transaction.atomic
+    def reset_progress(self, request, queryset):
+        # Работает и с «выбрать все» по фильтру: один DELETE без загрузки строк
+        _invalidate_snapshots(queryset.values('user_id'))
+        lessons = list(queryset.order_by().values_list('level', 'lesson').distinct())
+        deleted = queryset.delete()[0]
+        recompute(lessons=lessons)
+        self.message_user(request, f'Удалено результатов: {deleted}', messages.SUCCESS)
+
+
+@admin.register(UserProgress)
+class UserProgressAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'task', 'completed', 'date_completed')
+    list_select_related = ('user', 'task__lesson')
+    list_filter = ('completed',)
+    raw_id_fields = ('user', 'task')
+    search_fields = ('=user__username',)
+
+
+class AchievementInline(admin.TabularInline):
+    model = Achievement
+    extra = 0
+    readonly_fields = ('date_earned',)
+
+
+@admin.register(Profile)
+class ProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'language_level', 'streak', 'completed_levels')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)
+    readonly_fields = ('photo_thumbnails', 'streak_date')
+    inlines = [AchievementInline]
+    actions = ['reset_streak']
+
+    @admin.action(description='Обнулить серию')
+    def reset_streak(self, request, queryset):
+        updated = queryset.reset_streak()
+        self.message_user(request, f'Серия обнулена у {updated} профилей', messages.SUCCESS)
+
+
+class StatsAdmin(admin.ModelAdmin):
+    # Счётчики ведёт record_result, руками их не правят
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TaskStats)
+class TaskStatsAdmin(StatsAdmin):
+    list_display = ('task', 'attempts', 'correct', 'correct_rate')
+    list_select_related = ('task__lesson__language_level',)
+    list_filter = ('task__lesson__language_level',)
+    ordering = ('correct',)
+    raw_id_fields = ('task',)
+
+
+@admin.register(LessonStats)
+class LessonStatsAdmin(StatsAdmin):
+    list_display = ('level', 'lesson', 'attempts', 'average', 'histogram')
+    list_filter = (LevelFilter,)
+    ordering = ('level', 'lesson')
+
+    @admin.display(description='распределение по 10%')
+    def histogram(self, obj):
+        return ' '.join(str(count) for count in obj.get_histogram())
@@ -0,0 +1,102 @@
+"""Счётчики для авторов контента: доля верных ответов по заданиям и распределение результатов уроков.
+
+TaskStats и LessonStats обновляются в record_result одним UPDATE с F()-выражениями,
+поэтому параллельные отправки не теряют приращений, а отчёты не трогают таблицы прогресса.
+Счётчики повторяют сырые данные: UserProgress хранит последнюю попытку пользователя
+по заданию, UserTasksProgress - лучший результат урока. Поэтому повторная попытка
+не увеличивает attempts, а переносит пользователя между correct/не correct или между
+корзинами, и команда recompute_analytics получает из сырых строк те же числа.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+
+from .models import LessonStats, TaskStats, UserProgress, UserTasksProgress
+
+CHUNK_SIZE = 2000
+
+
+def _delta(ids_plus, ids_minus=()):
+    whens = [When(pk__in=ids, then=Value(step)) for ids, step in ((ids_plus, 1), (ids_minus, -1)) if ids]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def record_tasks(previous, tasks):
+    """previous - {task_id: completed} до этой отправки, tasks - проверенные задания (с is_correct)."""
+    new = [task.id for task in tasks if task.id not in previous]
+    gained = [task.id for task in tasks if task.is_correct and not previous.get(task.id, False)]
+    lost = [task.id for task in tasks if not task.is_correct and previous.get(task.id, False)]
+    if not (new or gained or lost):
+        return
+    if new:
+        TaskStats.objects.bulk_create([TaskStats(task_id=task_id) for task_id in new], ignore_conflicts=True)
+    TaskStats.objects.filter(pk__in={*new, *gained, *lost}).update(
+        attempts=F('attempts') + _delta(new),
+        correct=F('correct') + _delta(gained, lost),
+    )
+
+
+def record_lesson(level, lesson, previous_best, best):
+    """previous_best - лучший результат до отправки или None, если урок решается впервые."""
+    if previous_best == best:
+        return
+    changes = {'score_sum': F('score_sum') + (best - (previous_best or 0))}
+    if previous_best is None:
+        LessonStats.objects.bulk_create([LessonStats(level=level, lesson=lesson)], ignore_conflicts=True)
+        changes['attempts'] = F('attempts') + 1
+    new_bucket = LessonStats.bucket_field(best)
+    old_bucket = None if previous_best is None else LessonStats.bucket_field(previous_best)
+    if new_bucket != old_bucket:
+        changes[new_bucket] = F(new_bucket) + 1
+        if old_bucket:
+            changes[old_bucket] = F(old_bucket) - 1
+    LessonStats.objects.filter(level=level, lesson=lesson).update(**changes)
+
+
+def _bucket_counts():
+    counts = {}
+    for i in range(LessonStats.BUCKETS):
+        condition = Q(result__gte=i * 10)
+        if i < LessonStats.BUCKETS - 1:
+            condition &= Q(result__lt=(i + 1) * 10)
+        counts[f'bucket_{i}'] = Count('id', filter=condition)
+    return counts
+
+
+def recompute(lessons=None, chunk_size=CHUNK_SIZE):
+    """Пересобирает счётчики из UserProgress и UserTasksProgress; возвращает (заданий, уроков).
+
+    lessons - пары (level, lesson), если пересчитать нужно только их (сброс прогресса в админке).
+    """
+    task_filter, lesson_filter = Q(), Q()
+    if lessons is not None:
+        lessons = set(lessons)
+        if not lessons:
+            return 0, 0
+        for level, number in lessons:
+            task_filter |= Q(task__lesson__language_level__level=level, task__lesson__lesson_number=number)
+            lesson_filter |= Q(level=level, lesson=number)
+
+    with transaction.atomic():
+        TaskStats.objects.filter(task_filter).delete()
+        task_rows = UserProgress.objects.filter(task_filter).values('task_id').annotate(
+            attempts=Count('id'), correct=Count('id', filter=Q(completed=True)),
+        ).order_by()
+        tasks = _insert(TaskStats, task_rows, chunk_size)
+
+        LessonStats.objects.filter(lesson_filter).delete()
+        lesson_rows = UserTasksProgress.objects.filter(lesson_filter).values('level', 'lesson').annotate(
+            attempts=Count('id'), score_sum=Sum('result'), **_bucket_counts(),
+        ).order_by()
+        lessons = _insert(LessonStats, lesson_rows, chunk_size)
+    return tasks, lessons
+
+
+def _insert(model, rows, chunk_size):
+    count, chunk = 0, []
+    for row in rows.iterator(chunk_size):
+        chunk.append(model(**row))
+        if len(chunk) >= chunk_size:
+            model.objects.bulk_create(chunk)
+            count, chunk = count + len(chunk), []
+    model.objects.bulk_create(chunk)
+    return count + len(chunk)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class LingvistaWebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lingvista_web'
+
+    def ready(self):
+        from . import assets, signals  # noqa: F401
+        from django.conf import settings
+
+        if getattr(settings, 'TEMPLATE_WARMUP', False):
+            from .rendering import warm_up_templates
+            warm_up_templates()
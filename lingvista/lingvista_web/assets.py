@@ -0,0 +1,235 @@
+"""Сборка и отдача статики в продакшене (settings.STATIC_PIPELINE).
+
+collectstatic с PipelineStaticFilesStorage:
+    1. склеивает и минифицирует CSS из settings.STATIC_BUNDLES
+       (в шаблонах - тег {% css_bundle %}, templatetags/assets.py);
+    2. даёт всем файлам имена с хэшем содержимого (ManifestStaticFilesStorage);
+    3. рядом с хэшированными файлами кладёт .gz и .br (если установлен brotli).
+
+StaticFilesMiddleware отдаёт файлы из STATIC_ROOT без view и без БД:
+хэшированные - с Cache-Control immutable на год, сжатый вариант выбирается
+по Accept-Encoding. Список файлов читается один раз при старте процесса.
+
+Ссылки на статику мимо {% static %} и ссылки на несуществующие файлы
+ломают сборку: check_static_references - системная проверка с тегом
+staticfiles, её запускает collectstatic.
+"""
+import gzip
+import json
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core import checks
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+from .media import CHUNK_SIZE, _not_modified, file_etag
+from .rendering import iter_template_files
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, тогда только gzip
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml')
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+DEFAULT_MAX_AGE = 60
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+['"]([^'"]+)['"]""")
+BUNDLE_TAG_RE = re.compile(r"""{%\s*css_bundle\s+['"]([^'"]+)['"]""")
+
+
+def bundle_name(name):
+    return f'css/{name}.bundle.css'
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+class PipelineStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = dict(paths)
+        for name in self.write_bundles(paths):
+            paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run, **options)
+        for name in set(self.hashed_files.values()):
+            self.compress(name)
+
+    def write_bundles(self, paths):
+        for name, sources in getattr(settings, 'STATIC_BUNDLES', {}).items():
+            parts = []
+            for source in sources:
+                storage, path = paths[source]
+                with storage.open(path) as file:
+                    parts.append(file.read().decode('utf-8'))
+            output = bundle_name(name)
+            if self.exists(output):
+                self.delete(output)
+            self._save(output, ContentFile(minify_css('\n'.join(parts)).encode('utf-8')))
+            yield output
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(content) * 0.95:  # иначе сжатие не окупается
+                with open(path + suffix, 'wb') as file:
+                    file.write(compressed)
+
+
+def parse_accept_encoding(header):
+    """Accept-Encoding -> {кодировка: q}; q=0 означает «нельзя», '*' - все не перечисленные."""
+    qualities = {}
+    for item in header.split(','):
+        token, *params = item.split(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[token] = quality
+    return qualities
+
+
+class StaticFilesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'STATIC_PIPELINE', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.files = self.scan(str(settings.STATIC_ROOT))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def scan(self, root):
+        immutable = set()
+        manifest = os.path.join(root, ManifestStaticFilesStorage.manifest_name)
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as file:
+                immutable = set(json.load(file).get('paths', {}).values())
+
+        files = {}
+        for directory, _, names in os.walk(root):
+            for filename in names:
+                if filename.endswith(('.gz', '.br')):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                encodings = [
+                    (encoding, path + suffix) for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)
+                ]
+                files[name] = (path, encodings, name in immutable)
+        return files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        entry = self.find(request)
+        if entry is not None:
+            return self.serve(request, *entry)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        entry = self.find(request)
+        if entry is not None:
+            return self.serve(request, *entry)  # файл читается ASGI-обработчиком в потоке
+        return await self.get_response(request)
+
+    def find(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            return self.files.get(request.path_info[len(self.prefix):])
+        return None
+
+    def serve(self, request, path, encodings, immutable):
+        qualities = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+        encoding, file_path = next(
+            (
+                (encoding, variant) for encoding, variant in encodings
+                if qualities.get(encoding, qualities.get('*', 0)) > 0
+            ),
+            (None, path),
+        )
+        stat = os.stat(file_path)
+        etag = file_etag(stat)
+
+        if _not_modified(request, etag, stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+            response.block_size = CHUNK_SIZE
+            if encoding:
+                response['Content-Encoding'] = encoding
+            del response['Content-Disposition']  # FileResponse ставит его по имени файла
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encodings:
+            response['Vary'] = 'Accept-Encoding'
+        if immutable:
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={DEFAULT_MAX_AGE}'
+        return response
+
+
+def find_static_problems(text):
+    """Ссылки мимо {% static %} и ссылки на файлы, которых нет среди статики."""
+    problems = []
+    bypass = re.compile(r"""(?:href|src)\s*=\s*['"]%s""" % re.escape(settings.STATIC_URL))
+    for match in bypass.finditer(text):
+        problems.append(f'ссылка мимо {{% static %}}: {text[match.start():text.find(">", match.start())]}')
+    for name in STATIC_TAG_RE.findall(text):
+        if not finders.find(name):
+            problems.append(f'нет файла статики {name}')
+    bundles = getattr(settings, 'STATIC_BUNDLES', {})
+    for name in BUNDLE_TAG_RE.findall(text):
+        if name not in bundles:
+            problems.append(f'нет бандла {name} в STATIC_BUNDLES')
+    return problems
+
+
+@checks.register(checks.Tags.staticfiles, checks.Tags.templates)
+def check_static_references(app_configs=None, **kwargs):
+    errors = []
+    for name, sources in getattr(settings, 'STATIC_BUNDLES', {}).items():
+        for source in sources:
+            if not finders.find(source):
+                errors.append(checks.Error(f'Бандл {name}: нет файла {source}', id='lingvista_web.E001'))
+    for template_name, path in iter_template_files():
+        for problem in find_static_problems(path.read_text(encoding='utf-8')):
+            errors.append(checks.Error(f'{template_name}: {problem}', id='lingvista_web.E002'))
+    return errors
@@ -0,0 +1,161 @@
+"""Асинхронные версии частых view для запуска под ASGI (settings.ASYNC_VIEWS, docs/asgi.md).
+
+Запросы к БД - через async-методы ORM (afirst, aget, aget_or_create, async for,
+aiterator). Запись результата урока идёт одной транзакцией с select_for_update,
+а транзакции в async-коде Django не поддерживает, поэтому record_result
+вызывается через sync_to_async. Так же - кэш контента (при промахе он читает БД)
+и рендеринг шаблонов, которые могут лениво обращаться к связанным объектам.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_safe
+
+from .conditional import conditional_page
+from .content_cache import get_lessons, get_tasks
+from .forms import HistoryFilterForm
+from .grading import collect_answers, grade
+from .history import ahistory_page, aiter_csv, aiter_json, history_queryset
+from .media import serve_file
+from .models import Audio, LanguageLevel, Profile
+from .progress import LEVEL_ORDER, PASS_RESULT, aget_snapshot, record_result
+from .views import RECENT_HISTORY_SIZE
+
+arender = sync_to_async(render)
+
+
+async def tasks_view(request, level, lesson):
+    if level.upper() not in LEVEL_ORDER:
+        raise Http404('Уровень не найден')
+    tasks = await sync_to_async(get_tasks)(level.upper(), lesson)
+    context = {
+        'level': level,
+        'lesson': lesson,
+        'tasks': tasks,
+    }
+    if request.method == 'POST':
+        if not tasks:
+            raise Http404('Урок не найден')
+        score, correct_count = grade(tasks, collect_answers(tasks, request.POST))
+        user = await request.auser()
+        if user.is_authenticated:
+            await sync_to_async(record_result)(user, level.upper(), lesson, score, tasks)
+        context.update({
+            'show_answers': True,
+            'score': score,
+            'correct_count': correct_count,
+        })
+    return await arender(request, 'html/pages/tasks_page.html', context)
+
+
+@login_required
+@conditional_page('langlevel')
+async def langlevel_view(request):
+    snapshot = await aget_snapshot(await request.auser())
+    levels_data = [
+        {
+            'level': level,
+            'is_completed': level.level in snapshot.completed_levels,
+            'is_unlocked': level.level in snapshot.unlocked_levels,
+        }
+        async for level in LanguageLevel.objects.order_by('level')
+    ]
+    return await arender(request, 'html/pages/langlevel_page.html', {'levels_data': levels_data})
+
+
+@login_required
+@conditional_page('lessons')
+async def lessons_view(request, level):
+    level = level.upper()
+    snapshot = await aget_snapshot(await request.auser())
+    lessons_data = []
+    for lesson in await sync_to_async(get_lessons)(level):
+        score = snapshot.get_score(level, lesson.lesson_number)
+        lessons_data.append({
+            'lesson': lesson,
+            'score': score,
+            'is_completed': score >= PASS_RESULT,
+        })
+    return await arender(request, 'html/pages/lessons_page.html', {'level': level, 'lessons_data': lessons_data})
+
+
+@login_required
+@conditional_page('account')
+async def profile_view(request):
+    user = await request.auser()
+    profile, created = await Profile.objects.aget_or_create(user=user)
+    task_progress, next_cursor = await ahistory_page(history_queryset(user), limit=RECENT_HISTORY_SIZE)
+    return await arender(request, 'html/pages/account_page.html', {
+        'profile': profile,
+        'task_progress': task_progress,
+        'has_more_history': next_cursor is not None,
+    })
+
+
+async def _filtered_history(request):
+    form = HistoryFilterForm(request.GET)
+    if not form.is_valid():
+        return form, None
+    data = form.cleaned_data
+    return form, history_queryset(await request.auser(), data['level'], data['date_from'], data['date_to'])
+
+
+@login_required
+async def profile_history(request):
+    form, queryset = await _filtered_history(request)
+    rows, next_cursor = [], None
+    if queryset is not None:
+        try:
+            rows, next_cursor = await ahistory_page(queryset, form.cleaned_data['cursor'])
+        except ValueError:
+            return HttpResponseBadRequest('Некорректный курсор')
+    query = request.GET.copy()
+    query['cursor'] = next_cursor or ''
+    return await arender(request, 'html/pages/profile_history.html', {
+        'form': form,
+        'history': rows,
+        'next_query': query.urlencode() if next_cursor else None,
+    })
+
+
+@login_required
+async def profile_history_api(request):
+    form, queryset = await _filtered_history(request)
+    if queryset is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        rows, next_cursor = await ahistory_page(queryset, form.cleaned_data['cursor'])
+    except ValueError as exc:
+        return JsonResponse({'errors': {'cursor': [str(exc)]}}, status=400)
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
+
+
+@login_required
+async def profile_history_export(request):
+    form, queryset = await _filtered_history(request)
+    if queryset is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    if form.cleaned_data['format'] == 'json':
+        response = StreamingHttpResponse(aiter_json(queryset), content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename="history.json"'
+    else:
+        response = StreamingHttpResponse(aiter_csv(queryset), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="history.csv"'
+    return response
+
+
+@require_safe  # HEAD - плееры проверяют размер и Accept-Ranges
+async def audio_view(request, pk):
+    try:
+        audio = await Audio.objects.aget(pk=pk)
+    except Audio.DoesNotExist:
+        raise Http404('Аудио не найдено')
+    rendition = audio.get_renditions().get(request.GET.get('rendition', ''))
+    if rendition:
+        return serve_file(request, rendition['name'], asynchronous=True)
+    if audio.audio_file:
+        return serve_file(request, audio.audio_file.name, asynchronous=True)
+    if audio.audio_url:
+        return redirect(audio.audio_url)
+    raise Http404('Аудиофайл не найден')
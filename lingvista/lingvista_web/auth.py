@@ -0,0 +1,60 @@
+"""Кэш request.user.
+
+AuthenticationMiddleware на каждом запросе вызывает backend.get_user(id).
+CachedModelBackend берёт пользователя вместе с профилем (для navbar) из
+кэша, а сигналы (signals.py) удаляют запись при сохранении User или
+Profile - смена пароля меняет хэш сессии, и старые сессии сбрасываются как
+обычно. Массовые UPDATE профилей сигналов не шлют, поэтому запись ещё и
+живёт не дольше AUTH_USER_CACHE_TIMEOUT.
+
+Удаление записи должны видеть все процессы, поэтому кэш включается только
+с общим кэшем (settings.SHARED_CACHE); при AUTH_USER_CACHE_ALIAS = None
+бэкенд работает как обычный ModelBackend.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Profile
+
+
+def _cache():
+    alias = getattr(settings, 'AUTH_USER_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def _key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        cache = _cache()
+        if cache is None:
+            return super().get_user(user_id)
+        user = cache.get(_key(user_id))
+        if user is not None:
+            return user if self.user_can_authenticate(user) else None
+        user = super().get_user(user_id)
+        if user is None:
+            return None
+        try:
+            user.profile  # попадёт в кэш вместе с пользователем
+        except Profile.DoesNotExist:
+            pass
+        cache.set(_key(user_id), user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        return user
+
+
+def invalidate_user(user_id):
+    cache = _cache()
+    if cache is None:
+        return
+    # И сразу, и после коммита: иначе параллельный запрос может закэшировать старую строку
+    cache.delete(_key(user_id))
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk if sender is not Profile else instance.user_id)
@@ -0,0 +1,190 @@
+"""Условный GET для страниц, которые зависят только от прогресса пользователя и программы.
+
+Валидатор страницы - время последнего изменения прогресса (ProgressSnapshot.updated_at)
+и профиля (Profile.updated_at), версия программы (ContentVersion, см. content_cache)
+и отпечаток шаблонов и манифеста статики (новый релиз - новые ETag).
+Из БД читается одна строка, после чего condition() из Django отвечает 304
+без рендера страницы. Last-Modified эти страницы не отдают: по одному времени
+нельзя заметить новый релиз или новый CSRF-секрет, и If-Modified-Since
+вернул бы 304 со старой страницей или токеном.
+
+Дополнительно готовая страница кэшируется на сервере по пользователю (settings.USER_PAGE_CACHE):
+LRU с ограниченным числом записей; запись действительна, пока совпадает валидатор.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.db.models import Subquery
+from django.db.models.functions import Now
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import content_cache
+from .models import ContentVersion, Profile
+from .rendering import iter_template_files
+
+_page_cache = None
+_release = None
+
+
+def release_fingerprint():
+    """Отпечаток шаблонов и манифеста статики; в DEBUG пересчитывается на каждый запрос."""
+    global _release
+    if _release is not None and not settings.DEBUG:
+        return _release
+    paths = [path for _, path in iter_template_files()]
+    if settings.STATIC_ROOT:
+        paths.append(os.path.join(settings.STATIC_ROOT, ManifestStaticFilesStorage.manifest_name))
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+    _release = digest.hexdigest()[:16]
+    return _release
+
+
+def get_page_cache():
+    global _page_cache
+    config = getattr(settings, 'USER_PAGE_CACHE', None)
+    if not config:
+        return None
+    if _page_cache is None:
+        _page_cache = content_cache.BACKENDS[config.get('BACKEND', 'lru')](
+            alias=config.get('ALIAS', 'default'),
+            max_entries=config.get('MAX_ENTRIES', 256),
+            timeout=config.get('TIMEOUT', 300),
+        )
+    return _page_cache
+
+
+def reset_page_cache():
+    global _page_cache
+    _page_cache = None
+
+
+def touch_profile(sender, instance, **kwargs):
+    # Страница аккаунта показывает поля User (username, email): их правка тоже меняет валидатор
+    Profile.objects.filter(user_id=instance.pk).update(updated_at=Now())
+
+
+def get_stamps(user):
+    """(изменение прогресса или профиля, версия программы); None - профиля ещё нет.
+
+    Всё одним запросом: версия программы общая для процессов и лежит в БД (content_cache.py).
+    """
+    content = ContentVersion.objects.filter(pk=content_cache.VERSION_PK)
+    row = Profile.objects.filter(user_id=user.pk).values_list(
+        'updated_at', 'user__progress_snapshot__updated_at', Subquery(content.values('version')),
+    ).first()
+    if row is None:
+        return None
+    profile_changed_at, snapshot_changed_at, version = row
+    content_cache.remember_version(version)  # кэш контента в этом запросе не перечитывает версию
+    changed_at = max(stamp for stamp in (profile_changed_at, snapshot_changed_at) if stamp is not None)
+    return changed_at, version
+
+
+def get_etag(request, page):
+    """ETag страницы для текущего пользователя или None, если кэшировать нельзя."""
+    if hasattr(request, '_page_etag'):
+        return request._page_etag
+    request._page_etag = None
+
+    csrf_secret = request.META.get('CSRF_COOKIE')
+    if (
+        request.method not in ('GET', 'HEAD')
+        or not request.user.is_authenticated
+        or not csrf_secret  # секрет появится только при рендере, а страница с токеном от него зависит
+    ):
+        return request._page_etag
+
+    stamps = get_stamps(request.user)
+    if stamps is None or stamps[1] is None:
+        return request._page_etag
+    changed_at, version = stamps
+    parts = (
+        page, request.get_full_path(), request.user.pk, changed_at.timestamp(),
+        version, release_fingerprint(),
+        csrf_secret,  # страница содержит CSRF-токен; после входа секрет меняется
+    )
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+    # Слабый ETag: маскированный CSRF-токен делает страницы равнозначными, но не побайтно равными
+    request._page_etag = f'W/"{digest}"'
+    return request._page_etag
+
+
+def _cache_key(request, page):
+    return f'user-page:{request.user.pk}:{page}:{request.get_full_path()}'
+
+
+def _cached_response(request, page, etag):
+    cache = get_page_cache()
+    if cache is None or etag is None:
+        return None
+    entry = cache.get(_cache_key(request, page))
+    if entry is None or entry[0] != etag:
+        return None
+    return HttpResponse(entry[1], content_type=entry[2])
+
+
+def _store_response(request, page, etag, response):
+    cache = get_page_cache()
+    if cache is None or etag is None or response.status_code != 200 or response.streaming or response.cookies:
+        return
+    cache.set(_cache_key(request, page), (etag, response.content, response['Content-Type']))
+
+
+def conditional_page(page):
+    """ETag и 304 для страницы пользователя; работает с sync- и async-view."""
+    def decorator(view):
+        def etag_func(request, *args, **kwargs):
+            return get_etag(request, page)
+
+        def finish(request, response):
+            if get_etag(request, page) is not None:
+                # Страница личная: прокси не хранят, браузер каждый раз переспрашивает
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        if iscoroutinefunction(view):
+            async def render(request, *args, **kwargs):
+                etag = request._page_etag
+                cached = await sync_to_async(_cached_response)(request, page, etag)
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                await sync_to_async(_store_response)(request, page, etag, response)
+                return response
+
+            conditional_view = condition(etag_func=etag_func)(render)
+
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                # ETag читает БД, поэтому считается заранее в потоке; condition берёт его из request
+                await sync_to_async(get_etag)(request, page)
+                return finish(request, await conditional_view(request, *args, **kwargs))
+        else:
+            def render(request, *args, **kwargs):
+                etag = get_etag(request, page)
+                cached = _cached_response(request, page, etag)
+                if cached is not None:
+                    return cached
+                response = view(request, *args, **kwargs)
+                _store_response(request, page, etag, response)
+                return response
+
+            conditional_view = condition(etag_func=etag_func)(render)
+
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                return finish(request, conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,208 @@
+"""Кэш учебного контента (уровни, уроки, задания, аудио).
+
+Ключи содержат номер версии программы, который увеличивается сигналами
+post_save/post_delete (см. signals.py), поэтому правки в админке видны сразу.
+Версия хранится в БД (ContentVersion): правку, сделанную в другом процессе
+или командой, видят все процессы. В запросе версия читается один раз
+(ContentVersionMiddleware) и дальше берётся из памяти, так что попадание
+в кэш к БД не обращается. Страницы с условным GET получают её даром вместе
+с валидатором (conditional.get_stamps). Вне запроса (команды, пул процессов)
+версия читается при каждом обращении.
+
+Настройка в settings.py:
+
+    CONTENT_CACHE = {
+        'BACKEND': 'lru',        # 'lru' - в памяти процесса, 'django' - через django.core.cache
+        'ALIAS': 'default',      # алиас из CACHES для 'django'
+        'MAX_ENTRIES': 512,      # размер LRU
+        'TIMEOUT': None,
+    }
+"""
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Lock
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .grading import load_tasks
+from .models import Audio, ContentVersion, Lesson, Task
+
+VERSION_PK = 1
+
+LESSON_FIELDS = ('id', 'language_level_id', 'lesson_number', 'title', 'description')
+TASK_FIELDS = ('id', 'lesson_id', 'question', 'correct_answer', 'option1', 'option2', 'option3', 'audio_id')
+AUDIO_FIELDS = ('id', 'title', 'audio_file', 'audio_url', 'renditions')
+
+
+class LRUBackend:
+    def __init__(self, max_entries=512, **options):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        # Записи прошлых версий никто не читает, их вытеснят новые
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DjangoCacheBackend:
+    def __init__(self, alias='default', timeout=None, **options):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+
+BACKENDS = {
+    'lru': LRUBackend,
+    'django': DjangoCacheBackend,
+}
+
+_backend = None
+# {'version': n} текущего запроса; общий словарь видят и потоки sync_to_async этого запроса
+_request_version = ContextVar('content_version', default=None)
+stats = {'hits': 0, 'misses': 0}
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = getattr(settings, 'CONTENT_CACHE', {})
+        _backend = BACKENDS[config.get('BACKEND', 'lru')](
+            alias=config.get('ALIAS', 'default'),
+            max_entries=config.get('MAX_ENTRIES', 512),
+            timeout=config.get('TIMEOUT'),
+        )
+    return _backend
+
+
+def reset_backend():
+    global _backend
+    _backend = None
+    stats.update(hits=0, misses=0)
+
+
+class ContentVersionMiddleware:
+    """Версия программы читается один раз на запрос."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request_version.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_version.reset(token)
+
+    async def __acall__(self, request):
+        token = _request_version.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_version.reset(token)
+
+
+def remember_version(version):
+    """Версия, уже прочитанная в этом запросе вместе с другими данными (conditional.get_stamps)."""
+    current = _request_version.get()
+    if current is not None and version is not None:
+        current['version'] = version
+
+
+def get_version():
+    current = _request_version.get()
+    if current and 'version' in current:
+        return current['version']
+    row = ContentVersion.objects.filter(pk=VERSION_PK).values_list('version', flat=True).first()
+    if row is None:  # строку создаёт миграция 0014; на случай, если её удалили
+        row = ContentVersion.objects.get_or_create(pk=VERSION_PK)[0].version
+    remember_version(row)
+    return row
+
+
+def bump_version(**kwargs):
+    # В транзакции правки: другие процессы увидят новую версию вместе с новыми данными
+    if not ContentVersion.objects.filter(pk=VERSION_PK).update(version=F('version') + 1, changed_at=Now()):
+        ContentVersion.objects.get_or_create(pk=VERSION_PK, defaults={'version': 2})
+    current = _request_version.get()
+    if current is not None:
+        current.pop('version', None)  # дальше этот запрос читает уже новую версию
+
+
+def get_stats():
+    return dict(stats, version=get_version())
+
+
+def _cached(key, load):
+    backend = get_backend()
+    full_key = f'content:{get_version()}:{key}'
+    value = backend.get(full_key)
+    if value is None:
+        stats['misses'] += 1
+        value = load()
+        backend.set(full_key, value)
+    else:
+        stats['hits'] += 1
+    return value
+
+
+def _values(instance, fields):
+    return tuple(getattr(instance, field) for field in fields)
+
+
+def _load_lessons(level):
+    lessons = Lesson.objects.filter(language_level__level=level).order_by('lesson_number')
+    return tuple(_values(lesson, LESSON_FIELDS) for lesson in lessons)
+
+
+def _load_tasks(level, lesson):
+    rows = []
+    for task in load_tasks(level, lesson):
+        audio = None
+        if task.audio:
+            audio = (task.audio.pk, task.audio.title, task.audio.audio_file.name, task.audio.audio_url,
+                     task.audio.renditions)
+        rows.append((_values(task, TASK_FIELDS), audio))
+    return tuple(rows)
+
+
+def get_lessons(level):
+    """Уроки уровня по порядку номеров (объекты Lesson из кэша)."""
+    rows = _cached(f'lessons:{level}', lambda: _load_lessons(level))
+    return [Lesson.from_db('default', LESSON_FIELDS, row) for row in rows]
+
+
+def get_tasks(level, lesson):
+    """Задания урока вместе с аудио, как grading.load_tasks, но из кэша."""
+    tasks = []
+    for task_row, audio_row in _cached(f'tasks:{level}:{lesson}', lambda: _load_tasks(level, lesson)):
+        task = Task.from_db('default', TASK_FIELDS, task_row)
+        task.audio = Audio.from_db('default', AUDIO_FIELDS, audio_row) if audio_row else None
+        tasks.append(task)
+    return tasks
@@ -0,0 +1,491 @@
+"""Импорт и экспорт учебной программы (команды import_curriculum и export_curriculum).
+
+Форматы:
+    JSONL - по записи на строку: {"type": "level" | "audio" | "lesson" | "task", ...};
+            ссылки идут на записи выше по файлу или на то, что уже есть в БД;
+    CSV   - по строке на задание, уровень и урок повторяются в каждой строке;
+            строка с пустым position задаёт только урок (урок без заданий),
+            с пустым lesson_number - только уровень и/или аудио (без уроков и заданий);
+    ZIP   - curriculum.jsonl или curriculum.csv и аудиофайлы под их именами в MEDIA_ROOT.
+
+Естественные ключи: уровень - level, урок - (level, lesson_number),
+задание - (level, lesson_number, position), аудио - имя файла, без файла - URL.
+Импорт - upsert по этим ключам порциями bulk_create(update_conflicts=True) в одной
+транзакции, повторный импорт того же файла ничего не дублирует. В памяти только
+словари «ключ -> id» уровней, уроков и аудио и текущая порция записей.
+"""
+import csv
+import io
+import json
+import os
+import shutil
+import zipfile
+import zlib
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from . import content_cache, transcoding
+from .grading import normalize_answer
+from .models import Audio, LanguageLevel, Lesson, Task
+
+CHUNK_SIZE = 2000
+FORMATS = ('jsonl', 'csv', 'zip')
+ARCHIVE_NAMES = {'jsonl': 'curriculum.jsonl', 'csv': 'curriculum.csv'}
+LEVEL_CODES = {code for code, _ in LanguageLevel.LEVEL_CHOICES}
+TASK_FIELDS = ('question', 'correct_answer', 'option1', 'option2', 'option3')
+OPTION_FIELDS = ('option1', 'option2', 'option3')
+CSV_FIELDS = (
+    'level', 'level_description', 'lesson_number', 'lesson_title', 'lesson_description',
+    'position', 'question', 'correct_answer', 'option1', 'option2', 'option3',
+    'audio_file', 'audio_url', 'audio_title',
+)
+LESSON_ORDER = ('language_level__level', 'lesson_number')
+TASK_ORDER = ('lesson__language_level__level', 'lesson__lesson_number', 'position')
+
+
+class CurriculumError(Exception):
+    pass
+
+
+def audio_key(audio_file, audio_url):
+    return audio_file or audio_url or None
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'json': 'jsonl', 'ndjson': 'jsonl'}.get(extension, extension)
+
+
+# Экспорт. iterator() читает порциями: на PostgreSQL - серверный курсор, на SQLite - fetchmany
+
+def iter_records(chunk_size=CHUNK_SIZE):
+    for row in LanguageLevel.objects.order_by('level').values('level', 'description').iterator(chunk_size):
+        yield {'type': 'level', **row}
+
+    audios = Audio.objects.order_by('pk').values_list('audio_file', 'audio_url', 'title', 'description')
+    for file, url, title, description in audios.iterator(chunk_size):
+        if audio_key(file, url):
+            yield {'type': 'audio', 'file': file or None, 'url': url, 'title': title, 'description': description}
+
+    lessons = Lesson.objects.order_by(*LESSON_ORDER).values_list(
+        'language_level__level', 'lesson_number', 'title', 'description',
+    )
+    for level, number, title, description in lessons.iterator(chunk_size):
+        yield {'type': 'lesson', 'level': level, 'lesson_number': number, 'title': title, 'description': description}
+
+    tasks = Task.objects.order_by(*TASK_ORDER).values_list(
+        'lesson__language_level__level', 'lesson__lesson_number', 'position', *TASK_FIELDS,
+        'audio__audio_file', 'audio__audio_url',
+    )
+    for level, number, position, question, answer, *options, file, url in tasks.iterator(chunk_size):
+        yield {
+            'type': 'task', 'level': level, 'lesson_number': number, 'position': position,
+            'question': question, 'correct_answer': answer,
+            'options': [option for option in options if option],
+            'audio': audio_key(file, url),
+        }
+
+
+def write_jsonl(file, chunk_size=CHUNK_SIZE):
+    count = 0
+    for record in iter_records(chunk_size):
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def _padded(row):
+    return row + (None,) * (len(CSV_FIELDS) - len(row))
+
+
+def write_csv(file, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(file)
+    writer.writerow(CSV_FIELDS)
+    count = 0
+    # Уровни без уроков, аудио без заданий и уроки без заданий - отдельными строками,
+    # иначе они пропадут при обратном импорте
+    empty_levels = LanguageLevel.objects.filter(~Exists(Lesson.objects.filter(language_level=OuterRef('pk'))))
+    for row in empty_levels.order_by('level').values_list('level', 'description').iterator(chunk_size):
+        writer.writerow(_padded(row))
+        count += 1
+
+    free_audios = Audio.objects.filter(~Exists(Task.objects.filter(audio=OuterRef('pk')))).order_by('pk')
+    for name, url, title in free_audios.values_list('audio_file', 'audio_url', 'title').iterator(chunk_size):
+        if audio_key(name, url):
+            writer.writerow((None,) * (len(CSV_FIELDS) - 3) + (name or None, url, title))
+            count += 1
+
+    empty_lessons = Lesson.objects.filter(~Exists(Task.objects.filter(lesson=OuterRef('pk')))).order_by(
+        *LESSON_ORDER,
+    ).values_list('language_level__level', 'language_level__description', 'lesson_number', 'title', 'description')
+    for row in empty_lessons.iterator(chunk_size):
+        writer.writerow(_padded(row))
+        count += 1
+
+    tasks = Task.objects.order_by(*TASK_ORDER).values_list(
+        'lesson__language_level__level', 'lesson__language_level__description', 'lesson__lesson_number',
+        'lesson__title', 'lesson__description', 'position', *TASK_FIELDS,
+        'audio__audio_file', 'audio__audio_url', 'audio__title',
+    )
+    for row in tasks.iterator(chunk_size):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_archive(file, fmt='jsonl', chunk_size=CHUNK_SIZE):
+    """ZIP: программа и аудиофайлы. Аудио уже сжато, поэтому кладётся без сжатия (ZIP_STORED)."""
+    with zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(ARCHIVE_NAMES[fmt], 'w') as member:
+            with io.TextIOWrapper(member, encoding='utf-8', newline='') as text:
+                count = (write_csv if fmt == 'csv' else write_jsonl)(text, chunk_size)
+
+        names = Audio.objects.exclude(audio_file='').exclude(audio_file__isnull=True).order_by('pk')
+        for name in names.values_list('audio_file', flat=True).iterator(chunk_size):
+            if not default_storage.exists(name):
+                continue
+            info = zipfile.ZipInfo(name)
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(name) as source, archive.open(info, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target)
+    return count
+
+
+# Импорт
+
+def read_jsonl(file):
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise CurriculumError(f'строка {line_number}: некорректный JSON ({exc.msg})')
+
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    missing = set(CSV_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise CurriculumError(f'в CSV нет колонок: {", ".join(sorted(missing))}')
+    for line_number, row in enumerate(reader, 2):
+        row = {key: value or None for key, value in row.items()}
+        if row['level']:
+            yield line_number, {'type': 'level', 'level': row['level'], 'description': row['level_description']}
+        if row['lesson_number'] or row['position']:
+            yield line_number, {
+                'type': 'lesson', 'level': row['level'], 'lesson_number': row['lesson_number'],
+                'title': row['lesson_title'], 'description': row['lesson_description'],
+            }
+        key = audio_key(row['audio_file'], row['audio_url'])
+        if key:
+            yield line_number, {
+                'type': 'audio', 'file': row['audio_file'], 'url': row['audio_url'], 'title': row['audio_title'],
+            }
+        if row['position']:
+            yield line_number, {
+                'type': 'task', 'level': row['level'], 'lesson_number': row['lesson_number'],
+                'position': row['position'], 'question': row['question'], 'correct_answer': row['correct_answer'],
+                'options': [row[field] for field in OPTION_FIELDS if row[field]],
+                'audio': key,
+            }
+
+
+def _level(record):
+    level = str(record.get('level') or '').upper()
+    if level not in LEVEL_CODES:
+        raise CurriculumError(f'неизвестный уровень {record.get("level")!r}')
+    return level
+
+
+def _number(record, field):
+    try:
+        value = int(record.get(field))
+    except (TypeError, ValueError):
+        raise CurriculumError(f'{field} должно быть целым числом')
+    if value < 1:
+        raise CurriculumError(f'{field} должно быть больше нуля')
+    return value
+
+
+def _text(value, field, max_length=None, required=False):
+    if value is not None and not isinstance(value, str):
+        value = str(value)
+    if required and not (value or '').strip():
+        raise CurriculumError(f'не заполнено поле {field}')
+    if max_length and value and len(value) > max_length:
+        raise CurriculumError(f'{field} длиннее {max_length} символов')
+    return value
+
+
+class Importer:
+    """Upsert записей программы порциями; вызывать внутри транзакции."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.level_ids = {}
+        self.lesson_ids = {}
+        self.audio_ids = {}
+        self.audio_files = set()  # имена файлов из записей аудио
+        self.new_audio_ids = set()  # аудио с новым или другим файлом: старые версии (transcoding.py) не годятся
+        # Порции - словари по естественному ключу: повтор ключа заменяет запись,
+        # один INSERT ... ON CONFLICT не может обновить строку дважды
+        self.levels, self.audios, self.lessons, self.tasks = {}, {}, {}, {}
+        self.counts = dict.fromkeys(('level', 'audio', 'lesson', 'task'), 0)
+
+    def add(self, line_number, record):
+        try:
+            self.parse(record)
+        except CurriculumError as exc:
+            raise CurriculumError(f'строка {line_number}: {exc}')
+        if max(len(self.audios), len(self.lessons), len(self.tasks)) >= self.chunk_size:
+            self.flush()
+
+    def parse(self, record):
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind == 'level':
+            self.levels[_level(record)] = _text(record.get('description'), 'description')
+        elif kind == 'audio':
+            file = _text(record.get('file'), 'file', Audio._meta.get_field('audio_file').max_length)
+            url = _text(record.get('url'), 'url', Audio._meta.get_field('audio_url').max_length)
+            if not audio_key(file, url):
+                raise CurriculumError('у аудио нет ни file, ни url')
+            if file:
+                self.audio_files.add(file)
+            self.audios[audio_key(file, url)] = {
+                'audio_file': file, 'audio_url': url,
+                'title': _text(record.get('title'), 'title', 255),
+                'description': _text(record.get('description'), 'description'),
+            }
+        elif kind == 'lesson':
+            key = (_level(record), _number(record, 'lesson_number'))
+            self.lessons[key] = {
+                'title': _text(record.get('title'), 'title', 255, required=True),
+                'description': _text(record.get('description'), 'description'),
+            }
+        elif kind == 'task':
+            key = (_level(record), _number(record, 'lesson_number'), _number(record, 'position'))
+            options = record.get('options') or []
+            if not isinstance(options, list) or len(options) > len(OPTION_FIELDS):
+                raise CurriculumError('options - список не длиннее трёх вариантов')
+            options = [_text(option, 'options', 255) for option in options]
+            answer = _text(record.get('correct_answer'), 'correct_answer', 255, required=True)
+            if options and normalize_answer(answer) not in {normalize_answer(option) for option in options}:
+                raise CurriculumError('правильного ответа нет среди вариантов')
+            self.tasks[key] = {
+                'question': _text(record.get('question'), 'question', required=True),
+                'correct_answer': answer,
+                **dict(zip(OPTION_FIELDS, options + [None] * (len(OPTION_FIELDS) - len(options)))),
+                'audio': _text(record.get('audio'), 'audio'),
+            }
+        else:
+            raise CurriculumError(f'неизвестный тип записи {kind!r}')
+
+    def flush(self):
+        # По зависимостям: уровни и аудио, потом уроки, потом задания
+        self.flush_levels()
+        self.flush_audios()
+        self.flush_lessons()
+        self.flush_tasks()
+
+    def flush_levels(self):
+        if not self.levels:
+            return
+        LanguageLevel.objects.bulk_create(
+            [LanguageLevel(level=level, description=description) for level, description in self.levels.items()],
+            update_conflicts=True, unique_fields=['level'], update_fields=['description'],
+        )
+        self.level_ids.update(LanguageLevel.objects.filter(level__in=self.levels).values_list('level', 'pk'))
+        self.counts['level'] += len(self.levels)
+        self.levels = {}
+
+    def flush_audios(self):
+        # У Audio нет уникального ключа в БД, поэтому upsert вручную: найти, обновить, создать недостающие
+        if not self.audios:
+            return
+        existing = self.find_audios(self.audios)
+        audios = {key: Audio(pk=existing.get(key), **data) for key, data in self.audios.items()}
+        changed = [audio for audio in audios.values() if audio.pk]
+        old_files = dict(Audio.objects.filter(pk__in=[audio.pk for audio in changed]).values_list('pk', 'audio_file'))
+        self.new_audio_ids.update(
+            audio.pk for audio in changed if audio.audio_file and audio.audio_file.name != old_files.get(audio.pk)
+        )
+        # Запись только с URL не стирает файл у аудио, найденного по этому URL
+        Audio.objects.bulk_update([audio for audio in changed if audio.audio_file],
+                                  ['audio_file', 'audio_url', 'title', 'description'])
+        Audio.objects.bulk_update([audio for audio in changed if not audio.audio_file],
+                                  ['audio_url', 'title', 'description'])
+        created = Audio.objects.bulk_create([audio for audio in audios.values() if not audio.pk])
+        self.new_audio_ids.update(audio.pk for audio in created if audio.audio_file)
+        self.audio_ids.update((key, audio.pk) for key, audio in audios.items())
+        self.counts['audio'] += len(self.audios)
+        self.audios = {}
+
+    def find_audios(self, keys):
+        # Ключ - имя файла или URL; совпадение ищется по той колонке, из которой он взят
+        found = {}
+        rows = Audio.objects.filter(Q(audio_file__in=keys) | Q(audio_url__in=keys)).order_by('pk')
+        for pk, file, url in rows.values_list('pk', 'audio_file', 'audio_url'):
+            for value in (file, url):
+                if value and value in keys:
+                    found.setdefault(value, pk)
+        return found
+
+    def flush_lessons(self):
+        if not self.lessons:
+            return
+        self.resolve_levels({level for level, _ in self.lessons})
+        Lesson.objects.bulk_create(
+            [
+                Lesson(language_level_id=self.level_ids[level], lesson_number=number, **data)
+                for (level, number), data in self.lessons.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['language_level', 'lesson_number'],
+            update_fields=['title', 'description'],
+        )
+        self.resolve_lessons(self.lessons)  # при upsert id существующих уроков не меняется
+        self.counts['lesson'] += len(self.lessons)
+        self.lessons = {}
+
+    def flush_tasks(self):
+        if not self.tasks:
+            return
+        self.resolve_lessons({(level, number) for level, number, _ in self.tasks})
+        self.resolve_audios({data['audio'] for data in self.tasks.values() if data['audio']})
+        Task.objects.bulk_create(
+            [
+                Task(
+                    lesson_id=self.lesson_ids[(level, number)], position=position,
+                    audio_id=self.audio_ids[data['audio']] if data['audio'] else None,
+                    **{field: data[field] for field in TASK_FIELDS},
+                )
+                for (level, number, position), data in self.tasks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['lesson', 'position'],
+            update_fields=[*TASK_FIELDS, 'audio'],
+        )
+        self.counts['task'] += len(self.tasks)
+        self.tasks = {}
+
+    # Ссылки на записи из прошлых порций или из БД
+
+    def resolve_levels(self, levels):
+        missing = set(levels) - self.level_ids.keys()
+        if missing:
+            self.level_ids.update(LanguageLevel.objects.filter(level__in=missing).values_list('level', 'pk'))
+        unknown = sorted(missing - self.level_ids.keys())
+        if unknown:
+            raise CurriculumError(f'уровень {unknown[0]} не описан ни в файле, ни в БД')
+
+    def resolve_lessons(self, keys):
+        missing = set(keys) - self.lesson_ids.keys()
+        if not missing:
+            return
+        self.resolve_levels({level for level, _ in missing})
+        codes = {pk: level for level, pk in self.level_ids.items()}
+        condition = Q()
+        for level, number in missing:
+            condition |= Q(language_level_id=self.level_ids[level], lesson_number=number)
+        lessons = Lesson.objects.filter(condition).values_list('language_level_id', 'lesson_number', 'pk')
+        for level_id, number, pk in lessons:
+            self.lesson_ids[(codes[level_id], number)] = pk
+        unknown = sorted(missing - self.lesson_ids.keys())
+        if unknown:
+            raise CurriculumError('урок {}-{} не описан ни в файле, ни в БД'.format(*unknown[0]))
+
+    def resolve_audios(self, keys):
+        missing = set(keys) - self.audio_ids.keys()
+        if missing:
+            self.audio_ids.update(self.find_audios(missing))
+        unknown = sorted(missing - self.audio_ids.keys())
+        if unknown:
+            raise CurriculumError(f'аудио {unknown[0]} не описано ни в файле, ни в БД')
+
+
+def _member_name(name):
+    # Имена из архива становятся путями в хранилище: без абсолютных путей и «..»
+    normalized = os.path.normpath(name).replace(os.sep, '/')
+    if os.path.isabs(normalized) or normalized.startswith('..') or normalized != name:
+        raise CurriculumError(f'недопустимое имя файла в архиве: {name}')
+    return normalized
+
+
+def _storage_crc(name):
+    crc = 0
+    with default_storage.open(name) as file:
+        while chunk := file.read(1024 * 1024):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def save_audio_files(archive, names):
+    """Аудиофайлы из архива - в default_storage под теми же именами; возвращает имена записанных."""
+    saved = []
+    for info in archive.infolist():
+        if info.is_dir() or info.filename in ARCHIVE_NAMES.values():
+            continue
+        name = _member_name(info.filename)
+        if name not in names:
+            continue  # на файл не ссылается ни одна запись аудио
+        if default_storage.exists(name):
+            # Сравнение по CRC32 из архива: исправленная запись той же длины перезаписывается
+            if _storage_crc(name) == info.CRC:
+                continue
+            default_storage.delete(name)
+        with archive.open(info) as source:
+            if default_storage.save(name, File(source, name)) != name:
+                raise CurriculumError(f'хранилище сохранило {name} под другим именем')
+        saved.append(name)
+    return saved
+
+
+def _import_records(records, chunk_size):
+    importer = Importer(chunk_size)
+    for line_number, record in records:
+        importer.add(line_number, record)
+    importer.flush()
+    return importer
+
+
+def import_file(file, fmt, chunk_size=CHUNK_SIZE, dry_run=False):
+    """Импорт из файла (jsonl/csv - текстовый, zip - бинарный) в одной транзакции.
+
+    Возвращает число записей по типам; при ошибке откатывается всё и поднимается CurriculumError.
+    """
+    if fmt not in FORMATS:
+        raise CurriculumError(f'неизвестный формат {fmt}, ожидается один из: {", ".join(FORMATS)}')
+    files = []
+    with transaction.atomic():
+        if fmt == 'zip':
+            try:
+                archive = zipfile.ZipFile(file)
+            except zipfile.BadZipFile:
+                raise CurriculumError('файл не является ZIP-архивом')
+            with archive:
+                inner = next((key for key, name in ARCHIVE_NAMES.items() if name in archive.namelist()), None)
+                if inner is None:
+                    raise CurriculumError(f'в архиве нет {" или ".join(ARCHIVE_NAMES.values())}')
+                with io.TextIOWrapper(archive.open(ARCHIVE_NAMES[inner]), encoding='utf-8', newline='') as text:
+                    importer = _import_records((read_csv if inner == 'csv' else read_jsonl)(text), chunk_size)
+                # Файлы - после записей: ошибка в данных не оставит лишних файлов в хранилище
+                if not dry_run:
+                    files = save_audio_files(archive, importer.audio_files)
+        else:
+            importer = _import_records((read_csv if fmt == 'csv' else read_jsonl)(file), chunk_size)
+
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # bulk_create/bulk_update не шлют post_save: версию кэша контента и перекодирование
+            # аудио с новым файлом или новым содержимым файла запускаем сами
+            stale = Audio.objects.filter(Q(pk__in=importer.new_audio_ids) | Q(audio_file__in=files))
+            audio_ids = list(stale.values_list('pk', flat=True))
+            Audio.objects.filter(pk__in=audio_ids).update(renditions={}, duration=None, peaks=[])
+            transaction.on_commit(content_cache.bump_version)
+            transaction.on_commit(lambda: transcoding.queue_audio_ids(audio_ids))
+    return {**importer.counts, 'file': len(files)}
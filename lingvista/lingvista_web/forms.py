@@ -1,19 +1,51 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
-from .models import Profile
+from .images import MAX_PIXELS, MAX_UPLOAD_SIZE
+from .models import Achievement, LanguageLevel, Profile
 
 
 class ProfileEditForm(forms.ModelForm):
+    achievements = forms.CharField(required=False, help_text='Через запятую')
+
     class Meta:
         model = Profile
-        fields = ['profile_photo', 'streak', 'completed_levels', 'language_level', 'achievements']
+        fields = ['profile_photo', 'streak', 'completed_levels', 'language_level']
 
     def __init__(self, *args, **kwargs):
         super(ProfileEditForm, self).__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial.setdefault('achievements', ', '.join(self.instance.get_achievements()))
         self.fields['achievements'].widget.attrs.update({'placeholder': 'Введите достижения'})
         self.fields['language_level'].widget.attrs.update({'placeholder': 'Введите уровень языка'})
 
+    def clean_profile_photo(self):
+        # Только быстрые проверки по заголовку файла, декодирование - в фоне (images.py)
+        photo = self.cleaned_data.get('profile_photo')
+        image = getattr(photo, 'image', None)
+        if image is None:
+            return photo
+        if photo.size > MAX_UPLOAD_SIZE:
+            raise forms.ValidationError('Файл слишком большой (максимум 10 МБ).')
+        width, height = image.size
+        if width * height > MAX_PIXELS:
+            raise forms.ValidationError('Слишком большое разрешение изображения.')
+        return photo
+
+    def clean_achievements(self):
+        codes = [code.strip() for code in self.cleaned_data['achievements'].split(',')]
+        return list(dict.fromkeys(code for code in codes if code))
+
+    def save(self, commit=True):
+        profile = super().save(commit)
+        if commit:
+            codes = self.cleaned_data['achievements']
+            profile.achievements.exclude(code__in=codes).delete()
+            Achievement.objects.bulk_create(
+                [Achievement(profile=profile, code=code) for code in codes], ignore_conflicts=True,
+            )
+        return profile
+
 class UserRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
 
@@ -21,3 +53,28 @@ class UserRegistrationForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'password1', 'password2')
 
+
+
+class HistoryFilterForm(forms.Form):
+    level = forms.ChoiceField(choices=[('', 'Все уровни')] + LanguageLevel.LEVEL_CHOICES, required=False)
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('json', 'JSON')], required=False)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(max_length=200, strip=True)
+    level = forms.ChoiceField(choices=[('', 'Все уровни')] + LanguageLevel.LEVEL_CHOICES, required=False)
+    limit = forms.IntegerField(min_value=1, max_value=50, required=False)
+
+
+class AnalyticsFilterForm(forms.Form):
+    level = forms.ChoiceField(choices=[('', 'Все уровни')] + LanguageLevel.LEVEL_CHOICES, required=False)
+    lesson = forms.IntegerField(min_value=1, required=False)
+
+    def clean(self):
+        data = super().clean()
+        if data.get('lesson') and not data.get('level'):
+            self.add_error('level', 'Для урока нужен уровень')
+        return data
@@ -0,0 +1,46 @@
+import re
+import unicodedata
+
+from .models import Task
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_answer(answer):
+    # Регистр, лишние пробелы и разные формы записи Unicode не влияют на ответ
+    answer = unicodedata.normalize('NFKC', answer or '')
+    return _SPACES.sub(' ', answer).strip().casefold()
+
+
+def load_tasks(level, lesson):
+    return list(
+        Task.objects
+        .filter(lesson__language_level__level=level, lesson__lesson_number=lesson)
+        .select_related('audio')
+        .order_by('position')
+    )
+
+
+def collect_answers(tasks, data):
+    answers = []
+    for task in tasks:
+        answer = data.get(f'audio_answer_{task.pk}') if task.audio_id else None
+        answers.append(answer or data.get(f'task_{task.pk}', ''))
+    return answers
+
+
+def grade(tasks, answers):
+    """Проверяет все ответы урока за один проход.
+
+    Проставляет задачам user_answer и is_correct (их читает tasks_page.html)
+    и возвращает (score, correct_count).
+    """
+    expected = [normalize_answer(task.correct_answer) for task in tasks]
+    given = [normalize_answer(answer) for answer in answers]
+    correct_count = 0
+    for task, answer, left, right in zip(tasks, answers, given, expected):
+        task.user_answer = answer
+        task.is_correct = bool(left) and left == right
+        correct_count += task.is_correct
+    score = round(correct_count * 100 / len(tasks)) if tasks else 0
+    return score, correct_count
@@ -0,0 +1,110 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import UserTasksProgress
+
+HISTORY_FIELDS = ('id', 'level', 'lesson', 'result', 'date_completed')
+PAGE_SIZE = 20
+EXPORT_CHUNK_SIZE = 2000
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_ID = 2 ** 63 - 1
+
+
+class Echo:
+    # Псевдо-файл для csv.writer: возвращает строку вместо записи
+    def write(self, value):
+        return value
+
+
+def history_queryset(user, level=None, date_from=None, date_to=None):
+    """История результатов уроков, от новых к старым, только нужные колонки."""
+    queryset = UserTasksProgress.objects.filter(user=user)
+    if level:
+        queryset = queryset.filter(level=level)
+    if date_from:
+        queryset = queryset.filter(date_completed__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to:
+        # Граница диапазона без __date, чтобы работал индекс (user, date_completed)
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        queryset = queryset.filter(date_completed__lt=end)
+    return queryset.order_by('-date_completed', '-id').values(*HISTORY_FIELDS)
+
+
+def encode_cursor(row):
+    # Курсор "микросекунды_id" не требует экранирования в URL
+    delta = row['date_completed'] - EPOCH
+    return f"{delta // timedelta(microseconds=1)}_{row['id']}"
+
+
+def decode_cursor(cursor):
+    # OverflowError - слишком большое число микросекунд; pk вне BIGINT упал бы уже в запросе
+    try:
+        microseconds, pk = cursor.split('_')
+        date, pk = EPOCH + timedelta(microseconds=int(microseconds)), int(pk)
+    except (ValueError, OverflowError):
+        raise ValueError(f'Некорректный курсор: {cursor}')
+    if not 0 < pk <= MAX_ID:
+        raise ValueError(f'Некорректный курсор: {cursor}')
+    return date, pk
+
+
+def history_page(queryset, cursor=None, limit=PAGE_SIZE):
+    """Страница истории по ключу (date_completed, id) вместо OFFSET.
+
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    rows = list(_after_cursor(queryset, cursor)[:limit + 1])
+    return _split_page(rows, limit)
+
+
+async def ahistory_page(queryset, cursor=None, limit=PAGE_SIZE):
+    rows = [row async for row in _after_cursor(queryset, cursor)[:limit + 1]]
+    return _split_page(rows, limit)
+
+
+def _after_cursor(queryset, cursor):
+    if not cursor:
+        return queryset
+    date, pk = decode_cursor(cursor)
+    return queryset.filter(Q(date_completed__lt=date) | Q(date_completed=date, id__lt=pk))
+
+
+def _split_page(rows, limit):
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HISTORY_FIELDS)
+    for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([row[field] for field in HISTORY_FIELDS])
+
+
+def iter_json(queryset):
+    yield '['
+    for i, row in enumerate(queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
+        yield (',' if i else '') + json.dumps(row, cls=DjangoJSONEncoder)
+    yield ']'
+
+
+async def aiter_csv(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HISTORY_FIELDS)
+    async for row in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([row[field] for field in HISTORY_FIELDS])
+
+
+async def aiter_json(queryset):
+    yield '['
+    first = True
+    async for row in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield ('' if first else ',') + json.dumps(row, cls=DjangoJSONEncoder)
+        first = False
+    yield ']'
@@ -0,0 +1,118 @@
+"""Миниатюры фото профиля.
+
+Оригинал сохраняется формой как раньше, а декодирование и уменьшение идут
+в пуле процессов (workers.py) после коммита. Имена миниатюр содержат хэш
+содержимого оригинала, поэтому их можно кэшировать навсегда.
+"""
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+
+from .workers import get_executor
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = (64, 256)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_thumbnails(source, media_root, sizes=THUMBNAIL_SIZES):
+    """Выполняется в процессе пула: квадратные миниатюры без EXIF.
+
+    Возвращает {'64': {'webp': имя, 'jpeg': имя}, ...}, имена относительно MEDIA_ROOT.
+    """
+    digest = file_hash(source)
+    directory = f'thumbnails/{digest[:2]}'
+    os.makedirs(os.path.join(media_root, directory), exist_ok=True)
+
+    with Image.open(source) as image:
+        image.draft('RGB', (max(sizes), max(sizes)))  # JPEG декодируется сразу в уменьшенном виде
+        # Поворот по EXIF, дальше метаданные не копируются
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        thumbnails = {}
+        for size in sizes:
+            thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            names = {}
+            for key, (image_format, options) in THUMBNAIL_FORMATS.items():
+                name = f'{directory}/{digest[:32]}_{size}.{key}'
+                path = os.path.join(media_root, name)
+                if not os.path.exists(path):
+                    thumbnail.save(path, image_format, **options)
+                names[key] = name
+            thumbnails[str(size)] = names
+    return thumbnails
+
+
+def apply_thumbnails(profile_id, source_name, thumbnails):
+    from .models import Profile
+
+    Profile.objects.filter(pk=profile_id, profile_photo=source_name).update(
+        photo_thumbnails=dict(thumbnails, source=source_name), updated_at=Now(),
+    )
+
+
+def _on_done(profile_id, source_name):
+    def callback(future):
+        try:
+            apply_thumbnails(profile_id, source_name, future.result())
+        except Exception:
+            logger.exception('Не удалось сделать миниатюры для профиля %s', profile_id)
+        finally:
+            connection.close()  # соединение потока пула
+    return callback
+
+
+def submit(profile):
+    future = get_executor().submit(make_thumbnails, profile.profile_photo.path, str(settings.MEDIA_ROOT))
+    future.add_done_callback(_on_done(profile.pk, profile.profile_photo.name))
+    return future
+
+
+def remember_photo_change(sender, instance, update_fields=None, **kwargs):
+    # pre_save: счётчики, достижения и updated_at сохраняются часто, а фото меняется редко.
+    # При полном save сравниваем с БД: photo_thumbnails у такого экземпляра может быть устаревшим
+    if update_fields is not None:
+        instance._photo_changed = 'profile_photo' in update_fields
+    elif instance.pk is None:
+        instance._photo_changed = True
+    else:
+        stored = sender.objects.filter(pk=instance.pk).values_list('profile_photo', flat=True).first()
+        instance._photo_changed = (stored or '') != (instance.profile_photo.name or '')
+
+
+def queue_thumbnails(sender, instance, **kwargs):
+    if not instance.profile_photo or not getattr(instance, '_photo_changed', True):
+        return
+    transaction.on_commit(lambda: submit(instance))
+
+
+def thumbnail_url(profile, size, image_format='jpeg'):
+    """URL миниатюры ближайшего размера не меньше size; пока её нет - оригинал."""
+    if not profile or not profile.profile_photo:
+        return ''
+    thumbnails = profile.photo_thumbnails
+    if thumbnails.get('source') == profile.profile_photo.name:
+        available = sorted(int(key) for key in thumbnails if key.isdigit())
+        suitable = [value for value in available if value >= size] or available
+        if suitable:
+            return settings.MEDIA_URL + thumbnails[str(suitable[0])][image_format]
+    return profile.profile_photo.url
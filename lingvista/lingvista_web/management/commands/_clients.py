@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test import Client
+
+
+def make_client(user):
+    """Тестовый клиент, авторизованный как user, для бенчмарков на реальной БД."""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+    client.force_login(user)
+    return client
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from lingvista_web.models import Lesson
+
+from .generate_data import USERNAME_PREFIX
+
+SERVERS = {
+    'wsgi': 'gunicorn lingvista.wsgi:application --bind 127.0.0.1:{port} --workers {workers} '
+            '--worker-class gthread --threads 8',
+    'asgi': 'uvicorn lingvista.asgi:application --port {port} --workers {workers} --no-access-log',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(port, paths, cookie, deadline, latencies, errors):
+    # Одно keep-alive соединение, запросы по кругу до дедлайна
+    reader = writer = None
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            start = time.perf_counter()
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n'
+                f'Accept-Encoding: identity\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append('connection')
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(port, paths, cookie, connections, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        client(port, paths, cookie, deadline, latencies, errors) for _ in range(connections)
+    ))
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает WSGI (gunicorn) и ASGI (uvicorn) под нагрузкой: запросы в секунду и задержки '
+            'при разном числе одновременных соединений. Данные - generate_data, серверы запускаются командой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', default=list(SERVERS), choices=list(SERVERS))
+        parser.add_argument('--connections', nargs='+', type=int, default=[10, 100, 500])
+        parser.add_argument('--duration', type=float, default=10, help='секунд на каждый замер')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        for name, command in SERVERS.items():
+            parser.add_argument(f'--{name}-command', default=command, help=f'команда запуска {name}-сервера')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').first()
+        lesson = Lesson.objects.select_related('language_level').order_by('language_level__level', 'lesson_number').first()
+        if user is None or lesson is None:
+            raise CommandError('Нет данных: сначала запустите generate_data')
+        level = lesson.language_level.level.lower()
+        paths = [
+            reverse('langlevel'),
+            reverse('lessons', kwargs={'level': level}),
+            reverse('tasks', kwargs={'level': level, 'lesson': lesson.lesson_number}),
+            reverse('profile_view'),
+            reverse('profile_history'),
+        ]
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.create_session(user)}'
+
+        self.stdout.write(f"{'сервер':8} {'соедин.':>8} {'RPS':>9} {'p50, ms':>9} {'p95, ms':>9} {'ошибок':>7}")
+        for server in options['servers']:
+            port = free_port()
+            command = options[f'{server}_command'].format(port=port, workers=options['workers'])
+            process = self.start(server, command, port)
+            try:
+                for connections in options['connections']:
+                    latencies, errors = asyncio.run(
+                        run_load(port, paths, cookie, connections, options['duration'])
+                    )
+                    self.report(server, connections, latencies, errors, options['duration'])
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+
+    def create_session(self, user):
+        # Сессия создаётся напрямую: так бенчмарк не зависит от формы входа
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def start(self, server, command, port):
+        env = dict(os.environ, LINGVISTA_ASYNC_VIEWS='1' if server == 'asgi' else '0')
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        try:
+            process = subprocess.Popen(
+                shlex.split(command), cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL, stderr=sys.stderr,
+            )
+        except FileNotFoundError:
+            raise CommandError(f'Не найден сервер: {command.split()[0]}')
+        for _ in range(300):
+            if process.poll() is not None:
+                raise CommandError(f'Сервер завершился при запуске: {command}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                return process
+            except OSError:
+                time.sleep(0.1)
+        process.terminate()
+        raise CommandError(f'Сервер не ответил за 30 секунд: {command}')
+
+    def report(self, server, connections, latencies, errors, duration):
+        if not latencies:
+            self.stdout.write(f'{server:8} {connections:8} нет ответов, ошибок {len(errors)}')
+            return
+        latencies.sort()
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        self.stdout.write(
+            f'{server:8} {connections:8} {len(latencies) / duration:9.1f} '
+            f'{statistics.median(latencies) * 1000:9.1f} {p95 * 1000:9.1f} {len(errors):7}'
+        )
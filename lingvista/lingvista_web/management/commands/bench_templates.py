@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+
+PAGES = [
+    'html/pages/main_page.html',
+    'html/pages/login_page.html',
+    'html/pages/registry_page.html',
+    'html/pages/langlevel_page.html',
+    'html/pages/lessons_page.html',
+]
+
+APP_LOADERS = ['django.template.loaders.app_directories.Loader']
+
+
+def make_backend(name, dirs, loaders):
+    options = dict(settings.TEMPLATES[0]['OPTIONS'], loaders=loaders)
+    return DjangoTemplates({'NAME': name, 'DIRS': dirs, 'APP_DIRS': False, 'OPTIONS': options})
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время рендеринга страниц без кэширующего загрузчика шаблонов и с ним'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = {'levels_data': [], 'lessons_data': [], 'level': 'A1'}
+
+        backends = [
+            # Старая конфигурация: несуществующий каталог в DIRS и загрузка с диска на каждый рендер
+            ('before', make_backend('before', ['lingvista_app/templates'], [
+                'django.template.loaders.filesystem.Loader',
+            ] + APP_LOADERS)),
+            ('after', make_backend('after', [], [('django.template.loaders.cached.Loader', APP_LOADERS)])),
+        ]
+        for label, backend in backends:
+            for name in PAGES:  # прогрев (для cached.Loader - компиляция)
+                backend.get_template(name)
+
+            self.stdout.write(f'[{label}]')
+            for name in PAGES:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    backend.get_template(name).render(context, request)
+                elapsed = (time.perf_counter() - start) * 1000 / iterations
+                self.stdout.write(f'  {name}: {elapsed:.3f} ms/render')
@@ -0,0 +1,119 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from lingvista_web.grading import load_tasks
+from lingvista_web.models import Lesson
+
+from ._clients import make_client
+from .generate_data import USERNAME_PREFIX
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк основных страниц через тестовый клиент: p50/p95, SQL на запрос, пик памяти запроса. '
+            'Данные - generate_data. Базовую линию можно сохранить (--save) и сравнить с ней (--compare).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--profile-iterations', type=int, default=5,
+                            help='запросов в проходе, где считаются SQL и пик памяти')
+        parser.add_argument('--users', type=int, default=10, help='сколько синтетических пользователей чередовать')
+        parser.add_argument('--save', metavar='FILE', help='сохранить результаты как базовую линию')
+        parser.add_argument('--compare', metavar='FILE', help='сравнить с базовой линией')
+        parser.add_argument('--max-regression', type=float, default=0.2, help='допустимый рост p95 и SQL (доля)')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk')[:options['users']])
+        lesson = Lesson.objects.select_related('language_level').order_by('language_level__level', 'lesson_number').first()
+        if not users or lesson is None:
+            raise CommandError('Нет данных: сначала запустите generate_data')
+
+        level = lesson.language_level.level
+        answers = {f'task_{task.pk}': task.correct_answer for task in load_tasks(level, lesson.lesson_number)}
+        scenarios = {
+            'level_map': ('get', reverse('langlevel'), None),
+            'lessons': ('get', reverse('lessons', kwargs={'level': level.lower()}), None),
+            'tasks_submit': ('post', reverse('tasks', kwargs={'level': level.lower(), 'lesson': lesson.lesson_number}), answers),
+            'profile': ('get', reverse('profile_view'), None),
+            'history': ('get', reverse('profile_history'), None),
+        }
+
+        clients = [make_client(user) for user in users]
+
+        results = {}
+        for name, (method, url, data) in scenarios.items():
+            results[name] = self.run_scenario(
+                clients, method, url, data, options['iterations'], max(options['profile_iterations'], 1),
+            )
+            self.stdout.write(
+                f"{name:14} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                f"SQL {results[name]['queries']:6.1f}  память {results[name]['peak_kb']:8.1f} KiB"
+            )
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f"Базовая линия сохранена в {options['save']}")
+        if options['compare']:
+            self.compare(results, options['compare'], options['max_regression'])
+
+    def run_scenario(self, clients, method, url, data, iterations, profile_iterations):
+        getattr(clients[0], method)(url, data)  # прогрев кэшей
+
+        # Время - без tracemalloc и перехвата SQL: они замедляют каждый запрос
+        latencies = []
+        for i in range(iterations):
+            client = clients[i % len(clients)]
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: HTTP {response.status_code}')
+
+        # Отдельный проход: число SQL и пик памяти одного запроса
+        queries, peak = [], 0
+        tracemalloc.start()
+        try:
+            for i in range(profile_iterations):
+                client = clients[i % len(clients)]
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                with CaptureQueriesContext(connection) as captured:
+                    getattr(client, method)(url, data)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+                queries.append(len(captured))
+        finally:
+            tracemalloc.stop()
+        return {
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'queries': statistics.mean(queries),
+            'peak_kb': peak / 1024,
+        }
+
+    def compare(self, results, path, max_regression):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, current in results.items():
+            previous = baseline.get(name)
+            if not previous:
+                continue
+            for metric in ('p95_ms', 'queries'):
+                if current[metric] > previous[metric] * (1 + max_regression) and current[metric] - previous[metric] > 0.5:
+                    regressions.append(f'{name}.{metric}: {previous[metric]:.2f} -> {current[metric]:.2f}')
+        if regressions:
+            raise CommandError('Регрессия относительно базовой линии:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий относительно базовой линии нет'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lingvista_web.curriculum import CHUNK_SIZE, write_archive, write_csv, write_jsonl
+
+
+class Command(BaseCommand):
+    help = ('Выгружает учебную программу в JSONL или CSV (формат - curriculum.py), с --archive - '
+            'в ZIP вместе с аудиофайлами. Таблицы читаются порциями, память не растёт с размером программы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+        parser.add_argument('--output', '-o', help='файл; по умолчанию - stdout')
+        parser.add_argument('--archive', action='store_true', help='ZIP с программой и аудио (нужен --output)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output, chunk_size = options['output'], options['chunk_size']
+        if options['archive']:
+            if not output:
+                raise CommandError('Для --archive нужен --output')
+            with open(output, 'wb') as file:
+                count = write_archive(file, options['format'], chunk_size)
+        else:
+            write = write_csv if options['format'] == 'csv' else write_jsonl
+            if output:
+                with open(output, 'w', encoding='utf-8', newline='') as file:
+                    count = write(file, chunk_size)
+            else:
+                count = write(self.stdout, chunk_size)
+        if output:
+            self.stdout.write(self.style.SUCCESS(f'Выгружено записей: {count} -> {output}'))
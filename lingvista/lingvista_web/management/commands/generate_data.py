@@ -0,0 +1,135 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lingvista_web import content_cache
+from lingvista_web.models import Audio, LanguageLevel, Lesson, Profile, Task, UserProgress, UserTasksProgress
+
+USERNAME_PREFIX = 'synthetic_'
+SAMPLE_AUDIO = [f'audio/{level}/lesson{number}.mp3' for level in ('A1', 'A2', 'B1') for number in (1, 2, 3)]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Заполняет БД синтетическими данными для нагрузочных тестов (bench_views, loadtest_tasks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', type=int, default=6, help='сколько уровней A1..C2 заполнить')
+        parser.add_argument('--lessons-per-level', type=int, default=20)
+        parser.add_argument('--tasks-per-lesson', type=int, default=10)
+        parser.add_argument('--audio-ratio', type=float, default=0.3, help='доля заданий с аудио')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--attempt-ratio', type=float, default=0.5, help='доля уроков, пройденных пользователем')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-snapshots', action='store_true', help='не пересобирать снимки прогресса')
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.random = random.Random(self.seed)
+        self.chunk_size = options['chunk_size']
+
+        lessons = self.create_curriculum(options)
+        tasks_by_lesson = {}
+        for task_id, lesson_id in Task.objects.filter(lesson__in=[lesson.pk for lesson in lessons]).values_list('pk', 'lesson_id'):
+            tasks_by_lesson.setdefault(lesson_id, []).append(task_id)
+
+        user_ids = self.create_users(options['users'])
+        progress, task_progress = self.create_progress(user_ids, lessons, tasks_by_lesson, options['attempt_ratio'])
+        content_cache.bump_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Уроков: {len(lessons)}, пользователей: {len(user_ids)}, '
+            f'UserTasksProgress: {progress}, UserProgress: {task_progress}'
+        ))
+        if not options['no_snapshots']:
+            call_command('rebuild_progress_snapshots', chunk_size=1000, stdout=self.stdout)
+        call_command('recompute_analytics', stdout=self.stdout)  # прогресс писался в обход record_result
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = 0
+        for chunk in chunked(objects, self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size, **kwargs)
+            created += len(chunk)
+        return created
+
+    def create_curriculum(self, options):
+        codes = [code for code, _ in LanguageLevel.LEVEL_CHOICES][:options['levels']]
+        LanguageLevel.objects.bulk_create(
+            [LanguageLevel(level=code, description=f'Уровень {code}') for code in codes],
+            ignore_conflicts=True,
+        )
+        levels = LanguageLevel.objects.filter(level__in=codes)
+        self.bulk_create(Lesson, (
+            Lesson(language_level=level, lesson_number=number, title=f'{level.level} урок {number}',
+                   description=f'Синтетический урок {number} уровня {level.level}')
+            for level in levels for number in range(1, options['lessons_per_level'] + 1)
+        ), ignore_conflicts=True)
+        lessons = list(Lesson.objects.filter(language_level__in=levels).select_related('language_level'))
+
+        audios = list(Audio.objects.filter(audio_file__in=SAMPLE_AUDIO)) or Audio.objects.bulk_create(
+            [Audio(title=name, audio_file=name) for name in SAMPLE_AUDIO]
+        )
+        existing = set(Task.objects.filter(lesson__in=lessons).values_list('lesson_id', flat=True).distinct())
+        self.bulk_create(Task, (
+            self.make_task(lesson, number, audios, options['audio_ratio'])
+            for lesson in lessons if lesson.pk not in existing
+            for number in range(options['tasks_per_lesson'])
+        ))
+        return lessons
+
+    def make_task(self, lesson, number, audios, audio_ratio):
+        answer = f'answer {number}'
+        if self.random.random() < audio_ratio:
+            return Task(lesson=lesson, position=number + 1, question=f'Прослушайте запись {number}',
+                        correct_answer=answer, audio=self.random.choice(audios))
+        options = [answer, f'wrong {number}a', f'wrong {number}b']
+        self.random.shuffle(options)
+        return Task(lesson=lesson, position=number + 1, question=f'Вопрос {number} урока {lesson.title}',
+                    correct_answer=answer, option1=options[0], option2=options[1], option3=options[2])
+
+    def create_users(self, count):
+        password = make_password('synthetic')  # один хэш на всех - хэширование дорогое
+        start = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        self.bulk_create(User, (
+            User(username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com', password=password)
+            for i in range(start, start + count)
+        ))
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX, profile__isnull=True).values_list('pk', flat=True)
+        )
+        self.bulk_create(Profile, (
+            Profile(user_id=user_id, streak=self.random.randint(0, 30), language_level='A1') for user_id in user_ids
+        ))
+        return user_ids
+
+    def attempted_lessons(self, user_id, lessons, attempt_ratio):
+        # Отдельный генератор на пользователя: одинаковый выбор при двух проходах, без хранения в памяти
+        rng = random.Random(self.seed * 1_000_003 + user_id)
+        return [(lesson, rng) for lesson in lessons if rng.random() < attempt_ratio]
+
+    def create_progress(self, user_ids, lessons, tasks_by_lesson, attempt_ratio):
+        progress = self.bulk_create(UserTasksProgress, (
+            UserTasksProgress(user_id=user_id, level=lesson.language_level.level,
+                              lesson=lesson.lesson_number, result=rng.randint(0, 100))
+            for user_id in user_ids
+            for lesson, rng in self.attempted_lessons(user_id, lessons, attempt_ratio)
+        ), ignore_conflicts=True)
+        task_progress = self.bulk_create(UserProgress, (
+            UserProgress(user_id=user_id, task_id=task_id, completed=rng.random() < 0.7)
+            for user_id in user_ids
+            for lesson, rng in self.attempted_lessons(user_id, lessons, attempt_ratio)
+            for task_id in tasks_by_lesson.get(lesson.pk, [])
+        ), ignore_conflicts=True)
+        return progress, task_progress
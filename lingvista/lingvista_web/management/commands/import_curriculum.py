@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lingvista_web.curriculum import CHUNK_SIZE, FORMATS, CurriculumError, guess_format, import_file
+
+
+class Command(BaseCommand):
+    help = ('Импортирует учебную программу из JSONL, CSV или ZIP с аудио (формат - curriculum.py). '
+            'Записи сверяются по естественным ключам, повторный импорт обновляет их без дублей. '
+            'Всё в одной транзакции: при ошибке в любой строке БД не меняется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='файл программы, "-" - stdin')
+        parser.add_argument('--format', choices=FORMATS, help='по умолчанию - по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='записей в одном INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='проверить и откатить')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path == '-' else guess_format(path))
+        if fmt not in FORMATS:
+            raise CommandError(f'Не удалось определить формат {path}, укажите --format')
+        try:
+            if path == '-':
+                source = sys.stdin.buffer if fmt == 'zip' else sys.stdin
+                counts = import_file(source, fmt, options['chunk_size'], options['dry_run'])
+            else:
+                mode = {'mode': 'rb'} if fmt == 'zip' else {'mode': 'r', 'encoding': 'utf-8', 'newline': ''}
+                with open(path, **mode) as source:
+                    counts = import_file(source, fmt, options['chunk_size'], options['dry_run'])
+        except OSError as exc:
+            raise CommandError(f'Не удалось прочитать {path}: {exc}')
+        except CurriculumError as exc:
+            raise CommandError(f'Импорт отменён, {exc}')
+
+        summary = (f"уровней {counts['level']}, уроков {counts['lesson']}, заданий {counts['task']}, "
+                   f"аудио {counts['audio']}, файлов {counts['file']}")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Проверка пройдена, изменения откачены: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Импортировано: {summary}'))
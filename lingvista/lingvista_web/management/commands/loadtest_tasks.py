@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from lingvista_web.grading import load_tasks
+from lingvista_web.signals import set_journal_mode
+
+from ._clients import make_client
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест отправки ответов на странице заданий. '
+            'Запускайте на копии БД с разными LINGVISTA_DB / LINGVISTA_SQLITE_TUNING и сравнивайте результаты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--level', default='A1')
+        parser.add_argument('--lesson', type=int, default=1)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--submissions', type=int, default=50, help='отправок на поток')
+
+    def handle(self, *args, **options):
+        set_journal_mode()  # как при старте сервера
+        level, lesson = options['level'].upper(), options['lesson']
+        tasks = load_tasks(level, lesson)
+        if not tasks:
+            raise CommandError(f'В уроке {level} {lesson} нет заданий')
+
+        answers = {f'task_{task.pk}': task.correct_answer for task in tasks}
+        answers.update({f'audio_answer_{task.pk}': task.correct_answer for task in tasks if task.audio_id})
+        url = reverse('tasks', kwargs={'level': level.lower(), 'lesson': lesson})
+        users = [
+            User.objects.get_or_create(username=f'loadtest_{i}')[0]
+            for i in range(options['threads'])
+        ]
+
+        errors = []
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(user):
+            client = make_client(user)
+            try:
+                for _ in range(options['submissions']):
+                    start = time.perf_counter()
+                    try:
+                        response = client.post(url, answers)
+                        error = None if response.status_code == 200 else f'HTTP {response.status_code}'
+                    except Exception as exc:  # например, "database is locked"
+                        error = repr(exc)
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        if error:
+                            errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        total = len(latencies)
+        self.stdout.write(f"Профиль БД: {settings.DATABASE_PROFILE}, PRAGMA: {settings.SQLITE_PRAGMAS or '-'}, "
+                          f"журнал: {settings.SQLITE_JOURNAL_MODE or '-'}")
+        self.stdout.write(f'Отправок: {total}, ошибок: {len(errors)}, время: {elapsed:.2f} с')
+        self.stdout.write(f'Пропускная способность: {total / elapsed:.1f} отправок/с')
+        self.stdout.write(f'p50: {latencies[total // 2] * 1000:.1f} мс, p95: {latencies[int(total * 0.95)] * 1000:.1f} мс')
+        for error in sorted(set(errors))[:5]:
+            self.stdout.write(self.style.WARNING(error))
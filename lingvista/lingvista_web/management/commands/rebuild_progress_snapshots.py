@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from lingvista_web import content_cache
+from lingvista_web.models import ProgressSnapshot, UserTasksProgress
+from lingvista_web.progress import build_snapshot, lessons_by_level
+
+SNAPSHOT_FIELDS = ['lesson_scores', 'completed_levels', 'unlocked_levels']
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает снимки прогресса пользователей из UserTasksProgress или сверяет их (--check)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только сверить снимки с исходными данными')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        version = content_cache.get_version()
+        lessons = lessons_by_level()
+        chunk_size = options['chunk_size']
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        mismatched = missing = 0
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            results = {user_id: [] for user_id in chunk}
+            rows = UserTasksProgress.objects.filter(user_id__in=chunk).values_list('user_id', 'level', 'lesson', 'result')
+            for user_id, level, lesson, result in rows:
+                results[user_id].append((level, lesson, result))
+            snapshots = [build_snapshot(user_id, results[user_id], lessons, version) for user_id in chunk]
+
+            if options['check']:
+                stored = ProgressSnapshot.objects.in_bulk(chunk)
+                for snapshot in snapshots:
+                    current = stored.get(snapshot.user_id)
+                    if current is None:
+                        missing += 1  # снимок создаётся при первом обращении (progress.get_snapshot)
+                        continue
+                    # Уровни снимка старой версии программы пересчитаются при чтении, сверяются только результаты
+                    fields = SNAPSHOT_FIELDS if current.content_version == version else ['lesson_scores']
+                    if any(getattr(current, field) != getattr(snapshot, field) for field in fields):
+                        mismatched += 1
+                        self.stdout.write(f'Снимок пользователя {snapshot.user_id} не совпадает с данными')
+                continue
+
+            with transaction.atomic():
+                ProgressSnapshot.objects.bulk_create(
+                    snapshots,
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=SNAPSHOT_FIELDS + ['content_version', 'updated_at'],
+                )
+
+        if options['check']:
+            if mismatched:
+                raise CommandError(f'Несовпадающих снимков: {mismatched}')
+            self.stdout.write(self.style.SUCCESS(
+                f'Все снимки совпадают ({len(user_ids) - missing}), ещё не созданы: {missing}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Снимки пересобраны ({len(user_ids)})'))
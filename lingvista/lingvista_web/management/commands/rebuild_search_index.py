@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from lingvista_web.search import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс уроков и заданий (search.py). Обычно индекс ведут триггеры БД; '
+            'команда нужна после правок в обход них, например после восстановления таблиц из дампа.')
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Индекс пересобран, строк: {rows}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from lingvista_web.analytics import CHUNK_SIZE, recompute
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает счётчики заданий и уроков (analytics.py) из UserProgress и UserTasksProgress. '
+            'Нужна после миграции и после правок прогресса в обход record_result.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        tasks, lessons = recompute(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Счётчики пересобраны: заданий {tasks}, уроков {lessons}'))
@@ -0,0 +1,81 @@
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, F, Max, Min, OuterRef, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from lingvista_web.models import ActivityDay, Profile
+
+
+class Command(BaseCommand):
+    help = ('Ночной пересчёт серий: активным за день +1, пропустившим день - 0. '
+            'Активность берётся из ActivityDay (сутки в поясе STREAK_TIME_ZONE). '
+            'Пропущенные запуски догоняются: дни обрабатываются по порядку начиная с streak_date + 1. '
+            'Профили обрабатываются диапазонами pk, каждый диапазон - два UPDATE в короткой транзакции. '
+            'Повторный запуск за тот же день безопасен и продолжает прерванный.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='последний день YYYY-MM-DD (по умолчанию - вчера в STREAK_TIME_ZONE)')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='размер диапазона pk')
+        parser.add_argument('--pause', type=float, default=0, help='пауза между диапазонами, секунды')
+
+    def handle(self, *args, **options):
+        zone_name = getattr(settings, 'STREAK_TIME_ZONE', settings.TIME_ZONE)
+        try:
+            zone = ZoneInfo(zone_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise CommandError(f'Неизвестный часовой пояс STREAK_TIME_ZONE: {zone_name}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть не меньше 1')
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Дата должна быть в формате YYYY-MM-DD')
+        else:
+            day = timezone.localdate(timezone=zone) - timedelta(days=1)
+
+        # С первого необработанного дня: пропущенная ночь обрабатывается, а не теряется
+        oldest = Profile.objects.filter(streak_date__lt=day).aggregate(oldest=Min('streak_date'))['oldest']
+        current = oldest + timedelta(days=1) if oldest else day
+        advanced = reset = 0
+        while current <= day:
+            day_advanced, day_reset = self.rollover_day(current, options)
+            advanced += day_advanced
+            reset += day_reset
+            current += timedelta(days=1)
+
+        # Дни до обработанного больше не нужны; сам день остаётся для повторного запуска
+        pruned = self.prune(day, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Серии по {day.isoformat()} ({zone.key}): продлено {advanced}, сброшено {reset}, '
+            f'удалено старых дней активности: {pruned}'
+        ))
+
+    def rollover_day(self, day, options):
+        active = Exists(ActivityDay.objects.filter(user_id=OuterRef('user_id'), day=day))
+        # Уже пересчитанные за этот день профили не трогаем - так запуск можно повторить
+        pending = Q(streak_date__isnull=True) | Q(streak_date__lt=day)
+
+        high = Profile.objects.aggregate(high=Max('pk'))['high'] or 0
+        advanced = reset = 0
+        for low in range(0, high, options['chunk_size']):
+            chunk = Profile.objects.filter(pk__gt=low, pk__lte=low + options['chunk_size']).filter(pending)
+            with transaction.atomic():
+                advanced += chunk.filter(active).update(streak=F('streak') + 1, streak_date=day, updated_at=Now())
+                reset += chunk.filter(~active).update(streak=0, streak_date=day, updated_at=Now())
+            if options['pause']:
+                time.sleep(options['pause'])
+        return advanced, reset
+
+    def prune(self, day, chunk_size):
+        pruned = 0
+        while ids := list(ActivityDay.objects.filter(day__lt=day).values_list('pk', flat=True)[:chunk_size]):
+            with transaction.atomic():
+                pruned += ActivityDay.objects.filter(pk__in=ids).delete()[0]
+        return pruned
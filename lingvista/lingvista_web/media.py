@@ -0,0 +1,179 @@
+"""Отдача медиафайлов (аудио) с поддержкой Range, ETag и 304.
+
+Режим разгрузки задаётся в settings.MEDIA_OFFLOAD:
+    None      - файл читается и отдаётся Django порциями;
+    'sendfile' - заголовок X-Sendfile (Apache mod_xsendfile, lighttpd);
+    'accel'    - заголовок X-Accel-Redirect (nginx), путь = MEDIA_ACCEL_PREFIX + имя файла.
+"""
+import mimetypes
+import os
+import re
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+MAX_RANGES = 16
+MEDIA_MAX_AGE = 24 * 60 * 60
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def file_etag(stat):
+    # Сильный ETag по размеру и времени изменения, без чтения файла
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_ranges(header, size):
+    """Разбирает заголовок Range.
+
+    Возвращает список (start, end) включительно, [] если ни один диапазон
+    не попадает в файл (416), или None, если заголовок надо игнорировать.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = []
+    for part in header[len('bytes='):].split(','):
+        match = RANGE_RE.match(part)
+        if not match or match.groups() == ('', ''):
+            return None
+        first, last = match.groups()
+        if first == '':
+            # bytes=-500 - последние 500 байт
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        if start < size and start <= end:
+            ranges.append((start, end))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _multipart(path, ranges, size, content_type, boundary):
+    for start, end in ranges:
+        yield (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode()
+        yield from _read_range(path, start, end)
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # Слабое сравнение (RFC 9110, 13.1.2): W/ не учитывается, в заголовке может быть список
+        etags = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+        return etag in etags or '*' in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def _range_allowed(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _offload(response, path, name):
+    mode = getattr(settings, 'MEDIA_OFFLOAD', None)
+    if mode == 'sendfile':
+        response['X-Sendfile'] = path
+    elif mode == 'accel':
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + name
+    else:
+        return False
+    return True
+
+
+async def _aiterate(iterator):
+    # Чтение файла в потоке пула, event loop ASGI-сервера не блокируется
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
+
+
+def serve_file(request, name, asynchronous=False):
+    """Отдаёт файл из MEDIA_ROOT с учётом Range/If-None-Match/If-Modified-Since.
+
+    asynchronous=True - тело отдаётся асинхронным итератором (для async view под ASGI).
+    """
+    path = default_storage.path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Файл не найден')
+    size, mtime = stat.st_size, stat.st_mtime
+    etag = file_etag(stat)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if _not_modified(request, etag, mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content_type=content_type)
+        if not _offload(response, path, name):
+            response = _stream(request, path, size, content_type, etag, mtime, asynchronous)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = f'public, max-age={MEDIA_MAX_AGE}'
+    return response
+
+
+def _stream(request, path, size, content_type, etag, mtime, asynchronous=False):
+    ranges = None
+    if _range_allowed(request, etag, mtime):
+        ranges = parse_ranges(request.headers.get('Range'), size)
+    wrap = _aiterate if asynchronous else iter
+
+    if ranges is None:
+        if asynchronous:
+            response = StreamingHttpResponse(wrap(_read_range(path, 0, size - 1)), content_type=content_type)
+            response['Content-Length'] = str(size)
+            return response
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.block_size = CHUNK_SIZE
+        return response
+
+    if not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(wrap(_read_range(path, start, end)), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
+    boundary = uuid.uuid4().hex
+    return StreamingHttpResponse(
+        wrap(_multipart(path, ranges, size, content_type, boundary)),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}',
+    )
@@ -0,0 +1,221 @@
+"""Метрики запросов: время, SQL, рендеринг шаблонов, размер ответа.
+
+MetricsMiddleware собирает значения по имени URL (tasks, lessons, profile...)
+в гистограммы в памяти процесса, metrics_view отдаёт их в текстовом формате
+Prometheus. Медленные запросы и запросы с повторяющимся SQL (N+1)
+пишутся в лог 'lingvista_web.metrics' с уровнем WARNING, случайная
+выборка остальных (METRICS_TRACE_SAMPLE_RATE) - с уровнем INFO.
+"""
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template as BackendTemplate
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}  # (метрика, view) -> Histogram
+        self.counters = defaultdict(int)  # (метрика, view) -> значение
+
+    def observe(self, values, view):
+        # Одна блокировка на весь запрос
+        with self.lock:
+            for name, buckets, value in values:
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[(name, view)] = Histogram(buckets)
+                histogram.observe(value)
+
+    def increment(self, name, view):
+        with self.lock:
+            self.counters[(name, view)] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f'# TYPE {name} counter')
+                for (metric, view), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{{view="{view}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+# Время рендеринга текущего запроса; contextvar, а не threading.local - под ASGI
+# в одном потоке идут несколько запросов, а в sync_to_async контекст копируется
+_render_time = ContextVar('render_time', default=None)
+
+
+class QueryRecorder:
+    """Обёртка для connection.execute_wrapper: число, время и текст запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1  # sql с плейсхолдерами - одинаков для повторов
+
+
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            if _render_time.get() is not None:
+                _render_time.set(_render_time.get() + time.perf_counter() - start)
+    wrapper.instrumented = True
+    return wrapper
+
+
+if not getattr(BackendTemplate.render, 'instrumented', False):
+    BackendTemplate.render = _timed_render(BackendTemplate.render)
+
+
+def _normalize(sql):
+    return re.sub(r'\s+', ' ', sql)[:300]
+
+
+class MetricsMiddleware:
+    # Работает и под ASGI: синхронный middleware в цепочке перевёл бы async view в поток
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 500) / 1000
+        self.sample_rate = getattr(settings, 'METRICS_TRACE_SAMPLE_RATE', 0.01)
+        self.repeat_threshold = getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = _render_time.set(0)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            render_time = _render_time.get()
+            _render_time.reset(token)
+        self.record(request, response, elapsed, recorder, render_time)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = _render_time.set(0)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            render_time = _render_time.get()
+            _render_time.reset(token)
+        self.record(request, response, elapsed, recorder, render_time)
+        return response
+
+    def record(self, request, response, elapsed, recorder, render_time):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        values = [
+            ('lingvista_request_duration_seconds', TIME_BUCKETS, elapsed),
+            ('lingvista_db_queries', COUNT_BUCKETS, recorder.count),
+            ('lingvista_db_duration_seconds', TIME_BUCKETS, recorder.duration),
+            ('lingvista_template_render_seconds', TIME_BUCKETS, render_time),
+        ]
+        if not response.streaming:
+            values.append(('lingvista_response_size_bytes', SIZE_BUCKETS, len(response.content)))
+        registry.observe(values, view)
+
+        repeated = [(sql, count) for sql, count in recorder.statements.items() if count >= self.repeat_threshold]
+        if repeated:
+            registry.increment('lingvista_n_plus_one_total', view)
+        slow = elapsed >= self.slow_seconds
+        if repeated or slow or random.random() < self.sample_rate:
+            self.log_trace(request, view, elapsed, recorder, render_time, repeated, slow)
+
+    def log_trace(self, request, view, elapsed, recorder, render_time, repeated, slow=False):
+        # WARNING - только медленные запросы и N+1; случайная выборка идёт в INFO
+        level = logging.WARNING if slow or repeated else logging.INFO
+        logger.log(
+            level, '%s %s [%s]: %.1f ms, SQL %d (%.1f ms), шаблоны %.1f ms',
+            request.method, request.path, view, elapsed * 1000,
+            recorder.count, recorder.duration * 1000, render_time * 1000,
+        )
+        for sql, count in repeated:
+            logger.warning('  возможный N+1: %d раз: %s', count, _normalize(sql))
+
+
+def metrics_view(request):
+    # За обратным прокси REMOTE_ADDR у всех запросов 127.0.0.1, поэтому доступ - по токену
+    # (Authorization: Bearer <METRICS_TOKEN>) или для персонала; список IP - только без прокси
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    allowed = (
+        (token and constant_time_compare(authorization, f'Bearer {token}'))
+        or request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+        or request.user.is_staff
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:17
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0002_userprogress_progresssnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='userprogress',
+            unique_together={('user', 'task')},
+        ),
+    ]
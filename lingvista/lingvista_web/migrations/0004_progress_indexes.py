@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0003_userprogress_unique_user_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', 'date_completed'], name='userprogress_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usertasksprogress',
+            index=models.Index(fields=['user', 'date_completed'], name='taskprogress_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(fields=('language_level', 'lesson_number'), name='unique_lesson_number_per_level'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0004_progress_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='peaks',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0005_audio_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='photo_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
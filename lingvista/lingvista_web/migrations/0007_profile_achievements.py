@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_achievements(apps, schema_editor):
+    # Строка "a, b, c" -> строки таблицы, дубликаты отбрасываются
+    Profile = apps.get_model('lingvista_web', 'Profile')
+    Achievement = apps.get_model('lingvista_web', 'Achievement')
+    rows = Profile.objects.exclude(achievements='').values_list('pk', 'achievements').iterator(chunk_size=1000)
+    achievements = [
+        Achievement(profile_id=pk, code=code)
+        for pk, text in rows
+        for code in dict.fromkeys(part.strip()[:100] for part in text.split(','))
+        if code
+    ]
+    Achievement.objects.bulk_create(achievements, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0006_profile_photo_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Achievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=100)),
+                ('date_earned', models.DateTimeField(auto_now_add=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='lingvista_web.profile')),
+            ],
+            options={
+                'ordering': ['date_earned', 'id'],
+                'indexes': [models.Index(fields=['code'], name='achievement_code_idx')],
+                'constraints': [models.UniqueConstraint(fields=('profile', 'code'), name='unique_achievement_per_profile')],
+            },
+        ),
+        migrations.RunPython(copy_achievements, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='profile',
+            name='achievements',
+        ),
+    ]
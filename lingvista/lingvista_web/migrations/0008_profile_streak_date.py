@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0007_profile_achievements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='streak_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
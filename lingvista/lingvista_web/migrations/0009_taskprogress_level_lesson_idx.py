@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0008_profile_streak_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertasksprogress',
+            index=models.Index(fields=['level', 'lesson'], name='taskprogress_level_lesson_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+def number_tasks(apps, schema_editor):
+    # Существующие задания нумеруются в прежнем порядке показа - по id внутри урока
+    Task = apps.get_model('lingvista_web', 'Task')
+    changed = []
+    lesson_id, position = None, 0
+    for task in Task.objects.order_by('lesson_id', 'pk').only('pk', 'lesson_id').iterator(chunk_size=2000):
+        position = position + 1 if task.lesson_id == lesson_id else 1
+        lesson_id = task.lesson_id
+        task.position = position
+        changed.append(task)
+        if len(changed) >= 2000:
+            Task.objects.bulk_update(changed, ['position'])
+            changed = []
+    Task.objects.bulk_update(changed, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0009_taskprogress_level_lesson_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='position',
+            field=models.PositiveIntegerField(blank=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_tasks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('lesson', 'position'), name='unique_task_position_per_lesson'),
+        ),
+    ]
@@ -0,0 +1,166 @@
+from django.db import migrations
+
+# DDL индекса - копия на момент миграции: дальнейшие правки search.py эту миграцию не меняют.
+# Новая схема индекса - новая миграция со своей копией DDL.
+TABLE = 'lingvista_web_search'
+
+# Строки индекса из таблиц контента
+LESSON_ROWS = '''
+    SELECT ls.id * 2, 'lesson', ls.id, l.level, ls.lesson_number, ls.title, COALESCE(ls.description, '')
+    FROM lingvista_web_lesson ls JOIN lingvista_web_languagelevel l ON l.id = ls.language_level_id
+'''
+TASK_ROWS = '''
+    SELECT t.id * 2 + 1, 'task', t.id, l.level, ls.lesson_number, t.question, t.correct_answer
+    FROM lingvista_web_task t
+    JOIN lingvista_web_lesson ls ON ls.id = t.lesson_id
+    JOIN lingvista_web_languagelevel l ON l.id = ls.language_level_id
+'''
+COLUMNS = 'kind, object_id, level, lesson_number, title, body'
+
+SCHEMA = {
+    'sqlite': [
+        f'''CREATE VIRTUAL TABLE {TABLE} USING fts5(
+            kind UNINDEXED, object_id UNINDEXED, level UNINDEXED, lesson_number UNINDEXED, title, body,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )''',
+        f'''CREATE TRIGGER {TABLE}_lesson_insert AFTER INSERT ON lingvista_web_lesson BEGIN
+            INSERT INTO {TABLE} (rowid, {COLUMNS}) {LESSON_ROWS} WHERE ls.id = NEW.id;
+        END''',
+        f'''CREATE TRIGGER {TABLE}_lesson_update AFTER UPDATE ON lingvista_web_lesson BEGIN
+            DELETE FROM {TABLE} WHERE rowid = OLD.id * 2;
+            INSERT INTO {TABLE} (rowid, {COLUMNS}) {LESSON_ROWS} WHERE ls.id = NEW.id;
+        END''',
+        f'''CREATE TRIGGER {TABLE}_lesson_move AFTER UPDATE OF language_level_id, lesson_number
+            ON lingvista_web_lesson BEGIN
+            UPDATE {TABLE} SET
+                level = (SELECT level FROM lingvista_web_languagelevel WHERE id = NEW.language_level_id),
+                lesson_number = NEW.lesson_number
+            WHERE rowid IN (SELECT id * 2 + 1 FROM lingvista_web_task WHERE lesson_id = NEW.id);
+        END''',
+        f'''CREATE TRIGGER {TABLE}_lesson_delete AFTER DELETE ON lingvista_web_lesson BEGIN
+            DELETE FROM {TABLE} WHERE rowid = OLD.id * 2;
+        END''',
+        f'''CREATE TRIGGER {TABLE}_task_insert AFTER INSERT ON lingvista_web_task BEGIN
+            INSERT INTO {TABLE} (rowid, {COLUMNS}) {TASK_ROWS} WHERE t.id = NEW.id;
+        END''',
+        # Смена позиции или аудио индекс не трогает
+        f'''CREATE TRIGGER {TABLE}_task_update AFTER UPDATE ON lingvista_web_task
+            WHEN OLD.question IS NOT NEW.question OR OLD.correct_answer IS NOT NEW.correct_answer
+                OR OLD.lesson_id IS NOT NEW.lesson_id BEGIN
+            DELETE FROM {TABLE} WHERE rowid = OLD.id * 2 + 1;
+            INSERT INTO {TABLE} (rowid, {COLUMNS}) {TASK_ROWS} WHERE t.id = NEW.id;
+        END''',
+        f'''CREATE TRIGGER {TABLE}_task_delete AFTER DELETE ON lingvista_web_task BEGIN
+            DELETE FROM {TABLE} WHERE rowid = OLD.id * 2 + 1;
+        END''',
+        f'''CREATE TRIGGER {TABLE}_level_update AFTER UPDATE OF level ON lingvista_web_languagelevel
+            WHEN OLD.level IS NOT NEW.level BEGIN
+            UPDATE {TABLE} SET level = NEW.level WHERE level = OLD.level;
+        END''',
+    ],
+    'postgresql': [
+        f'''CREATE TABLE {TABLE} (
+            id bigint PRIMARY KEY,
+            kind varchar(6) NOT NULL,
+            object_id bigint NOT NULL,
+            level varchar(2) NOT NULL,
+            lesson_number integer NOT NULL,
+            title text NOT NULL,
+            body text NOT NULL,
+            document tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+            ) STORED
+        )''',
+        f'CREATE INDEX {TABLE}_document_idx ON {TABLE} USING GIN (document)',
+        f'CREATE INDEX {TABLE}_level_idx ON {TABLE} (level)',
+        f'''CREATE FUNCTION {TABLE}_lesson() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM {TABLE} WHERE id = OLD.id * 2;
+                RETURN OLD;
+            END IF;
+            INSERT INTO {TABLE} (id, {COLUMNS}) {LESSON_ROWS} WHERE ls.id = NEW.id
+            ON CONFLICT (id) DO UPDATE SET level = EXCLUDED.level, lesson_number = EXCLUDED.lesson_number,
+                title = EXCLUDED.title, body = EXCLUDED.body;
+            IF TG_OP = 'UPDATE' AND (OLD.language_level_id <> NEW.language_level_id
+                                     OR OLD.lesson_number <> NEW.lesson_number) THEN
+                UPDATE {TABLE} s SET level = l.level, lesson_number = NEW.lesson_number
+                FROM lingvista_web_task t, lingvista_web_languagelevel l
+                WHERE s.id = t.id * 2 + 1 AND t.lesson_id = NEW.id AND l.id = NEW.language_level_id;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql''',
+        f'''CREATE TRIGGER {TABLE}_lesson AFTER INSERT OR UPDATE OR DELETE ON lingvista_web_lesson
+            FOR EACH ROW EXECUTE FUNCTION {TABLE}_lesson()''',
+        f'''CREATE FUNCTION {TABLE}_task() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM {TABLE} WHERE id = OLD.id * 2 + 1;
+                RETURN OLD;
+            END IF;
+            INSERT INTO {TABLE} (id, {COLUMNS}) {TASK_ROWS} WHERE t.id = NEW.id
+            ON CONFLICT (id) DO UPDATE SET level = EXCLUDED.level, lesson_number = EXCLUDED.lesson_number,
+                title = EXCLUDED.title, body = EXCLUDED.body;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql''',
+        f'''CREATE TRIGGER {TABLE}_task AFTER INSERT OR DELETE ON lingvista_web_task
+            FOR EACH ROW EXECUTE FUNCTION {TABLE}_task()''',
+        # Смена позиции или аудио индекс не трогает
+        f'''CREATE TRIGGER {TABLE}_task_update AFTER UPDATE OF question, correct_answer, lesson_id
+            ON lingvista_web_task FOR EACH ROW EXECUTE FUNCTION {TABLE}_task()''',
+        f'''CREATE FUNCTION {TABLE}_level() RETURNS trigger AS $$
+        BEGIN
+            UPDATE {TABLE} SET level = NEW.level WHERE level = OLD.level;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql''',
+        f'''CREATE TRIGGER {TABLE}_level AFTER UPDATE OF level ON lingvista_web_languagelevel
+            FOR EACH ROW WHEN (OLD.level IS DISTINCT FROM NEW.level) EXECUTE FUNCTION {TABLE}_level()''',
+    ],
+}
+
+DROP = {
+    # Триггеры висят на таблицах контента, вместе с индексом они не удаляются
+    'sqlite': [
+        f'DROP TRIGGER IF EXISTS {TABLE}_{name}'
+        for name in ('lesson_insert', 'lesson_update', 'lesson_move', 'lesson_delete',
+                     'task_insert', 'task_update', 'task_delete', 'level_update')
+    ] + [f'DROP TABLE IF EXISTS {TABLE}'],
+    'postgresql': [
+        f'DROP FUNCTION IF EXISTS {TABLE}_lesson, {TABLE}_task, {TABLE}_level CASCADE',
+        f'DROP TABLE IF EXISTS {TABLE}',
+    ],
+}
+
+
+def install_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = SCHEMA.get(connection.vendor)
+    if statements is None:
+        return
+    key = 'rowid' if connection.vendor == 'sqlite' else 'id'
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute(f'INSERT INTO {TABLE} ({key}, {COLUMNS}) {LESSON_ROWS}')
+        cursor.execute(f'INSERT INTO {TABLE} ({key}, {COLUMNS}) {TASK_ROWS}')
+
+
+def uninstall_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for statement in DROP.get(connection.vendor, []):
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0010_task_position'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    apps.get_model('lingvista_web', 'ContentVersion').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0013_profile_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
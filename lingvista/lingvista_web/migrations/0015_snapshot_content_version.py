@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0014_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progresssnapshot',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:12
+
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_recent_days(apps, schema_editor):
+    # Последние попытки за двое суток - чтобы первый пересчёт после миграции не сбросил активных
+    ActivityDay = apps.get_model('lingvista_web', 'ActivityDay')
+    UserTasksProgress = apps.get_model('lingvista_web', 'UserTasksProgress')
+    zone = ZoneInfo(getattr(settings, 'STREAK_TIME_ZONE', settings.TIME_ZONE))
+    rows = UserTasksProgress.objects.filter(date_completed__gte=timezone.now() - timedelta(days=2))
+    days = {
+        (user_id, timezone.localtime(completed, zone).date())
+        for user_id, completed in rows.values_list('user_id', 'date_completed').iterator()
+    }
+    ActivityDay.objects.bulk_create(
+        [ActivityDay(user_id=user_id, day=day) for user_id, day in days], batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lingvista_web', '0015_snapshot_content_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='activityday_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_activity_day')],
+            },
+        ),
+        migrations.RunPython(backfill_recent_days, migrations.RunPython.noop),
+    ]
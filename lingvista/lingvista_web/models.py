@@ -1,76 +1,123 @@
+import mimetypes
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F, Max
+from django.db.models.functions import Now
 from django.contrib.auth.models import User
+from django.urls import reverse
 
 class Audio(models.Model):
     title = models.CharField(max_length=255, blank=True, null=True)  # Название аудио
     audio_file = models.FileField(upload_to='audio/', blank=True, null=True)  # Файл аудио
     audio_url = models.URLField(blank=True, null=True)  # Ссылка на аудио
     description = models.TextField(blank=True, null=True)  # Описание (необязательно)
+    renditions = models.JSONField(default=dict, blank=True)  # Сжатые версии файла (transcoding.py)
+    duration = models.FloatField(blank=True, null=True)  # Длительность, секунды
+    peaks = models.JSONField(default=list, blank=True)  # Пики для waveform
 
     def __str__(self):
         return self.title or "Audio"
 
+    def get_renditions(self):
+        """Готовые версии, сделанные из текущего файла; после замены файла старые не отдаются."""
+        if not self.audio_file or self.renditions.get('source') != self.audio_file.name:
+            return {}
+        return {key: rendition for key, rendition in self.renditions.items() if isinstance(rendition, dict)}
+
+    def get_sources(self):
+        """Варианты для <source>: сначала самые лёгкие, оригинал последним."""
+        url = reverse('audio', args=[self.pk])
+        sources = [
+            {'url': f'{url}?rendition={key}', 'type': rendition['type'], 'size': rendition['size']}
+            for key, rendition in self.get_renditions().items()
+        ]
+        sources.sort(key=lambda source: source['size'])
+        if self.audio_file:
+            sources.append({'url': url, 'type': mimetypes.guess_type(self.audio_file.name)[0] or 'audio/mpeg'})
+        elif self.audio_url:
+            # Только внешняя ссылка: audio_view перенаправит на неё, тип известен не всегда
+            sources.append({'url': url, 'type': mimetypes.guess_type(self.audio_url)[0]})
+        return sources
+
+class ProfileQuerySet(models.QuerySet):
+    # Массовые варианты: одно UPDATE/INSERT на все профили выборки.
+    # update() не трогает auto_now, поэтому updated_at (валидатор страниц, conditional.py) ставится явно
+
+    def increment_streak(self):
+        return self.update(streak=F('streak') + 1, updated_at=Now())
+
+    def reset_streak(self):
+        return self.update(streak=0, updated_at=Now())
+
+    def complete_level(self):
+        return self.update(completed_levels=F('completed_levels') + 1, updated_at=Now())
+
+    def add_achievement(self, code):
+        achievements = [Achievement(profile_id=pk, code=code) for pk in self.values_list('pk', flat=True)]
+        Achievement.objects.bulk_create(achievements, ignore_conflicts=True)
+        self.update(updated_at=Now())
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    photo_thumbnails = models.JSONField(default=dict, blank=True)  # Миниатюры фото (images.py)
     streak = models.IntegerField(default=0)
+    streak_date = models.DateField(blank=True, null=True)  # День, по который серия пересчитана (rollover_streaks)
     completed_levels = models.IntegerField(default=0)
     language_level = models.CharField(max_length=50, blank=True)
-    achievements = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Любая правка профиля, включая счётчики и достижения
+
+    objects = ProfileQuerySet.as_manager()
 
     def __str__(self):
         return self.user.username
 
     def get_unlocked_levels(self):
-        levels = ['A1']  # A1 всегда доступен
-        level_order = ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']
-
-        for i in range(len(level_order) - 1):
-            current_level = level_order[i]
-            next_level = level_order[i + 1]
+        from .progress import get_unlocked_levels
+        return get_unlocked_levels(self.user)
 
-            # Проверяем, пройдены ли все уроки текущего уровня на 70%
-            lessons = Lesson.objects.filter(language_level__level=current_level)
-            completed = True
+    # Счётчики меняются в БД выражением F(), а не read-modify-write: параллельные запросы не теряют обновлений
+    def _update_counter(self, field, value):
+        setattr(self, field, value)
+        self.save(update_fields=[field, 'updated_at'])
+        self.refresh_from_db(fields=[field])
 
-            for lesson in lessons:
-                progress = UserTasksProgress.objects.filter(
-                    user=self.user,
-                    level=current_level,
-                    lesson=lesson.lesson_number
-                ).first()
+    def increment_streak(self):
+        self._update_counter('streak', F('streak') + 1)
 
-                if not progress or progress.result < 70:
-                    completed = False
-                    break
+    def reset_streak(self):
+        self._update_counter('streak', 0)
 
-            if completed and next_level not in levels:
-                levels.append(next_level)
+    def complete_level(self):
+        self._update_counter('completed_levels', F('completed_levels') + 1)
 
-        return levels
+    def add_achievement(self, achievement):
+        # Повторное добавление ничего не делает
+        Achievement.objects.bulk_create([Achievement(profile=self, code=achievement)], ignore_conflicts=True)
+        self.save(update_fields=['updated_at'])
 
-    def __str__(self):
-        return self.user.username
+    def get_achievements(self):
+        return list(self.achievements.values_list('code', flat=True))
 
-    def increment_streak(self):
-        self.streak += 1
-        self.save()
 
-    def reset_streak(self):
-        self.streak = 0
-        self.save()
+class Achievement(models.Model):
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='achievements')
+    code = models.CharField(max_length=100)
+    date_earned = models.DateTimeField(auto_now_add=True)
 
-    def complete_level(self):
-        self.completed_levels += 1
-        self.save()
+    class Meta:
+        ordering = ['date_earned', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'code'], name='unique_achievement_per_profile'),
+        ]
+        indexes = [
+            models.Index(fields=['code'], name='achievement_code_idx'),
+        ]
 
-    def add_achievement(self, achievement):
-        if self.achievements:
-            self.achievements += f", {achievement}"
-        else:
-            self.achievements = achievement
-        self.save()
+    def __str__(self):
+        return f"{self.profile} - {self.code}"
 
 
 class LanguageLevel(models.Model):
@@ -96,6 +143,12 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # Заодно индекс для выборки уроков уровня по порядку номеров
+            models.UniqueConstraint(fields=['language_level', 'lesson_number'], name='unique_lesson_number_per_level'),
+        ]
+
     def __str__(self):
         return f"{self.language_level.level} - Lesson {self.lesson_number}: {self.title}"
 
@@ -107,15 +160,43 @@ class Task(models.Model):
     option2 = models.CharField(max_length=255, blank=True, null=True)
     option3 = models.CharField(max_length=255, blank=True, null=True)
     audio = models.ForeignKey(Audio, on_delete=models.SET_NULL, blank=True, null=True)
+    position = models.PositiveIntegerField(blank=True)  # Порядок в уроке; вместе с уроком - ключ для импорта
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lesson', 'position'], name='unique_task_position_per_lesson'),
+        ]
 
     def __str__(self):
         return f"Task for {self.lesson.title}"
 
+    def save(self, *args, **kwargs):
+        if self.position is None:
+            # Новое задание без номера - в конец урока
+            last = Task.objects.filter(lesson_id=self.lesson_id).aggregate(last=Max('position'))['last']
+            self.position = (last or 0) + 1
+        super().save(*args, **kwargs)
+
+class ContentVersion(models.Model):
+    # Версия учебной программы (content_cache.py): одна строка, общая для всех процессов
+    version = models.PositiveIntegerField(default=1)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Content version {self.version}"
+
 class UserProgress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='progress')
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     completed = models.BooleanField(default=False)
     date_completed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'task')
+        indexes = [
+            models.Index(fields=['user', 'date_completed'], name='userprogress_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.task.lesson.title} - Task {self.task.id}"
 
@@ -128,6 +209,96 @@ class UserTasksProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'level', 'lesson')
+        indexes = [
+            models.Index(fields=['user', 'date_completed'], name='taskprogress_user_date_idx'),
+            # Фильтр по уровню в админке и сброс прогресса урока
+            models.Index(fields=['level', 'lesson'], name='taskprogress_level_lesson_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - Level {self.level} - Lesson {self.lesson} - Result {self.result}%"
+
+class ActivityDay(models.Model):
+    # День, в который пользователь проходил уроки (в поясе STREAK_TIME_ZONE); читает rollover_streaks.
+    # В отличие от UserTasksProgress.date_completed не перезаписывается повторной попыткой
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_days')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_activity_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='activityday_day_idx'),  # очистка старых дней
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day}"
+
+class ProgressSnapshot(models.Model):
+    # Денормализованный прогресс пользователя, обновляется при каждой записи результата
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='progress_snapshot')
+    lesson_scores = models.JSONField(default=dict)  # {"A1": {"1": 80, "2": 100}, ...} - лучший результат урока
+    completed_levels = models.JSONField(default=list)
+    unlocked_levels = models.JSONField(default=list)
+    content_version = models.PositiveIntegerField(default=0)  # версия программы, по которой посчитаны уровни
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot for {self.user_id}"
+
+    def get_score(self, level, lesson):
+        return self.lesson_scores.get(level, {}).get(str(lesson), 0)
+
+
+class TaskStats(models.Model):
+    # Счётчики задания по последней попытке каждого пользователя (как в UserProgress), см. analytics.py
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)  # пользователей, решавших задание
+    correct = models.PositiveIntegerField(default=0)  # из них ответили верно
 
     def __str__(self):
-        return f"{self.user.username} - Level {self.level} - Lesson {self.lesson} - Result {self.result}%"
\ No newline at end of file
+        return f"Stats for task {self.task_id}"
+
+    @property
+    def correct_rate(self):
+        return round(self.correct * 100 / self.attempts, 1) if self.attempts else None
+
+
+class LessonStats(models.Model):
+    # Распределение лучших результатов урока (как в UserTasksProgress); ключ - тот же (level, lesson)
+    BUCKETS = 10  # корзины по 10%: 0-9, 10-19, ..., 90-100
+
+    level = models.CharField(max_length=2)
+    lesson = models.IntegerField()
+    attempts = models.PositiveIntegerField(default=0)  # пользователей с результатом урока
+    score_sum = models.PositiveIntegerField(default=0)
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['level', 'lesson'], name='unique_lesson_stats'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.level} lesson {self.lesson}"
+
+    @staticmethod
+    def bucket_field(score):
+        return f'bucket_{min(max(score, 0) // 10, LessonStats.BUCKETS - 1)}'
+
+    @property
+    def average(self):
+        return round(self.score_sum / self.attempts, 1) if self.attempts else None
+
+    def get_histogram(self):
+        return [getattr(self, f'bucket_{i}') for i in range(self.BUCKETS)]
@@ -0,0 +1,233 @@
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from . import analytics, content_cache
+from .models import ActivityDay, ContentVersion, LanguageLevel, Lesson, ProgressSnapshot, UserProgress, UserTasksProgress
+
+PASS_RESULT = 70  # минимальный результат урока (%), чтобы он считался пройденным
+LEVEL_ORDER = [code for code, _ in LanguageLevel.LEVEL_CHOICES]
+
+
+def _completion(totals_by_level, passed_by_level):
+    # Уровень без уроков считается пройденным, как и раньше
+    return {
+        code: passed_by_level.get(code, 0) >= totals_by_level.get(code, 0)
+        for code in LEVEL_ORDER
+    }
+
+
+def _is_unlocked(index, completed):
+    return index == 0 or completed[LEVEL_ORDER[index - 1]]  # A1 всегда доступен
+
+
+def _build_states(levels, passed_by_level):
+    # levels - уровни из БД с аннотацией lessons_total,
+    # passed_by_level - {код уровня: количество пройденных уроков}
+    levels_by_code = {level.level: level for level in levels}
+    completed = _completion(
+        {level.level: level.lessons_total for level in levels},
+        passed_by_level,
+    )
+
+    states = []
+    for i, code in enumerate(LEVEL_ORDER):
+        level = levels_by_code.get(code)
+        if level is None:
+            continue
+        states.append({
+            'level': level,
+            'lessons_total': level.lessons_total,
+            'lessons_passed': passed_by_level.get(code, 0),
+            'is_completed': completed[code],
+            'is_unlocked': _is_unlocked(i, completed),
+        })
+    return states
+
+
+def _annotated_levels(user):
+    # Один запрос: LanguageLevel -> Lesson и подзапрос к UserTasksProgress
+    passed = UserTasksProgress.objects.filter(
+        user=user,
+        level=OuterRef('level'),
+        lesson=OuterRef('lessons__lesson_number'),
+        result__gte=PASS_RESULT,
+    )
+    return list(LanguageLevel.objects.annotate(
+        lessons_total=Count('lessons'),
+        lessons_passed=Count('lessons', filter=Exists(passed)),
+    ))
+
+
+def get_level_states(user):
+    """Состояние всех уровней пользователя (пройден / открыт) за один запрос."""
+    levels = _annotated_levels(user)
+    return _build_states(levels, {level.level: level.lessons_passed for level in levels})
+
+
+def get_level_states_bulk(users):
+    """Состояние уровней сразу для многих пользователей (отчёты, рейтинги).
+
+    Возвращает {user_id: [состояния уровней]} за два запроса
+    независимо от количества пользователей и уроков.
+    """
+    user_ids = [getattr(user, 'pk', user) for user in users]
+    levels = list(LanguageLevel.objects.annotate(
+        lessons_total=Count('lessons__lesson_number', distinct=True),
+    ))
+
+    lesson_exists = Lesson.objects.filter(
+        language_level__level=OuterRef('level'),
+        lesson_number=OuterRef('lesson'),
+    )
+    rows = (
+        UserTasksProgress.objects
+        .filter(user_id__in=user_ids, result__gte=PASS_RESULT)
+        .filter(Exists(lesson_exists))
+        .values('user_id', 'level')
+        .annotate(passed=Count('id'))
+        .order_by()
+    )
+    passed = {user_id: {} for user_id in user_ids}
+    for row in rows:
+        passed[row['user_id']][row['level']] = row['passed']
+
+    return {user_id: _build_states(levels, passed[user_id]) for user_id in user_ids}
+
+
+def get_unlocked_levels(user):
+    levels = _annotated_levels(user)
+    completed = _completion(
+        {level.level: level.lessons_total for level in levels},
+        {level.level: level.lessons_passed for level in levels},
+    )
+    return [code for i, code in enumerate(LEVEL_ORDER) if _is_unlocked(i, completed)]
+
+
+def lessons_by_level():
+    lessons = {code: set() for code in LEVEL_ORDER}
+    for code, number in Lesson.objects.values_list('language_level__level', 'lesson_number'):
+        lessons.setdefault(code, set()).add(number)
+    return lessons
+
+
+def _apply_levels(snapshot, lessons, version):
+    # Пересчитывает пройденные и открытые уровни по лучшим результатам уроков;
+    # version - версия программы, из которой взяты lessons
+    passed = {
+        code: sum(1 for number in numbers if snapshot.get_score(code, number) >= PASS_RESULT)
+        for code, numbers in lessons.items()
+    }
+    completed = _completion({code: len(numbers) for code, numbers in lessons.items()}, passed)
+    snapshot.completed_levels = [code for code in LEVEL_ORDER if completed[code]]
+    snapshot.unlocked_levels = [code for i, code in enumerate(LEVEL_ORDER) if _is_unlocked(i, completed)]
+    snapshot.content_version = version
+
+
+def build_snapshot(user_id, results, lessons, version):
+    """Строит снимок прогресса с нуля по строкам UserTasksProgress.
+
+    results - пары (уровень, номер урока, результат) пользователя.
+    """
+    snapshot = ProgressSnapshot(user_id=user_id, lesson_scores={})
+    for level, lesson, result in results:
+        scores = snapshot.lesson_scores.setdefault(level, {})
+        scores[str(lesson)] = max(scores.get(str(lesson), 0), result)
+    _apply_levels(snapshot, lessons, version)
+    return snapshot
+
+
+def rebuild_snapshot(user):
+    version = content_cache.get_version()  # до чтения уроков: при гонке снимок лишь пересчитается ещё раз
+    results = UserTasksProgress.objects.filter(user=user).values_list('level', 'lesson', 'result')
+    snapshot = build_snapshot(user.pk, results, lessons_by_level(), version)
+    snapshot.save()
+    return snapshot
+
+
+def refresh_levels(snapshot, version):
+    """Пересчитывает уровни снимка, если с его записи добавили или удалили уроки."""
+    if version is None or snapshot.content_version == version:
+        return snapshot
+    _apply_levels(snapshot, lessons_by_level(), version)
+    # Только поля уровней: параллельный record_result мог обновить lesson_scores
+    snapshot.save(update_fields=['completed_levels', 'unlocked_levels', 'content_version', 'updated_at'])
+    return snapshot
+
+
+def _snapshot_with_version(user):
+    content = ContentVersion.objects.filter(pk=content_cache.VERSION_PK).values('version')
+    return ProgressSnapshot.objects.filter(pk=user.pk).annotate(current_version=Subquery(content))
+
+
+def get_snapshot(user):
+    """Снимок прогресса пользователя одним запросом по первичному ключу (вместе с версией программы)."""
+    snapshot = _snapshot_with_version(user).first()
+    if snapshot is None:
+        return rebuild_snapshot(user)
+    return refresh_levels(snapshot, snapshot.current_version)
+
+
+async def aget_snapshot(user):
+    snapshot = await _snapshot_with_version(user).afirst()
+    if snapshot is None:
+        return await sync_to_async(rebuild_snapshot)(user)
+    if snapshot.content_version != snapshot.current_version:
+        snapshot = await sync_to_async(refresh_levels)(snapshot, snapshot.current_version)
+    return snapshot
+
+
+def activity_day():
+    """Сегодняшний день в поясе, по которому считаются серии (settings.STREAK_TIME_ZONE)."""
+    return timezone.localdate(timezone=ZoneInfo(getattr(settings, 'STREAK_TIME_ZONE', settings.TIME_ZONE)))
+
+
+@transaction.atomic
+def record_result(user, level, lesson, result, tasks=()):
+    """Сохраняет результат урока и в той же транзакции обновляет снимок прогресса.
+
+    tasks - проверенные задачи урока (с is_correct), по ним пишется UserProgress.
+    Все строки пишутся пакетно через bulk_create(update_conflicts=True).
+    """
+    version = content_cache.get_version()
+    lessons = lessons_by_level()
+    snapshot = ProgressSnapshot.objects.select_for_update().filter(pk=user.pk).first()
+    if snapshot is None:
+        results = UserTasksProgress.objects.filter(user=user).values_list('level', 'lesson', 'result')
+        snapshot = build_snapshot(user.pk, results, lessons, version)
+
+    # В UserTasksProgress хранится лучший результат урока, как и в снимке,
+    # и время последней попытки
+    previous_best = snapshot.lesson_scores.get(level, {}).get(str(lesson))
+    best = max(previous_best or 0, result)
+    UserTasksProgress.objects.bulk_create(
+        [UserTasksProgress(user=user, level=level, lesson=lesson, result=best)],
+        update_conflicts=True,
+        unique_fields=['user', 'level', 'lesson'],
+        update_fields=['result', 'date_completed'],
+    )
+    previous = {}  # прежнее состояние заданий - для счётчиков analytics
+    if tasks:
+        rows = UserProgress.objects.filter(user=user, task_id__in=[task.id for task in tasks])
+        previous = dict(rows.values_list('task_id', 'completed'))
+    UserProgress.objects.bulk_create(
+        [UserProgress(user=user, task=task, completed=task.is_correct) for task in tasks],
+        update_conflicts=True,
+        unique_fields=['user', 'task'],
+        update_fields=['completed', 'date_completed'],
+    )
+
+    # День активности для серий (rollover_streaks): повторная попытка его не стирает
+    ActivityDay.objects.bulk_create([ActivityDay(user=user, day=activity_day())], ignore_conflicts=True)
+
+    analytics.record_tasks(previous, tasks)
+    analytics.record_lesson(level, lesson, previous_best, best)
+
+    snapshot.lesson_scores.setdefault(level, {})[str(lesson)] = best
+    _apply_levels(snapshot, lessons, version)
+    snapshot.save()
+    return snapshot
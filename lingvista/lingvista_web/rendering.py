@@ -0,0 +1,63 @@
+import logging
+from functools import wraps
+from pathlib import Path
+
+from django.apps import apps
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import TemplateSyntaxError
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_SUBDIR = 'html'
+
+
+def iter_template_files():
+    for app_config in apps.get_app_configs():
+        root = Path(app_config.path) / 'templates'
+        for path in sorted((root / TEMPLATES_SUBDIR).rglob('*.html')):
+            yield path.relative_to(root).as_posix(), path
+
+
+def iter_template_names():
+    for name, _ in iter_template_files():
+        yield name
+
+
+def warm_up_templates():
+    """Компилирует все шаблоны html/** заранее, чтобы они попали в cached.Loader."""
+    compiled = 0
+    for name in iter_template_names():
+        try:
+            get_template(name)
+        except TemplateSyntaxError:
+            logger.exception('Не удалось скомпилировать шаблон %s', name)
+        else:
+            compiled += 1
+    return compiled
+
+
+def cache_for_anonymous(timeout, key_prefix):
+    """Кэширует готовую страницу для анонимных GET-запросов.
+
+    В отличие от cache_page не зависит от Vary: Cookie, а авторизованным
+    пользователям всегда отдаёт свежую страницу (в навбаре их данные и csrf-токен).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = f'anonymous-page:{key_prefix}:{request.get_full_path()}'
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, response.content, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,154 @@
+"""Полнотекстовый поиск по урокам (title, description) и заданиям (question, correct_answer).
+
+Индекс - отдельная таблица lingvista_web_search:
+    SQLite     - виртуальная таблица FTS5 с префиксным индексом, ранжирование bm25;
+    PostgreSQL - обычная таблица с колонкой tsvector и GIN-индексом, ранжирование ts_rank.
+rowid/id строки индекса: урок - id * 2, задание - id * 2 + 1.
+
+Индекс обновляют триггеры БД, а не сигналы: так в него попадают и bulk_create,
+и upsert из import_curriculum, и каскадные удаления. Таблица и триггеры создаются
+миграцией 0011 (DDL лежит в ней), пересобирается индекс командой rebuild_search_index.
+На других движках индекса нет, поиск идёт через icontains.
+
+Правильные ответы (body заданий) ищет только персонал: ученику задание находится
+лишь по вопросу (колонка title), иначе поиск превращается в подсказку ответов.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Lesson, Task
+
+TABLE = 'lingvista_web_search'
+MAX_TERMS = 8
+MIN_PREFIX = 2  # более короткие слова ищутся целиком: префикс из одной буквы - полпрограммы
+WORD_RE = re.compile(r'\w+')
+
+# Строки индекса из таблиц контента: общие для пересборки на обоих движках
+LESSON_ROWS = '''
+    SELECT ls.id * 2, 'lesson', ls.id, l.level, ls.lesson_number, ls.title, COALESCE(ls.description, '')
+    FROM lingvista_web_lesson ls JOIN lingvista_web_languagelevel l ON l.id = ls.language_level_id
+'''
+TASK_ROWS = '''
+    SELECT t.id * 2 + 1, 'task', t.id, l.level, ls.lesson_number, t.question, t.correct_answer
+    FROM lingvista_web_task t
+    JOIN lingvista_web_lesson ls ON ls.id = t.lesson_id
+    JOIN lingvista_web_languagelevel l ON l.id = ls.language_level_id
+'''
+COLUMNS = 'kind, object_id, level, lesson_number, title, body'
+
+QUERY = {
+    'sqlite': f'''
+        SELECT kind, object_id, level, lesson_number, title FROM {TABLE}
+        WHERE {TABLE} MATCH %s {{answer_filter}} {{level_filter}}
+        ORDER BY bm25({TABLE}, 0, 0, 0, 0, 4.0, 1.0), rowid
+        LIMIT %s
+    ''',
+    'postgresql': f'''
+        SELECT kind, object_id, level, lesson_number, title FROM {TABLE}, to_tsquery('simple', %s) query
+        WHERE document @@ query {{answer_filter}} {{level_filter}}
+        ORDER BY ts_rank(document, query) DESC, id
+        LIMIT %s
+    ''',
+}
+# Без поиска по ответам: задание должно совпасть с запросом в title
+ANSWER_FILTER = {
+    'sqlite': f"AND (kind = 'lesson' OR rowid IN (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s))",
+    'postgresql': "AND (kind = 'lesson' OR document @@ to_tsquery('simple', %s))",
+}
+
+
+def rebuild(connection=connection):
+    """Пересобирает индекс из таблиц контента; возвращает число строк."""
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        key = 'rowid' if connection.vendor == 'sqlite' else 'id'
+        cursor.execute(f'INSERT INTO {TABLE} ({key}, {COLUMNS}) {LESSON_ROWS}')
+        cursor.execute(f'INSERT INTO {TABLE} ({key}, {COLUMNS}) {TASK_ROWS}')
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")  # слияние сегментов FTS5
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def build_query(text, vendor, titles_only=False):
+    """Строка поиска -> выражение MATCH/tsquery: все слова обязательны, слова от MIN_PREFIX букв - префиксы.
+
+    titles_only - только колонка title (в tsvector это вес A).
+    """
+    words = WORD_RE.findall(text.lower())[:MAX_TERMS]
+    if vendor == 'postgresql':
+        weight = 'A' if titles_only else ''
+        return ' & '.join(
+            f'{word}:*{weight}' if len(word) >= MIN_PREFIX else f'{word}:{weight}' if weight else word
+            for word in words
+        )
+    match = ' '.join(f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"' for word in words)
+    return f'title : ({match})' if titles_only and match else match
+
+
+def _search_rows(text, level, limit, answers):
+    # Без индекса: icontains по каждому слову, уроки перед заданиями
+    words = WORD_RE.findall(text.lower())[:MAX_TERMS]
+    lessons = Lesson.objects.order_by('pk')
+    tasks = Task.objects.order_by('pk')
+    for word in words:
+        task_match = Q(question__icontains=word)
+        if answers:
+            task_match |= Q(correct_answer__icontains=word)
+        lessons = lessons.filter(Q(title__icontains=word) | Q(description__icontains=word))
+        tasks = tasks.filter(task_match)
+    if level:
+        lessons = lessons.filter(language_level__level=level)
+        tasks = tasks.filter(lesson__language_level__level=level)
+    rows = [
+        ('lesson', *row) for row in
+        lessons.values_list('pk', 'language_level__level', 'lesson_number', 'title')[:limit]
+    ]
+    rows += [
+        ('task', *row) for row in
+        tasks.values_list('pk', 'lesson__language_level__level', 'lesson__lesson_number', 'question')[:limit - len(rows)]
+    ]
+    return rows
+
+
+def search(text, level=None, limit=20, answers=False):
+    """Уроки и задания по запросу, лучшие совпадения первыми; совпадение в заголовке/вопросе весит больше.
+
+    answers=False - правильные ответы заданий не ищутся (для учеников).
+    """
+    if connection.vendor not in QUERY:
+        rows = _search_rows(text, level, limit, answers) if WORD_RE.search(text) else []
+    else:
+        match = build_query(text, connection.vendor)
+        if not match:
+            return []
+        sql = QUERY[connection.vendor].format(
+            answer_filter='' if answers else ANSWER_FILTER[connection.vendor],
+            level_filter='AND level = %s' if level else '',
+        )
+        params = [match]
+        if not answers:
+            params.append(build_query(text, connection.vendor, titles_only=True))
+        params += [level, limit] if level else [limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+    results = []
+    for kind, object_id, code, lesson_number, title in rows:
+        if kind == 'task':
+            url = reverse('tasks', kwargs={'level': code.lower(), 'lesson': lesson_number})
+        else:
+            url = reverse('lessons', kwargs={'level': code.lower()})
+        results.append({
+            'type': kind,
+            'id': object_id,
+            'level': code,
+            'lesson': lesson_number,
+            'title': title,  # у заданий - вопрос; правильный ответ в выдачу не попадает
+            'url': url,
+        })
+    return results
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import content_cache
+from .auth import invalidate_cached_user
+from .conditional import touch_profile
+from .transcoding import queue_transcoding
+from .images import queue_thumbnails, remember_photo_change
+from .models import Audio, LanguageLevel, Lesson, Profile, Task
+
+# Любая правка учебного контента делает кэш предыдущей версии неактуальным
+for model in (LanguageLevel, Lesson, Task, Audio):
+    post_save.connect(content_cache.bump_version, sender=model, dispatch_uid=f'content_version_save_{model.__name__}')
+    post_delete.connect(content_cache.bump_version, sender=model, dispatch_uid=f'content_version_delete_{model.__name__}')
+
+post_save.connect(queue_transcoding, sender=Audio, dispatch_uid='queue_audio_transcoding')
+pre_save.connect(remember_photo_change, sender=Profile, dispatch_uid='remember_profile_photo_change')
+post_save.connect(queue_thumbnails, sender=Profile, dispatch_uid='queue_profile_thumbnails')
+
+# Закэшированный request.user (auth.py) вместе с профилем
+for model in (User, Profile):
+    post_save.connect(invalidate_cached_user, sender=model, dispatch_uid=f'auth_user_save_{model.__name__}')
+    post_delete.connect(invalidate_cached_user, sender=model, dispatch_uid=f'auth_user_delete_{model.__name__}')
+
+# Валидаторы страниц пользователя (conditional.py)
+post_save.connect(touch_profile, sender=User, dispatch_uid='touch_profile_on_user_save')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(configure_sqlite, dispatch_uid='configure_sqlite')
+
+
+def set_journal_mode():
+    """Переводит БД в SQLITE_JOURNAL_MODE; вызывается при старте сервера."""
+    mode = getattr(settings, 'SQLITE_JOURNAL_MODE', None)
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not mode or connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {mode}')
+    connection.close()
@@ -0,0 +1,16 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from lingvista_web.assets import bundle_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def css_bundle(name):
+    """Собранный бандл из STATIC_BUNDLES или, без STATIC_PIPELINE, исходные файлы по отдельности."""
+    if getattr(settings, 'STATIC_PIPELINE', False):
+        return format_html('<link rel="stylesheet" href="{}">', static(bundle_name(name)))
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(source),) for source in settings.STATIC_BUNDLES[name]))
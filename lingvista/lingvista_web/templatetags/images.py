@@ -0,0 +1,10 @@
+from django import template
+
+from lingvista_web import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(profile, size, image_format='jpeg'):
+    return images.thumbnail_url(profile, int(size), image_format)
@@ -1,3 +1,1525 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from datetime import UTC, date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, path, resolve
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import conditional, content_cache
+from .admin import EstimatedCountPaginator
+from .assets import check_static_references, find_static_problems
+from .forms import ProfileEditForm
+from .grading import load_tasks, normalize_answer
+from .images import apply_thumbnails, make_thumbnails, thumbnail_url
+from .metrics import metrics_view, registry
+from .models import (
+    Achievement, ActivityDay, Audio, ContentVersion, LanguageLevel, Lesson, LessonStats, Profile, ProgressSnapshot, Task,
+    TaskStats, UserProgress, UserTasksProgress,
+)
+from .progress import get_level_states, get_level_states_bulk, get_snapshot, record_result
+from .rendering import iter_template_names, warm_up_templates
+from .search import build_query, search
+from .signals import configure_sqlite
+from .transcoding import apply_result, compute_peaks, transcode
+
+
+def create_curriculum(lessons_per_level):
+    for code, _ in LanguageLevel.LEVEL_CHOICES:
+        level = LanguageLevel.objects.create(level=code, description=f'Level {code}')
+        Lesson.objects.bulk_create(
+            Lesson(language_level=level, lesson_number=number, title=f'{code} {number}')
+            for number in range(1, lessons_per_level + 1)
+        )
+
+
+def pass_level(user, code, lessons, result=100):
+    UserTasksProgress.objects.bulk_create(
+        UserTasksProgress(user=user, level=code, lesson=number, result=result)
+        for number in range(1, lessons + 1)
+    )
+
+
+class LevelUnlockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='pass12345')
+        self.profile = Profile.objects.create(user=self.user)
+
+    def test_only_a1_unlocked_without_progress(self):
+        create_curriculum(3)
+        self.assertEqual(self.profile.get_unlocked_levels(), ['A1'])
+
+    def test_level_unlocks_after_all_lessons_passed(self):
+        create_curriculum(3)
+        pass_level(self.user, 'A1', 3)
+        self.assertEqual(self.profile.get_unlocked_levels(), ['A1', 'A2'])
+
+        states = {state['level'].level: state for state in get_level_states(self.user)}
+        self.assertTrue(states['A1']['is_completed'])
+        self.assertTrue(states['A2']['is_unlocked'])
+        self.assertFalse(states['B1']['is_unlocked'])
+
+    def test_low_result_does_not_unlock(self):
+        create_curriculum(2)
+        pass_level(self.user, 'A1', 2, result=69)
+        self.assertEqual(self.profile.get_unlocked_levels(), ['A1'])
+
+    def test_bulk_matches_single_user(self):
+        create_curriculum(2)
+        other = User.objects.create_user('other', password='pass12345')
+        pass_level(self.user, 'A1', 2)
+        pass_level(other, 'A1', 1)
+
+        bulk = get_level_states_bulk([self.user, other])
+        for user in (self.user, other):
+            self.assertEqual(
+                [(s['level'].level, s['is_completed'], s['is_unlocked']) for s in bulk[user.pk]],
+                [(s['level'].level, s['is_completed'], s['is_unlocked']) for s in get_level_states(user)],
+            )
+
+    def test_query_count_does_not_grow_with_lessons(self):
+        for lessons in (1, 20):
+            Lesson.objects.all().delete()
+            LanguageLevel.objects.all().delete()
+            create_curriculum(lessons)
+            pass_level(self.user, 'A1', lessons)
+            with self.assertNumQueries(1):
+                self.profile.get_unlocked_levels()
+            with self.assertNumQueries(2):
+                get_level_states_bulk([self.user])
+            UserTasksProgress.objects.all().delete()
+
+    def test_langlevel_page_lists_levels(self):
+        create_curriculum(1)
+        self.client.force_login(self.user)
+        response = self.client.get('/langlevel_page/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['levels_data']), 6)
+
+
+class ProgressSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='pass12345')
+        create_curriculum(2)
+
+    def test_record_result_updates_snapshot(self):
+        get_snapshot(self.user)
+        record_result(self.user, 'A1', 1, 90)
+        record_result(self.user, 'A1', 2, 75)
+        record_result(self.user, 'A1', 2, 40)  # хуже прежнего - лучший результат сохраняется
+
+        snapshot = ProgressSnapshot.objects.get(pk=self.user.pk)
+        self.assertEqual(snapshot.get_score('A1', 2), 75)
+        self.assertIn('A1', snapshot.completed_levels)
+        self.assertEqual(snapshot.unlocked_levels, ['A1', 'A2'])
+        self.assertEqual(UserTasksProgress.objects.get(user=self.user, level='A1', lesson=2).result, 75)
+
+    def test_snapshot_read_is_single_query(self):
+        get_snapshot(self.user)
+        with self.assertNumQueries(1):
+            get_snapshot(self.user)
+
+    def test_lessons_page_uses_snapshot(self):
+        record_result(self.user, 'A1', 1, 80)
+        self.client.force_login(self.user)
+        response = self.client.get('/a1_lessons_page/')
+        self.assertEqual(response.status_code, 200)
+        scores = [data['score'] for data in response.context['lessons_data']]
+        self.assertEqual(scores, [80, 0])
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        record_result(self.user, 'A1', 1, 80)
+        UserTasksProgress.objects.filter(user=self.user).update(result=100)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_progress_snapshots', '--check', stdout=StringIO())
+
+        call_command('rebuild_progress_snapshots', stdout=StringIO())
+        call_command('rebuild_progress_snapshots', '--check', stdout=StringIO())
+        self.assertEqual(get_snapshot(self.user).get_score('A1', 1), 100)
+
+    def test_check_skips_users_without_snapshot(self):
+        User.objects.create_user('newcomer', password='pass12345')
+        record_result(self.user, 'A1', 1, 80)
+        out = StringIO()
+        call_command('rebuild_progress_snapshots', '--check', stdout=out)
+        self.assertIn('ещё не созданы: 1', out.getvalue())
+
+    def test_levels_follow_curriculum_changes(self):
+        record_result(self.user, 'A1', 1, 90)
+        record_result(self.user, 'A1', 2, 90)
+        self.assertEqual(get_snapshot(self.user).unlocked_levels, ['A1', 'A2'])
+
+        level = LanguageLevel.objects.get(level='A1')
+        Lesson.objects.create(language_level=level, lesson_number=3, title='A1 3')
+        snapshot = get_snapshot(self.user)
+        self.assertNotIn('A1', snapshot.completed_levels)
+        self.assertEqual(snapshot.unlocked_levels, ['A1'])
+        call_command('rebuild_progress_snapshots', '--check', stdout=StringIO())
+
+        Lesson.objects.get(language_level=level, lesson_number=3).delete()
+        self.assertEqual(get_snapshot(self.user).unlocked_levels, ['A1', 'A2'])
+        with self.assertNumQueries(1):
+            get_snapshot(self.user)
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='pass12345')
+        create_curriculum(1)
+        lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        audio = Audio.objects.create(title='clip', audio_file='audio/A1/lesson1.mp3')
+        self.tasks = [
+            Task.objects.create(lesson=lesson, question='2+2', correct_answer='4', option1='3', option2='4'),
+            Task.objects.create(lesson=lesson, question='Listen', correct_answer='Café au lait', audio=audio),
+        ]
+
+    def test_normalize_answer_folds_case_spaces_and_unicode(self):
+        self.assertEqual(normalize_answer('  Cafe\u0301   AU  lait '), normalize_answer('Café au lait'))
+        self.assertEqual(normalize_answer('STRASSE'), normalize_answer('straße'))
+
+    def test_submission_grades_and_writes_in_bulk(self):
+        self.client.force_login(self.user)
+        data = {
+            f'task_{self.tasks[0].pk}': '4',
+            f'audio_answer_{self.tasks[1].pk}': 'cafe\u0301 au  LAIT',
+        }
+        response = self.client.post('/a1_lessons_page/tasks_lesson1/', data)
+        self.assertEqual(response.context['score'], 100)
+        self.assertEqual(response.context['correct_count'], 2)
+        self.assertEqual(UserProgress.objects.filter(user=self.user, completed=True).count(), 2)
+
+        data[f'task_{self.tasks[0].pk}'] = '3'
+        response = self.client.post('/a1_lessons_page/tasks_lesson1/', data)
+        self.assertEqual(response.context['score'], 50)
+        self.assertEqual(UserProgress.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(UserTasksProgress.objects.get(user=self.user).result, 100)
+
+    def test_unknown_lesson_or_level_is_not_recorded(self):
+        self.client.force_login(self.user)
+        for url in ('/a1_lessons_page/tasks_lesson99/', '/zz_lessons_page/tasks_lesson1/',
+                    '/a1xxxxxxxx_lessons_page/tasks_lesson1/'):
+            self.assertEqual(self.client.post(url, {}).status_code, 404, url)
+        self.assertEqual(self.client.get('/zz_lessons_page/tasks_lesson1/').status_code, 404)
+        self.assertFalse(UserTasksProgress.objects.exists())
+        self.assertFalse(ProgressSnapshot.objects.exists())
+        self.assertFalse(LessonStats.objects.exists())
+
+
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        content_cache.reset_backend()
+        create_curriculum(2)
+
+    def tearDown(self):
+        content_cache.reset_backend()
+
+    def test_repeated_reads_hit_cache(self):
+        content_cache.get_lessons('A1')
+        with self.assertNumQueries(1):  # только версия программы
+            lessons = content_cache.get_lessons('A1')
+        self.assertEqual([lesson.lesson_number for lesson in lessons], [1, 2])
+        self.assertEqual(content_cache.get_stats()['hits'], 1)
+        self.assertEqual(content_cache.get_stats()['misses'], 1)
+
+    def test_version_is_read_once_per_request(self):
+        token = content_cache._request_version.set({})
+        self.addCleanup(content_cache._request_version.reset, token)
+        content_cache.get_lessons('A1')
+        with self.assertNumQueries(0):
+            content_cache.get_lessons('A1')
+        Lesson.objects.filter(language_level__level='A1', lesson_number=1).first().save()
+        with self.assertNumQueries(2):  # правка в этом же запросе: версия перечитывается, уроки тоже
+            content_cache.get_lessons('A1')
+
+    def test_cached_page_reads_version_once_per_request(self):
+        lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        Task.objects.create(lesson=lesson, question='Q', correct_answer='A')
+        self.client.get('/a1_lessons_page/tasks_lesson1/')
+        for _ in range(2):  # каждый запрос видит версию из БД, но читает её один раз
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get('/a1_lessons_page/tasks_lesson1/').status_code, 200)
+            self.assertEqual(len(captured), 1)
+            self.assertIn('lingvista_web_contentversion', captured[0]['sql'])
+
+    def test_admin_edit_invalidates_cache(self):
+        self.assertEqual(content_cache.get_lessons('A1')[0].title, 'A1 1')
+        version = content_cache.get_version()
+        lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        lesson.title = 'Greetings'
+        lesson.save()
+        self.assertEqual(content_cache.get_version(), version + 1)
+        self.assertEqual(content_cache.get_lessons('A1')[0].title, 'Greetings')
+
+    def test_edit_from_other_process_invalidates_cache(self):
+        content_cache.get_lessons('A1')
+        # Другой процесс (админка, import_curriculum) меняет данные и версию в БД, минуя сигналы этого
+        Lesson.objects.filter(language_level__level='A1', lesson_number=1).update(title='Greetings')
+        ContentVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(content_cache.get_lessons('A1')[0].title, 'Greetings')
+
+    @override_settings(CONTENT_CACHE={'BACKEND': 'django', 'ALIAS': 'default'})
+    def test_django_cache_backend(self):
+        content_cache.reset_backend()
+        lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        Task.objects.create(lesson=lesson, question='Q', correct_answer='A')
+        audio = Audio.objects.create(title='clip', audio_url='https://example.com/clip.mp3')
+        Task.objects.create(lesson=lesson, question='Listen', correct_answer='B', audio=audio)
+        tasks = content_cache.get_tasks('A1', 1)
+        with self.assertNumQueries(1):
+            cached = content_cache.get_tasks('A1', 1)
+        self.assertEqual([task.pk for task in cached], [task.pk for task in tasks])
+        self.assertIsNone(cached[0].audio)
+        self.assertEqual(cached[1].audio.audio_url, 'https://example.com/clip.mp3')
+
+
+class RenderingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_up_compiles_every_page_template(self):
+        names = list(iter_template_names())
+        self.assertIn('html/pages/main_page.html', names)
+        self.assertIn('html/elements/navbar.html', names)
+        self.assertEqual(warm_up_templates(), len(names))
+
+    def test_main_page_cached_for_anonymous_only(self):
+        first = self.client.get('/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNotNone(cache.get('anonymous-page:main_page:/'))
+
+        user = User.objects.create_user('student', password='pass12345')
+        self.client.force_login(user)
+        response = self.client.get('/')
+        self.assertContains(response, 'log out')
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)  # 'timeout' драйвера, одно значение
+
+    def test_journal_mode_is_not_set_per_connection(self):
+        # Иначе любой manage.py переписывал бы заголовок файла БД
+        fake = mock.MagicMock(vendor='sqlite')
+        configure_sqlite(None, fake)
+        executed = [call.args[0] for call in fake.cursor.return_value.__enter__.return_value.execute.call_args_list]
+        self.assertIn('PRAGMA synchronous = NORMAL', executed)
+        self.assertFalse([sql for sql in executed if 'journal_mode' in sql])
+
+
+class QueryPlanTests(TestCase):
+    # Таблицы, которые могут быть прочитаны целиком: уровней не больше шести
+    SMALL_TABLES = {'lingvista_web_languagelevel'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='pass12345')
+        create_curriculum(3)
+        self.lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        self.task = Task.objects.create(lesson=self.lesson, question='Q', correct_answer='A')
+        self.task.is_correct = True
+        record_result(self.user, 'A1', 1, 100, [self.task])
+
+    def assertNoFullScans(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for row in cursor.fetchall():
+                    detail = row[-1]
+                    if not detail.startswith('SCAN '):
+                        continue
+                    table = detail.split()[1]
+                    if table not in self.SMALL_TABLES:
+                        self.fail(f'Full table scan "{detail}" in query: {sql}')
+
+    def test_lessons_of_level(self):
+        content_cache.reset_backend()
+        self.assertNoFullScans(lambda: content_cache.get_lessons('A1'))
+
+    def test_tasks_of_lesson(self):
+        self.assertNoFullScans(lambda: load_tasks('A1', 1))
+
+    def test_level_unlock_state(self):
+        self.assertNoFullScans(lambda: get_level_states(self.user))
+        self.assertNoFullScans(lambda: get_level_states_bulk([self.user]))
+
+    def test_progress_snapshot(self):
+        self.assertNoFullScans(lambda: get_snapshot(self.user))
+
+    def test_user_task_progress(self):
+        self.assertNoFullScans(lambda: UserProgress.objects.filter(user=self.user, task=self.task).first())
+
+    def test_progress_history(self):
+        self.assertNoFullScans(lambda: list(UserProgress.objects.filter(user=self.user).order_by('-date_completed')))
+        self.assertNoFullScans(lambda: list(
+            UserTasksProgress.objects.filter(user=self.user).order_by('-date_completed', '-id')
+        ))
+
+
+class ProgressHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='pass12345')
+        Profile.objects.create(user=self.user)
+        now = timezone.now()
+        rows = [
+            UserTasksProgress(user=self.user, level=level, lesson=lesson, result=lesson * 10)
+            for level in ('A1', 'A2') for lesson in range(1, 16)
+        ]
+        UserTasksProgress.objects.bulk_create(rows)
+        # Половина записей с одинаковым временем - порядок задаёт id
+        UserTasksProgress.objects.filter(level='A1').update(date_completed=now - timedelta(days=3))
+        UserTasksProgress.objects.filter(level='A2').update(date_completed=now)
+        self.client.force_login(self.user)
+
+    def fetch_all(self, params=None):
+        ids, cursor = [], ''
+        while True:
+            response = self.client.get('/profile/history/api/', dict(params or {}, cursor=cursor))
+            data = response.json()
+            ids += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_keyset_pages_cover_history_once(self):
+        ids = self.fetch_all()
+        expected = list(
+            UserTasksProgress.objects.filter(user=self.user)
+            .order_by('-date_completed', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_level_and_date_filters(self):
+        self.assertEqual(len(self.fetch_all({'level': 'A1'})), 15)
+        today = timezone.localdate()
+        self.assertEqual(len(self.fetch_all({'date_from': today.isoformat()})), 15)
+        self.assertEqual(len(self.fetch_all({'date_to': (today - timedelta(days=1)).isoformat()})), 15)
+
+    def test_bad_cursor_is_rejected(self):
+        for cursor in ('nope', f'{10 ** 30}_1', f'1_{10 ** 30}'):
+            response = self.client.get('/profile/history/api/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(self.client.get('/profile/history/', {'cursor': cursor}).status_code, 400, cursor)
+
+    def test_streaming_export(self):
+        response = self.client.get('/profile/history/export/', {'format': 'json'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 30)
+
+        response = self.client.get('/profile/history/export/', {'level': 'A2'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,level,lesson,result,date_completed')
+        self.assertEqual(len(lines), 16)
+
+    def test_history_page_and_profile_render(self):
+        response = self.client.get('/profile/history/')
+        self.assertEqual(len(response.context['history']), 20)
+        self.assertIsNotNone(response.context['next_query'])
+
+        response = self.client.get('/account_page/')
+        self.assertEqual(len(response.context['task_progress']), 10)
+        self.assertTrue(response.context['has_more_history'])
+
+
+class AudioServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.data = bytes(range(256)) * 40
+        (Path(self.media.name) / 'audio').mkdir()
+        (Path(self.media.name) / 'audio' / 'clip.mp3').write_bytes(self.data)
+        self.audio = Audio.objects.create(title='clip', audio_file='audio/clip.mp3')
+        settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = f'/audio/{self.audio.pk}/'
+
+    def test_full_file_is_streamed_with_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        last_modified = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}').status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_head_and_missing_file(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        (Path(self.media.name) / 'audio' / 'clip.mp3').unlink()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_single_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+    def test_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        body = b''.join(response.streaming_content)
+        self.assertIn(self.data[0:10], body)
+        self.assertIn(self.data[20:30], body)
+        self.assertIn(b'Content-Range: bytes 20-29/', body)
+
+    def test_unsatisfiable_range_and_stale_if_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_OFFLOAD='accel', MEDIA_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/audio/clip.mp3')
+        self.assertEqual(response.content, b'')
+
+
+class AudioTranscodingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.audio = Audio.objects.create(title='clip', audio_file='audio/clip.wav')
+
+    def test_compute_peaks(self):
+        samples = [0, 16384, -32768, 0] * 50
+        peaks = compute_peaks(samples, count=4)
+        self.assertEqual(len(peaks), 4)
+        self.assertEqual(max(peaks), 1.0)
+        self.assertEqual(compute_peaks([]), [])
+
+    def test_result_is_applied_and_smallest_rendition_first(self):
+        rendition_dir = Path(self.media.name) / 'audio' / 'renditions' / str(self.audio.pk)
+        rendition_dir.mkdir(parents=True)
+        (rendition_dir / 'opus.ogg').write_bytes(b'o' * 10)
+        apply_result(self.audio.pk, 'audio/clip.wav', result={
+            'renditions': {
+                'mp3': {'name': f'audio/renditions/{self.audio.pk}/mp3.mp3', 'type': 'audio/mpeg', 'size': 30},
+                'opus': {'name': f'audio/renditions/{self.audio.pk}/opus.ogg', 'type': 'audio/ogg; codecs=opus', 'size': 10},
+            },
+            'duration': 1.5,
+            'peaks': [0.5],
+        })
+        self.audio.refresh_from_db()
+        self.assertEqual(self.audio.duration, 1.5)
+        types = [source['type'] for source in self.audio.get_sources()]
+        self.assertEqual(types, ['audio/ogg; codecs=opus', 'audio/mpeg', 'audio/x-wav'])
+
+        response = self.client.get(f'/audio/{self.audio.pk}/', {'rendition': 'opus'})
+        self.assertEqual(b''.join(response.streaming_content), b'o' * 10)
+
+    def test_renditions_of_replaced_file_are_not_served(self):
+        apply_result(self.audio.pk, 'audio/clip.wav', result={
+            'renditions': {'opus': {'name': f'audio/renditions/{self.audio.pk}/opus.ogg',
+                                    'type': 'audio/ogg; codecs=opus', 'size': 10}},
+            'duration': 1.5,
+            'peaks': [0.5],
+        })
+        (Path(self.media.name) / 'audio').mkdir()
+        (Path(self.media.name) / 'audio' / 'new.mp3').write_bytes(b'new recording')
+        self.audio.refresh_from_db()
+        self.audio.audio_file = 'audio/new.mp3'
+        self.audio.save()
+
+        self.assertEqual(self.audio.get_sources(), [{'url': f'/audio/{self.audio.pk}/', 'type': 'audio/mpeg'}])
+        response = self.client.get(f'/audio/{self.audio.pk}/', {'rendition': 'opus'})
+        self.assertEqual(b''.join(response.streaming_content), b'new recording')
+
+    def test_failed_job_keeps_original_only(self):
+        apply_result(self.audio.pk, 'audio/clip.wav', error='ffmpeg not found')
+        self.audio.refresh_from_db()
+        self.assertEqual(len(self.audio.get_sources()), 1)
+
+    def test_external_audio_gets_redirect_source(self):
+        audio = Audio.objects.create(title='remote', audio_url='https://example.com/clip.mp3')
+        self.assertEqual(audio.get_sources(), [{'url': f'/audio/{audio.pk}/', 'type': 'audio/mpeg'}])
+        response = self.client.get(f'/audio/{audio.pk}/')
+        self.assertRedirects(response, 'https://example.com/clip.mp3', fetch_redirect_response=False)
+
+    @override_settings(AUDIO_TRANSCODING=True, FFMPEG_BINARY='missing-ffmpeg-binary')
+    def test_no_jobs_without_ffmpeg(self):
+        with mock.patch('lingvista_web.transcoding.submit') as submit, self.captureOnCommitCallbacks(execute=True):
+            with self.assertLogs('lingvista_web.transcoding', 'WARNING'):
+                Audio.objects.create(title='new', audio_file='audio/new.wav')
+        submit.assert_not_called()
+
+    @skipUnless(shutil.which('ffmpeg'), 'нужен ffmpeg')
+    def test_transcode_with_ffmpeg(self):
+        source = Path(self.media.name) / 'audio' / 'clip.wav'
+        source.parent.mkdir(parents=True)
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=2',
+                        '-ac', '2', str(source)], check=True)
+        result = transcode(str(source), self.media.name, 'audio/renditions/1')
+        self.assertAlmostEqual(result['duration'], 2, places=0)
+        self.assertTrue(all(r['size'] < source.stat().st_size for r in result['renditions'].values()))
+
+
+class ProfileThumbnailTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media.name, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        (Path(self.media.name) / 'profile_photos').mkdir()
+        self.source = Path(self.media.name) / 'profile_photos' / 'photo.jpg'
+        exif = Image.Exif()
+        exif[0x0112] = 6  # ориентация: повернуть на 90°
+        exif[0x010F] = 'PhoneMaker'
+        Image.new('RGB', (400, 200), 'red').save(self.source, 'JPEG', exif=exif)
+
+        user = User.objects.create_user('student', password='pass12345')
+        self.profile = Profile.objects.create(user=user, profile_photo='profile_photos/photo.jpg')
+
+    def test_thumbnails_are_square_content_addressed_and_without_exif(self):
+        from PIL import Image
+
+        thumbnails = make_thumbnails(str(self.source), self.media.name)
+        self.assertEqual(set(thumbnails), {'64', '256'})
+        for size, names in thumbnails.items():
+            for name in names.values():
+                with Image.open(Path(self.media.name) / name) as image:
+                    self.assertEqual(image.size, (int(size), int(size)))
+                    self.assertFalse(image.getexif())
+        # Повторный запуск по тому же содержимому даёт те же имена
+        self.assertEqual(make_thumbnails(str(self.source), self.media.name), thumbnails)
+
+    def test_thumbnails_are_queued_only_when_photo_changes(self):
+        stale = Profile.objects.get(pk=self.profile.pk)
+        with mock.patch('lingvista_web.images.submit') as submit, self.captureOnCommitCallbacks(execute=True):
+            self.profile.increment_streak()
+            self.profile.add_achievement('first_lesson')
+            stale.save()
+        submit.assert_not_called()
+
+        with mock.patch('lingvista_web.images.submit') as submit, self.captureOnCommitCallbacks(execute=True):
+            stale.profile_photo = 'profile_photos/other.jpg'
+            stale.save()
+        submit.assert_called_once_with(stale)
+
+    def test_templates_ask_for_a_size(self):
+        self.assertEqual(thumbnail_url(self.profile, 64), '/media/profile_photos/photo.jpg')
+
+        apply_thumbnails(self.profile.pk, 'profile_photos/photo.jpg', make_thumbnails(str(self.source), self.media.name))
+        self.profile.refresh_from_db()
+        self.assertRegex(thumbnail_url(self.profile, 64), r'^/media/thumbnails/\w\w/\w+_64\.jpeg$')
+        self.assertTrue(thumbnail_url(self.profile, 100, 'webp').endswith('_256.webp'))
+
+        self.client.force_login(self.profile.user)
+        response = self.client.get('/account_page/')
+        self.assertContains(response, '_256.webp')
+        self.assertNotContains(response, 'profile_photos/photo.jpg')
+
+
+def n_plus_one_view(request):
+    for lesson in Lesson.objects.all():
+        LanguageLevel.objects.get(pk=lesson.language_level_id)
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('n_plus_one/', n_plus_one_view, name='n_plus_one'),
+    path('metrics', metrics_view),
+]
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.profiles = [
+            Profile.objects.create(user=User.objects.create_user(f'student{i}', password='pass12345'))
+            for i in range(3)
+        ]
+
+    def test_stale_instance_does_not_lose_updates(self):
+        profile = self.profiles[0]
+        stale = Profile.objects.get(pk=profile.pk)
+        profile.increment_streak()
+        stale.increment_streak()
+        self.assertEqual(stale.streak, 2)
+        stale.reset_streak()
+        profile.refresh_from_db()
+        self.assertEqual(profile.streak, 0)
+
+    def test_counter_update_writes_one_column(self):
+        profile = self.profiles[0]
+        with CaptureQueriesContext(connection) as captured:
+            profile.complete_level()
+        update = next(query['sql'] for query in captured if query['sql'].startswith('UPDATE'))
+        self.assertNotIn('language_level', update)
+        self.assertEqual(profile.completed_levels, 1)
+
+    def test_add_achievement_is_idempotent(self):
+        profile = self.profiles[0]
+        profile.add_achievement('first_lesson')
+        profile.add_achievement('first_lesson')
+        profile.add_achievement('streak_7')
+        self.assertEqual(profile.get_achievements(), ['first_lesson', 'streak_7'])
+
+    def test_bulk_updates(self):
+        queryset = Profile.objects.filter(pk__in=[profile.pk for profile in self.profiles[:2]])
+        with self.assertNumQueries(1):
+            queryset.increment_streak()
+        queryset.add_achievement('streak_1')
+        queryset.add_achievement('streak_1')
+        self.assertEqual(list(Profile.objects.order_by('pk').values_list('streak', flat=True)), [1, 1, 0])
+        self.assertEqual(Achievement.objects.filter(code='streak_1').count(), 2)
+
+    def test_edit_form_syncs_achievements(self):
+        profile = self.profiles[0]
+        profile.add_achievement('old')
+        form = ProfileEditForm(
+            {'streak': 0, 'completed_levels': 0, 'language_level': 'A1', 'achievements': 'a, b, a'},
+            instance=profile,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(sorted(profile.get_achievements()), ['a', 'b'])
+
+
+class StreakRolloverTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f'student{i}', password='pass12345') for i in range(3)]
+        for user in self.users:
+            Profile.objects.create(user=user, streak=5)
+
+    def attempt(self, user, day):
+        ActivityDay.objects.create(user=user, day=day)
+
+    def rollover(self, *args, day='2026-03-10'):
+        call_command('rollover_streaks', '--date', day, '--chunk-size', '2', *args, stdout=StringIO())
+        return list(Profile.objects.order_by('user_id').values_list('streak', flat=True))
+
+    def test_active_users_advance_and_inactive_reset(self):
+        self.attempt(self.users[0], date(2026, 3, 10))
+        self.attempt(self.users[1], date(2026, 3, 9))
+        self.assertEqual(self.rollover(), [6, 0, 0])
+
+    def test_repeated_run_is_idempotent(self):
+        self.attempt(self.users[0], date(2026, 3, 10))
+        self.rollover()
+        self.assertEqual(self.rollover(), [6, 0, 0])
+
+    def test_retry_after_midnight_keeps_previous_day(self):
+        create_curriculum(1)
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2026, 3, 10, 20, tzinfo=UTC)):
+            record_result(self.users[0], 'A1', 1, 80)
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2026, 3, 11, 0, 30, tzinfo=UTC)):
+            record_result(self.users[0], 'A1', 1, 90)  # перезаписывает UserTasksProgress.date_completed
+        self.assertEqual(self.rollover()[0], 6)
+
+    def test_missed_night_is_processed(self):
+        self.rollover(day='2026-03-08')
+        Profile.objects.update(streak=5)
+        self.attempt(self.users[0], date(2026, 3, 9))
+        self.attempt(self.users[0], date(2026, 3, 10))
+        self.attempt(self.users[1], date(2026, 3, 10))  # 9 марта пропущено
+        self.assertEqual(self.rollover(), [7, 1, 0])
+        self.assertFalse(ActivityDay.objects.filter(day__lt=date(2026, 3, 10)).exists())
+
+    @override_settings(STREAK_TIME_ZONE='Europe/Moscow')
+    def test_day_boundaries_follow_timezone(self):
+        create_curriculum(1)
+        # 22:30 UTC 9 марта - уже 10 марта в Москве (UTC+3)
+        with mock.patch('django.utils.timezone.now', return_value=datetime(2026, 3, 9, 22, 30, tzinfo=UTC)):
+            record_result(self.users[0], 'A1', 1, 80)
+        self.assertEqual(ActivityDay.objects.get().day, date(2026, 3, 10))
+        self.assertEqual(self.rollover()[0], 6)
+
+    def test_chunk_size_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            call_command('rollover_streaks', '--chunk-size', '0', stdout=StringIO())
+
+    def test_chunks_use_constant_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.rollover()
+        updates = [query for query in captured if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 4)  # два диапазона pk по два UPDATE
+
+
+@override_settings(AUTH_USER_CACHE_ALIAS='default')  # в тестах locmem-кэш общий: процесс один
+class SessionAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_curriculum(2)
+        self.user = User.objects.create_user('student', password='pass12345')
+        Profile.objects.create(user=self.user)
+
+    def count_queries(self, url):
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+        self.client.get(url)  # прогрев кэшей
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_cached_session_and_user_save_queries(self):
+        url = '/a1_lessons_page/'
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db',
+                           AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.ModelBackend']):
+            baseline = self.count_queries(url)
+        for engine in ('cached_db', 'signed_cookies'):
+            with self.settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                self.assertLessEqual(self.count_queries(url), baseline - 3, engine)  # сессия, User, Profile
+
+    def test_password_change_invalidates_cached_user(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/a1_lessons_page/').status_code, 200)
+        self.user.set_password('new-pass-12345')
+        self.user.save()
+        self.assertEqual(self.client.get('/a1_lessons_page/').status_code, 302)
+
+    def test_cached_inactive_user_is_rejected(self):
+        self.client.force_login(self.user)
+        self.client.get('/a1_lessons_page/')
+        cached = cache.get(f'auth-user:{self.user.pk}')
+        cached.is_active = False
+        cache.set(f'auth-user:{self.user.pk}', cached)  # как запись, которую другой процесс не успел сбросить
+        self.assertEqual(self.client.get('/a1_lessons_page/').status_code, 302)
+
+    @override_settings(AUTH_USER_CACHE_ALIAS=None)
+    def test_no_user_cache_without_shared_cache(self):
+        self.client.force_login(self.user)
+        self.client.get('/a1_lessons_page/')
+        self.assertIsNone(cache.get(f'auth-user:{self.user.pk}'))
+
+    def test_profile_change_invalidates_cached_user(self):
+        self.client.force_login(self.user)
+        self.client.get('/a1_lessons_page/')
+        Profile.objects.get(user=self.user).save()
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/a1_lessons_page/')
+        self.assertTrue(any('lingvista_web_profile' in query['sql'] for query in captured))
+
+    def test_session_not_written_without_changes(self):
+        with self.settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.client.force_login(self.user)
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get('/a1_lessons_page/')
+        self.assertFalse(any('UPDATE "django_session"' in query['sql'] for query in captured))
+
+
+class StaticPipelineTests(TestCase):
+    def test_templates_use_manifest_references(self):
+        self.assertEqual(check_static_references(), [])
+
+    def test_bypassing_and_missing_references_are_reported(self):
+        problems = find_static_problems(
+            '<link rel="stylesheet" href="/static/css/base.css">'
+            "<img src=\"{% static 'images/missing.png' %}\">{% css_bundle 'missing' %}"
+        )
+        self.assertEqual(len(problems), 3)
+
+    def test_collectstatic_builds_hashed_compressed_bundles(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'lingvista_web.assets.PipelineStaticFilesStorage'},
+        }
+        cache.clear()  # страница для анонимных могла закэшироваться со старыми ссылками
+        with self.settings(STATIC_ROOT=root, STATIC_PIPELINE=True, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            manifest = json.loads(Path(root, 'staticfiles.json').read_text())['paths']
+            bundle = manifest['css/main_page.bundle.css']
+            self.assertNotIn('/*', Path(root, bundle).read_text())
+            self.assertTrue(Path(root, bundle + '.gz').exists())
+
+            page = self.client.get('/')
+            self.assertContains(page, f'/static/{bundle}')
+            self.assertNotContains(page, '/static/css/base.css')
+
+            response = self.client.get(f'/static/{bundle}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(
+                self.client.get(
+                    f'/static/{bundle}', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'],
+                ).status_code,
+                304,
+            )
+            self.assertIn('max-age=60', self.client.get('/static/css/main_page.bundle.css')['Cache-Control'])
+            for header in ('br;q=0', 'identity, gzip;q=0', 'gzipx', '*;q=0', 'GZIP;q=0.0'):
+                response = self.client.get(f'/static/{bundle}', HTTP_ACCEPT_ENCODING=header)
+                self.assertFalse(response.has_header('Content-Encoding'), header)
+            response = self.client.get(f'/static/{bundle}', HTTP_ACCEPT_ENCODING='br;q=0, *;q=0.5')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+def reload_urls():
+    clear_url_caches()
+    importlib.reload(importlib.import_module('lingvista.urls'))
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(reload_urls)  # очистки идут в обратном порядке: после отмены настроек
+        cls.enterClassContext(override_settings(ASYNC_VIEWS=True))
+        reload_urls()
+
+    def setUp(self):
+        cache.clear()
+        content_cache.reset_backend()
+        create_curriculum(2)
+        self.user = User.objects.create_user('student', password='pass12345')
+        Profile.objects.create(user=self.user)
+        level = LanguageLevel.objects.get(level='A1')
+        self.task = Task.objects.create(lesson=level.lessons.get(lesson_number=1), question='Q', correct_answer='yes')
+
+    def test_hot_views_are_async(self):
+        for url in ('/langlevel_page/', '/a1_lessons_page/', '/account_page/', '/profile/history/',
+                    '/a1_lessons_page/tasks_lesson1/', '/audio/1/'):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+
+    async def test_version_from_validator_is_reused_by_content_cache(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/a1_lessons_page/')  # CSRF-cookie и кэш уроков
+        # get_stamps и get_lessons идут в разных sync_to_async, версия запроса у них общая
+        with mock.patch('lingvista_web.content_cache.ContentVersion', wraps=ContentVersion) as spy:
+            response = await self.async_client.get('/a1_lessons_page/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        spy.objects.filter.assert_not_called()
+
+    async def test_read_views(self):
+        await self.async_client.aforce_login(self.user)
+        for url in ('/langlevel_page/', '/a1_lessons_page/', '/account_page/', '/profile/history/'):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    async def test_unchanged_page_is_not_modified(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/langlevel_page/')  # выдаёт CSRF-cookie
+        etag = (await self.async_client.get('/langlevel_page/'))['ETag']
+        response = await self.async_client.get('/langlevel_page/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_submission_records_result(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post('/a1_lessons_page/tasks_lesson1/', {f'task_{self.task.pk}': 'yes'})
+        self.assertEqual(response.context['score'], 100)
+        progress = await UserTasksProgress.objects.aget(user=self.user, level='A1', lesson=1)
+        self.assertEqual(progress.result, 100)
+        snapshot = await ProgressSnapshot.objects.aget(pk=self.user.pk)
+        self.assertEqual(snapshot.get_score('A1', 1), 100)
+
+        for url in ('/a1_lessons_page/tasks_lesson2/', '/zz_lessons_page/tasks_lesson1/'):
+            response = await self.async_client.post(url, {})
+            self.assertEqual(response.status_code, 404, url)
+        self.assertEqual(await UserTasksProgress.objects.acount(), 1)
+
+    async def test_history_export_streams_asynchronously(self):
+        await UserTasksProgress.objects.abulk_create(
+            UserTasksProgress(user=self.user, level='A1', lesson=number, result=80) for number in (1, 2)
+        )
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/profile/history/export/', {'format': 'json'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(content)), 2)
+
+    async def test_audio_is_streamed_asynchronously(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        Path(media, 'audio').mkdir()
+        data = bytes(range(256)) * 300
+        Path(media, 'audio', 'clip.mp3').write_bytes(data)
+        audio = await Audio.objects.acreate(title='clip', audio_file='audio/clip.mp3')
+        with self.settings(MEDIA_ROOT=media):
+            response = await self.async_client.get(f'/audio/{audio.pk}/')
+            self.assertTrue(response.is_async)
+            self.assertEqual(response['Content-Length'], str(len(data)))
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), data)
+
+            response = await self.async_client.get(f'/audio/{audio.pk}/', headers={'Range': 'bytes=10-19'})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), data[10:20])
+
+            Path(media, 'audio', 'clip.mp3').unlink()
+            response = await self.async_client.get(f'/audio/{audio.pk}/')
+            self.assertEqual(response.status_code, 404)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(self.admin)
+        create_curriculum(2)
+
+    def add_progress(self, count):
+        users = User.objects.bulk_create(User(username=f'u{len(User.objects.all())}_{i}') for i in range(count))
+        for user in users:
+            pass_level(user, 'A1', 2)
+        return users
+
+    def test_changelists_do_not_query_per_row(self):
+        for url in ('/admin/lingvista_web/usertasksprogress/', '/admin/lingvista_web/lesson/',
+                    '/admin/lingvista_web/task/', '/admin/lingvista_web/profile/'):
+            self.add_progress(2)
+            self.client.get(url)  # прогрев сессии и кэша пользователя
+            with CaptureQueriesContext(connection) as few:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.add_progress(10)
+            with CaptureQueriesContext(connection) as many:
+                self.client.get(url)
+            self.assertEqual(len(few), len(many), url)
+
+    def test_large_table_count_is_estimated(self):
+        self.add_progress(3)
+        queryset = UserTasksProgress.objects.order_by('-pk')
+        with mock.patch('lingvista_web.admin.ESTIMATE_THRESHOLD', 0), CaptureQueriesContext(connection) as captured:
+            self.assertEqual(EstimatedCountPaginator(queryset, 50).count, queryset.first().pk)
+        self.assertNotIn('COUNT', captured[0]['sql'])
+
+        with mock.patch('lingvista_web.admin.COUNT_LIMIT', 4), CaptureQueriesContext(connection) as captured:
+            self.assertEqual(EstimatedCountPaginator(queryset.filter(level='A1'), 50).count, 4)
+        self.assertIn('LIMIT 4', captured[0]['sql'])
+
+    def test_reset_lesson_progress_action(self):
+        user, other = self.add_progress(2)
+        get_snapshot(user)
+        lesson = Lesson.objects.get(language_level__level='A1', lesson_number=1)
+        response = self.client.post('/admin/lingvista_web/lesson/', {
+            'action': 'reset_progress', '_selected_action': [lesson.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(UserTasksProgress.objects.filter(level='A1', lesson=1).exists())
+        self.assertEqual(UserTasksProgress.objects.filter(level='A1', lesson=2).count(), 2)
+        self.assertFalse(ProgressSnapshot.objects.filter(user=user).exists())
+        self.assertEqual(get_snapshot(user).get_score('A1', 1), 0)
+
+    def test_reset_selected_results_across_filter(self):
+        self.add_progress(2)
+        response = self.client.post('/admin/lingvista_web/usertasksprogress/?level=A1', {
+            'action': 'reset_progress', 'select_across': '1', 'index': '0',
+            '_selected_action': [UserTasksProgress.objects.first().pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(UserTasksProgress.objects.exists())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        create_curriculum(2)
+        self.user = User.objects.create_user('student', password='pass12345')
+        self.client.force_login(self.user)
+
+    def test_requests_are_aggregated_per_url_name(self):
+        self.client.get('/a1_lessons_page/')
+        self.client.get('/a1_lessons_page/')
+        with self.settings(METRICS_TOKEN='secret'):
+            body = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'}).content.decode()
+        self.assertIn('lingvista_request_duration_seconds_count{view="lessons"} 2', body)
+        self.assertIn('lingvista_db_queries_bucket{view="lessons",le="+Inf"} 2', body)
+        self.assertIn('lingvista_template_render_seconds_sum{view="lessons"}', body)
+        self.assertIn('lingvista_response_size_bytes_count{view="lessons"} 2', body)
+
+    @override_settings(ROOT_URLCONF='lingvista_web.tests')
+    def test_repeated_queries_are_flagged(self):
+        with self.assertLogs('lingvista_web.metrics', 'WARNING') as logs:
+            self.client.get('/n_plus_one/')
+        self.user.is_staff = True
+        self.user.save()
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('lingvista_n_plus_one_total{view="n_plus_one"} 1', body)
+        self.assertTrue(any('N+1' in line for line in logs.output))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_token_even_from_localhost(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='127.0.0.1').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TRACE_SAMPLE_RATE=1, METRICS_SLOW_REQUEST_MS=10_000)
+    def test_sampled_traces_are_info(self):
+        with self.assertLogs('lingvista_web.metrics', 'INFO') as logs:
+            self.client.get('/a1_lessons_page/')
+        self.assertEqual([record.levelname for record in logs.records], ['INFO'])
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_data_and_benchmark(self):
+        call_command(
+            'generate_data', levels=2, lessons_per_level=3, tasks_per_lesson=4, users=5,
+            attempt_ratio=1, chunk_size=7, stdout=StringIO(),
+        )
+        self.assertEqual(Lesson.objects.count(), 6)
+        self.assertEqual(Task.objects.count(), 24)
+        self.assertEqual(Profile.objects.count(), 5)
+        self.assertEqual(UserTasksProgress.objects.count(), 30)
+        self.assertEqual(UserProgress.objects.count(), 120)
+        self.assertEqual(ProgressSnapshot.objects.count(), 5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            out = StringIO()
+            call_command('bench_views', iterations=2, users=2, save=str(baseline), stdout=out)
+            self.assertIn('tasks_submit', out.getvalue())
+            self.assertEqual(set(json.loads(baseline.read_text())), {'level_map', 'lessons', 'tasks_submit', 'profile', 'history'})
+            call_command('bench_views', iterations=2, users=2, compare=str(baseline), max_regression=100, stdout=StringIO())
+
+
+class CurriculumTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = Path(self.media) / 'export'
+        self.directory.mkdir()
+
+        level = LanguageLevel.objects.create(level='A1', description='Начальный')
+        lesson = Lesson.objects.create(language_level=level, lesson_number=1, title='Приветствие')
+        Lesson.objects.create(language_level=level, lesson_number=2, title='Пустой урок')
+        (Path(self.media) / 'audio').mkdir()
+        (Path(self.media) / 'audio' / 'hello.mp3').write_bytes(b'ID3' + bytes(500))
+        audio = Audio.objects.create(title='hello', audio_file='audio/hello.mp3')
+        Task.objects.create(lesson=lesson, question='Hello = ?', correct_answer='Привет',
+                            option1='Привет', option2='Пока', audio=audio)
+        Task.objects.create(lesson=lesson, question='Bye = ?', correct_answer='Пока')
+
+    def export(self, name, *args):
+        path = self.directory / name
+        call_command('export_curriculum', '--output', str(path), *args, stdout=StringIO())
+        return path
+
+    def import_(self, path, *args):
+        call_command('import_curriculum', str(path), '--chunk-size', '2', *args, stdout=StringIO())
+
+    def snapshot(self):
+        return (
+            list(LanguageLevel.objects.order_by('level').values_list('level', 'description')),
+            list(Lesson.objects.order_by('pk').values_list('pk', 'language_level__level', 'lesson_number', 'title')),
+            list(Task.objects.order_by('pk').values_list('pk', 'lesson_id', 'position', 'question', 'option1', 'audio_id')),
+            list(Audio.objects.order_by('pk').values_list('pk', 'audio_file', 'title')),
+        )
+
+    def test_reimport_is_idempotent(self):
+        for name, args in (('curriculum.jsonl', ()), ('curriculum.csv', ('--format', 'csv'))):
+            before = self.snapshot()
+            self.import_(self.export(name, *args))
+            self.assertEqual(self.snapshot(), before, name)
+
+    def test_import_into_empty_database(self):
+        path = self.export('curriculum.jsonl')
+        Task.objects.all().delete()
+        Lesson.objects.all().delete()
+        Audio.objects.all().delete()
+        self.import_(path)
+        self.assertEqual(Lesson.objects.count(), 2)
+        self.assertEqual(
+            list(Task.objects.order_by('position').values_list('position', 'question', 'option1', 'audio__audio_file')),
+            [(1, 'Hello = ?', 'Привет', 'audio/hello.mp3'), (2, 'Bye = ?', None, None)],
+        )
+
+    def test_import_updates_by_natural_key(self):
+        path = self.directory / 'update.jsonl'
+        path.write_text('\n'.join(json.dumps(record, ensure_ascii=False) for record in [
+            {'type': 'lesson', 'level': 'A1', 'lesson_number': 1, 'title': 'Знакомство'},
+            {'type': 'task', 'level': 'a1', 'lesson_number': 1, 'position': 2, 'question': 'Bye?', 'correct_answer': 'Пока'},
+            {'type': 'task', 'level': 'A1', 'lesson_number': 1, 'position': 3, 'question': 'Yes?', 'correct_answer': 'Да'},
+        ]), encoding='utf-8')
+        self.import_(path)
+        lesson = Lesson.objects.get(lesson_number=1)
+        self.assertEqual(lesson.title, 'Знакомство')
+        self.assertEqual(list(lesson.task_set.order_by('position').values_list('question', flat=True)),
+                         ['Hello = ?', 'Bye?', 'Yes?'])
+
+    def test_invalid_row_rolls_back_everything(self):
+        before = self.snapshot()
+        path = self.directory / 'broken.jsonl'
+        path.write_text('\n'.join(json.dumps(record) for record in [
+            {'type': 'lesson', 'level': 'A1', 'lesson_number': 1, 'title': 'Changed'},
+            {'type': 'lesson', 'level': 'A1', 'lesson_number': 3, 'title': 'New'},
+            {'type': 'task', 'level': 'A1', 'lesson_number': 3, 'position': 1, 'question': 'Q', 'correct_answer': 'x',
+             'options': ['a', 'b']},
+        ]), encoding='utf-8')
+        with self.assertRaisesMessage(CommandError, 'строка 3: правильного ответа нет среди вариантов'):
+            self.import_(path)
+        self.assertEqual(self.snapshot(), before)
+
+        path.write_text('{"type": "task", "level": "B1", "lesson_number": 9, "position": 1, '
+                        '"question": "Q", "correct_answer": "x"}\n', encoding='utf-8')
+        with self.assertRaisesMessage(CommandError, 'уровень B1 не описан'):
+            self.import_(path)
+
+    def test_dry_run_changes_nothing(self):
+        path = self.directory / 'new.jsonl'
+        path.write_text(json.dumps({'type': 'lesson', 'level': 'A1', 'lesson_number': 5, 'title': 'New'}), encoding='utf-8')
+        out = StringIO()
+        call_command('import_curriculum', str(path), '--dry-run', stdout=out)
+        self.assertIn('уроков 1', out.getvalue())
+        self.assertFalse(Lesson.objects.filter(lesson_number=5).exists())
+
+    def test_archive_carries_audio_files(self):
+        path = self.export('curriculum.zip', '--archive')
+        Task.objects.all().delete()
+        Audio.objects.all().delete()
+        shutil.rmtree(Path(self.media) / 'audio')
+        self.import_(path)
+        audio = Audio.objects.get()
+        self.assertEqual(audio.audio_file.read(), b'ID3' + bytes(500))
+        self.assertEqual(Task.objects.get(position=1).audio, audio)
+
+    def test_csv_keeps_levels_without_lessons_and_unused_audio(self):
+        LanguageLevel.objects.create(level='B2', description='Пока пусто')
+        Audio.objects.create(title='spare', audio_url='https://cdn.example.com/spare.mp3')
+        path = self.export('curriculum.csv', '--format', 'csv')
+        Task.objects.all().delete()
+        Lesson.objects.all().delete()
+        Audio.objects.all().delete()
+        LanguageLevel.objects.all().delete()
+        self.import_(path)
+        self.assertEqual(LanguageLevel.objects.get(level='B2').description, 'Пока пусто')
+        self.assertEqual(Lesson.objects.count(), 2)
+        self.assertCountEqual(Audio.objects.values_list('title', flat=True), ['hello', 'spare'])
+
+    def test_audio_found_by_url_is_not_duplicated(self):
+        audio = Audio.objects.get()
+        audio.audio_url = 'https://cdn.example.com/hello.mp3'
+        audio.save()
+        path = self.directory / 'by_url.jsonl'
+        path.write_text('\n'.join(json.dumps(record) for record in [
+            {'type': 'audio', 'url': 'https://cdn.example.com/hello.mp3', 'title': 'renamed'},
+            {'type': 'task', 'level': 'A1', 'lesson_number': 1, 'position': 2, 'question': 'Bye = ?',
+             'correct_answer': 'Пока', 'audio': 'https://cdn.example.com/hello.mp3'},
+        ]), encoding='utf-8')
+        self.import_(path)
+        audio = Audio.objects.get()
+        self.assertEqual((audio.title, audio.audio_file.name), ('renamed', 'audio/hello.mp3'))
+        self.assertEqual(Task.objects.get(position=2).audio, audio)
+
+    def test_archive_overwrites_changed_file_of_same_size(self):
+        path = self.export('curriculum.zip', '--archive')
+        (Path(self.media) / 'audio' / 'hello.mp3').write_bytes(b'XXX' + bytes(500))
+        self.import_(path)
+        self.assertEqual((Path(self.media) / 'audio' / 'hello.mp3').read_bytes(), b'ID3' + bytes(500))
+
+    @override_settings(AUDIO_TRANSCODING=True)
+    def test_import_resets_renditions_and_queues_transcoding(self):
+        audio = Audio.objects.get()
+        Audio.objects.filter(pk=audio.pk).update(renditions={'source': 'audio/hello.mp3', 'opus': {
+            'name': f'audio/renditions/{audio.pk}/opus.ogg', 'type': 'audio/ogg; codecs=opus', 'size': 10,
+        }}, duration=1.0)
+        path = self.export('curriculum.zip', '--archive')
+
+        def import_queued(path):
+            with mock.patch('lingvista_web.transcoding.ffmpeg_available', return_value=True), \
+                    mock.patch('lingvista_web.transcoding.submit') as submit, \
+                    self.captureOnCommitCallbacks(execute=True):
+                self.import_(path)
+            return [call.args[0].pk for call in submit.call_args_list]
+
+        # То же содержимое - версии остаются, задач нет
+        self.assertEqual(import_queued(path), [])
+        self.assertIn('opus', Audio.objects.get().renditions)
+
+        (Path(self.media) / 'audio' / 'hello.mp3').write_bytes(b'XXX' + bytes(500))
+        self.assertEqual(import_queued(path), [audio.pk])
+        audio.refresh_from_db()
+        self.assertEqual((audio.renditions, audio.duration), ({}, None))
+
+        new = self.directory / 'new.jsonl'
+        new.write_text(json.dumps({'type': 'audio', 'file': 'audio/bye.mp3', 'title': 'bye'}), encoding='utf-8')
+        self.assertEqual(import_queued(new), [Audio.objects.get(title='bye').pk])
+
+    def test_archive_rejects_paths_outside_media(self):
+        path = self.directory / 'evil.zip'
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('curriculum.jsonl', json.dumps({'type': 'audio', 'file': '../evil.mp3'}))
+            archive.writestr('../evil.mp3', b'x')
+        with self.assertRaisesMessage(CommandError, 'недопустимое имя файла'):
+            self.import_(path)
+        self.assertFalse(Audio.objects.filter(audio_file='../evil.mp3').exists())
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.a1 = LanguageLevel.objects.create(level='A1')
+        self.b1 = LanguageLevel.objects.create(level='B1')
+        self.greetings = Lesson.objects.create(language_level=self.a1, lesson_number=1, title='Greetings',
+                                               description='Hello and goodbye')
+        self.travel = Lesson.objects.create(language_level=self.b1, lesson_number=2, title='Travel',
+                                            description='Airport greetings')
+        self.task = Task.objects.create(lesson=self.greetings, question='Как сказать «привет»?', correct_answer='Hello')
+
+    def found(self, text, level=None, answers=True):
+        return [(result['type'], result['id']) for result in search(text, level, answers=answers)]
+
+    def test_prefix_search_ranks_title_matches_first(self):
+        self.assertEqual(self.found('greet'), [('lesson', self.greetings.pk), ('lesson', self.travel.pk)])
+        self.assertEqual(self.found('ПРИВ'), [('task', self.task.pk)])
+        self.assertCountEqual(self.found('hel'), [('task', self.task.pk), ('lesson', self.greetings.pk)])
+        self.assertEqual(self.found('greet', level='B1'), [('lesson', self.travel.pk)])
+        self.assertEqual(self.found('"*) OR'), [])
+
+    def test_index_follows_content_changes(self):
+        self.task.question = 'Как сказать «спасибо»?'
+        self.task.save()
+        self.assertEqual(self.found('привет'), [])
+        self.assertEqual(self.found('спасиб'), [('task', self.task.pk)])
+
+        Task.objects.bulk_create(
+            [Task(lesson=self.travel, position=1, question='Где вокзал?', correct_answer='Там')],
+            update_conflicts=True, unique_fields=['lesson', 'position'], update_fields=['question'],
+        )
+        self.assertEqual(len(self.found('вокзал', level='B1')), 1)
+
+        Lesson.objects.filter(pk=self.greetings.pk).update(language_level=self.b1, lesson_number=5)
+        result = search('спасибо')[0]
+        self.assertEqual((result['level'], result['lesson']), ('B1', 5))
+        self.assertEqual(result['url'], '/b1_lessons_page/tasks_lesson5/')
+
+        self.greetings.delete()
+        self.assertEqual(self.found('спасибо'), [])
+        self.assertEqual(self.found('greet'), [('lesson', self.travel.pk)])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM lingvista_web_search')
+        self.assertEqual(self.found('greet'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('строк: 3', out.getvalue())
+        self.assertEqual(len(self.found('greet')), 2)
+
+    def test_search_api(self):
+        self.assertEqual(build_query('Hi, wor', 'postgresql'), 'hi:* & wor:*')
+        user = User.objects.create_user('student', password='pass12345')
+        self.client.force_login(user)
+        response = self.client.get('/search/', {'q': 'привет', 'level': 'A1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{
+            'type': 'task', 'id': self.task.pk, 'level': 'A1', 'lesson': 1,
+            'title': 'Как сказать «привет»?', 'url': '/a1_lessons_page/tasks_lesson1/',
+        }])
+        self.assertEqual(self.client.get('/search/', {'q': ''}).status_code, 400)
+
+    def test_learners_cannot_search_answers(self):
+        self.assertEqual(build_query('Hi, wor', 'postgresql', titles_only=True), 'hi:*A & wor:*A')
+        self.assertEqual(self.found('hello', answers=False), [('lesson', self.greetings.pk)])
+        self.assertCountEqual(self.found('hello'), [('lesson', self.greetings.pk), ('task', self.task.pk)])
+        self.client.force_login(User.objects.create_user('student', password='pass12345'))
+        results = self.client.get('/search/', {'q': 'hello'}).json()['results']
+        self.assertEqual([result['type'] for result in results], ['lesson'])
+        self.client.force_login(User.objects.create_user('editor', password='pass12345', is_staff=True))
+        self.assertEqual(len(self.client.get('/search/', {'q': 'hello'}).json()['results']), 2)
+
+    def test_other_databases_fall_back_to_icontains(self):
+        with mock.patch('lingvista_web.search.connection', mock.MagicMock(vendor='mysql')):
+            self.assertEqual(self.found('ПРИВ'), [('task', self.task.pk)])
+            self.assertEqual(self.found('greet', level='B1'), [('lesson', self.travel.pk)])
+            self.assertEqual(len(self.found('hello')), 2)
+            self.assertEqual(self.found('hello', answers=False), [('lesson', self.greetings.pk)])
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        create_curriculum(1)
+        lesson = Lesson.objects.get(language_level__level='A1')
+        self.tasks = [Task.objects.create(lesson=lesson, question=f'Q{i}', correct_answer='A') for i in range(2)]
+        self.users = [User.objects.create_user(f'student{i}', password='pass12345') for i in range(3)]
+
+    def submit(self, user, result, *correct):
+        for task, is_correct in zip(self.tasks, correct):
+            task.is_correct = is_correct
+        record_result(user, 'A1', 1, result, self.tasks)
+
+    def counters(self):
+        return (
+            list(TaskStats.objects.order_by('task_id').values_list('task_id', 'attempts', 'correct')),
+            list(LessonStats.objects.values_list('level', 'lesson', 'attempts', 'score_sum', *[
+                f'bucket_{i}' for i in range(LessonStats.BUCKETS)
+            ])),
+        )
+
+    def test_counters_follow_latest_attempt_and_best_result(self):
+        first, second, third = self.users
+        self.submit(first, 50, True, False)
+        self.submit(first, 100, True, True)  # повторная попытка: attempts не растут, корзина меняется
+        self.submit(second, 40, False, False)
+        self.submit(second, 30, True, False)  # результат хуже лучшего - распределение уроков не меняется
+        self.submit(third, 0, False, False)
+
+        tasks, lessons = self.counters()
+        self.assertEqual(tasks, [(self.tasks[0].pk, 3, 2), (self.tasks[1].pk, 3, 1)])
+        stats = LessonStats.objects.get()
+        self.assertEqual((stats.attempts, stats.score_sum, stats.average), (3, 140, 46.7))
+        self.assertEqual(stats.get_histogram(), [1, 0, 0, 0, 1, 0, 0, 0, 0, 1])
+        self.assertEqual(TaskStats.objects.get(pk=self.tasks[0].pk).correct_rate, 66.7)
+
+        # Пересчёт из сырых строк даёт те же числа
+        call_command('recompute_analytics', stdout=StringIO())
+        self.assertEqual(self.counters(), (tasks, lessons))
+
+    def test_submission_updates_counters_atomically(self):
+        self.submit(self.users[0], 100, True, True)
+        with CaptureQueriesContext(connection) as captured:
+            self.submit(self.users[1], 100, True, False)
+        updates = [query['sql'] for query in captured if query['sql'].startswith('UPDATE "lingvista_web_taskstats"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"attempts" + CASE', updates[0])
+
+    def test_admin_reset_recomputes_counters(self):
+        self.submit(self.users[0], 100, True, True)
+        self.submit(self.users[1], 50, True, False)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+        self.client.force_login(admin_user)
+        self.client.post('/admin/lingvista_web/lesson/', {
+            'action': 'reset_progress', '_selected_action': [self.tasks[0].lesson_id],
+        })
+        self.assertEqual(self.counters(), ([], []))
+        self.assertEqual(self.client.get('/admin/lingvista_web/lessonstats/').status_code, 200)
+        self.assertEqual(self.client.get('/admin/lingvista_web/taskstats/').status_code, 200)
+
+    def test_analytics_api(self):
+        self.submit(self.users[0], 100, True, True)
+        self.submit(self.users[1], 50, False, True)
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/analytics/api/').status_code, 302)
+
+        staff = User.objects.create_user('author', password='pass12345', is_staff=True)
+        self.client.force_login(staff)
+        with CaptureQueriesContext(connection) as captured:
+            data = self.client.get('/analytics/api/', {'level': 'A1', 'lesson': 1}).json()
+        raw_tables = ('"lingvista_web_userprogress"', '"lingvista_web_usertasksprogress"')
+        self.assertFalse(any(table in query['sql'] for query in captured for table in raw_tables))
+        self.assertEqual(data['lessons'], [
+            {'level': 'A1', 'lesson': 1, 'attempts': 2, 'average': 75.0, 'histogram': [0, 0, 0, 0, 0, 1, 0, 0, 0, 1]},
+        ])
+        self.assertEqual([(task['attempts'], task['correct']) for task in data['tasks']], [(2, 1), (2, 2)])
+        self.assertEqual(self.client.get('/analytics/api/', {'lesson': 1}).status_code, 400)
+
+
+@override_settings(AUTH_USER_CACHE_ALIAS='default')
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        content_cache.reset_backend()
+        conditional.reset_page_cache()
+        self.addCleanup(conditional.reset_page_cache)
+        create_curriculum(2)
+        self.user = User.objects.create_user('student', password='pass12345')
+        self.profile = Profile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.client.get('/langlevel_page/')  # первый рендер выдаёт CSRF-cookie
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)  # только ETag: он учитывает релиз и CSRF-секрет
+        return response['ETag']
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag})
+
+    def test_unchanged_pages_get_304_after_one_query(self):
+        for url in ('/langlevel_page/', '/a1_lessons_page/', '/account_page/'):
+            etag = self.etag(url)
+            self.assertTrue(etag.startswith('W/"'), url)
+            self.revalidate(url, etag)  # прогрев кэша пользователя (auth.py)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.revalidate(url, etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(len(captured), 1, url)
+
+    def test_validator_follows_progress_profile_and_curriculum(self):
+        etags = {url: self.etag(url) for url in ('/langlevel_page/', '/a1_lessons_page/', '/account_page/')}
+        record_result(self.user, 'A1', 1, 100)
+        for url, etag in etags.items():
+            self.assertEqual(self.revalidate(url, etag).status_code, 200, url)
+
+        etag = self.etag('/account_page/')
+        self.profile.increment_streak()
+        self.assertEqual(self.revalidate('/account_page/', etag).status_code, 200)
+
+        etag = self.etag('/a1_lessons_page/')
+        Lesson.objects.filter(lesson_number=2).first().save()
+        response = self.revalidate('/a1_lessons_page/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_alone_does_not_revalidate(self):
+        # Иначе после релиза или смены CSRF-секрета клиент получил бы 304 со старой страницей
+        self.etag('/langlevel_page/')
+        with mock.patch('lingvista_web.conditional.release_fingerprint', return_value='next-release'):
+            response = self.client.get('/langlevel_page/', headers={'If-Modified-Since': http_date(time.time() + 60)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_validator_follows_user_fields(self):
+        etag = self.etag('/account_page/')
+        self.client.get('/account_page/')  # страница в кэше пользователя
+        self.user.email = 'new@example.com'
+        self.user.save()
+        response = self.revalidate('/account_page/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'new@example.com')
+
+    def test_pages_are_cached_per_user_with_bounded_size(self):
+        self.etag('/a1_lessons_page/')
+        response = self.client.get('/a1_lessons_page/')
+        self.assertIsNone(response.context)  # отдано из кэша, без рендера
+        record_result(self.user, 'A1', 1, 100)
+        response = self.client.get('/a1_lessons_page/')
+        self.assertEqual(response.context['lessons_data'][0]['score'], 100)
+
+        with override_settings(USER_PAGE_CACHE={'BACKEND': 'lru', 'MAX_ENTRIES': 1}):
+            conditional.reset_page_cache()
+            for url in ('/a1_lessons_page/', '/langlevel_page/', '/a1_lessons_page/'):
+                self.assertIsNotNone(self.client.get(url).context, url)
+            self.assertEqual(len(conditional.get_page_cache()._data), 1)
+
+    def test_no_validators_before_csrf_cookie(self):
+        client = self.client_class()
+        client.force_login(self.user)
+        self.assertNotIn('ETag', client.get('/langlevel_page/'))
+        self.assertIn('ETag', client.get('/langlevel_page/'))
@@ -0,0 +1,146 @@
+"""Фоновая обработка загруженного аудио.
+
+После сохранения Audio задача ставится в пул процессов: ffmpeg делает
+компактные моно-версии (Opus и MP3) с нормализацией громкости, считает
+длительность и пики для waveform. Результат записывается в Audio.renditions,
+Audio.duration и Audio.peaks, а tasks_page.html выбирает самую лёгкую версию.
+
+Нужен ffmpeg (settings.FFMPEG_BINARY) с кодеками libopus и libmp3lame.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import sys
+from array import array
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .workers import get_executor
+
+logger = logging.getLogger(__name__)
+
+LOUDNORM = 'loudnorm=I=-16:TP=-1.5:LRA=11'
+PEAKS_SAMPLE_RATE = 8000
+PEAKS_COUNT = 100
+RENDITIONS = {
+    'opus': ('ogg', 'audio/ogg; codecs=opus', ['-c:a', 'libopus', '-b:a', '24k']),
+    'mp3': ('mp3', 'audio/mpeg', ['-c:a', 'libmp3lame', '-b:a', '48k']),
+}
+
+def compute_peaks(samples, count=PEAKS_COUNT):
+    """Максимальная амплитуда в каждом из count отрезков, от 0 до 1."""
+    if not samples:
+        return []
+    size = max(len(samples) // count, 1)
+    peaks = []
+    for start in range(0, len(samples), size):
+        chunk = samples[start:start + size]
+        peaks.append(round(max(max(chunk), -min(chunk)) / 32768, 3))
+    return peaks[:count]
+
+
+def _ffmpeg(ffmpeg, *args):
+    return subprocess.run([ffmpeg, '-y', '-v', 'error', *args], check=True, capture_output=True).stdout
+
+
+def transcode(source, media_root, output_name, ffmpeg='ffmpeg'):
+    """Выполняется в процессе пула, поэтому не обращается к ORM."""
+    output_dir = os.path.join(media_root, output_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    renditions = {}
+    for key, (extension, content_type, codec_args) in RENDITIONS.items():
+        name = f'{output_name}/{key}.{extension}'
+        _ffmpeg(ffmpeg, '-i', source, '-vn', '-ac', '1', '-af', LOUDNORM, *codec_args,
+                os.path.join(media_root, name))
+        renditions[key] = {
+            'name': name,
+            'type': content_type,
+            'size': os.path.getsize(os.path.join(media_root, name)),
+        }
+
+    pcm = _ffmpeg(ffmpeg, '-i', source, '-vn', '-ac', '1', '-ar', str(PEAKS_SAMPLE_RATE), '-f', 's16le', '-')
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return {
+        'renditions': renditions,
+        'duration': round(len(samples) / PEAKS_SAMPLE_RATE, 2),
+        'peaks': compute_peaks(samples),
+    }
+
+
+def apply_result(audio_id, source_name, result=None, error=None):
+    from . import content_cache
+    from .models import Audio
+
+    if error:
+        renditions = {'source': source_name, 'error': error}
+        fields = {'renditions': renditions}
+    else:
+        renditions = dict(result['renditions'], source=source_name)
+        fields = {'renditions': renditions, 'duration': result['duration'], 'peaks': result['peaks']}
+    # update() не вызывает post_save, поэтому повторной постановки в очередь не будет
+    Audio.objects.filter(pk=audio_id, audio_file=source_name).update(**fields)
+    content_cache.bump_version()
+
+
+def _on_done(audio_id, source_name):
+    def callback(future):
+        try:
+            apply_result(audio_id, source_name, result=future.result())
+        except subprocess.CalledProcessError as exc:
+            logger.error('Ошибка ffmpeg для аудио %s: %s', audio_id, exc.stderr)
+            apply_result(audio_id, source_name, error=exc.stderr.decode(errors='replace')[-500:])
+        except Exception as exc:
+            logger.exception('Не удалось обработать аудио %s', audio_id)
+            apply_result(audio_id, source_name, error=repr(exc))
+        finally:
+            connection.close()  # соединение потока пула
+    return callback
+
+
+def submit(audio):
+    future = get_executor().submit(
+        transcode,
+        audio.audio_file.path,
+        str(settings.MEDIA_ROOT),
+        f'audio/renditions/{audio.pk}',
+        getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'),
+    )
+    future.add_done_callback(_on_done(audio.pk, audio.audio_file.name))
+    return future
+
+
+def ffmpeg_available():
+    return shutil.which(getattr(settings, 'FFMPEG_BINARY', 'ffmpeg')) is not None
+
+
+def transcoding_enabled():
+    if not getattr(settings, 'AUDIO_TRANSCODING', False):
+        return False
+    if not ffmpeg_available():
+        logger.warning('AUDIO_TRANSCODING включено, но ffmpeg не найден (%s)', settings.FFMPEG_BINARY)
+        return False
+    return True
+
+
+def queue_transcoding(sender, instance, **kwargs):
+    # Новый файл - ещё нет версий, сделанных именно из него
+    if not instance.audio_file or instance.renditions.get('source') == instance.audio_file.name:
+        return
+    if transcoding_enabled():
+        transaction.on_commit(lambda: submit(instance))
+
+
+def queue_audio_ids(ids):
+    """Задачи для аудио, записанных без post_save (import_curriculum); вызывать после коммита."""
+    from .models import Audio
+
+    if not ids or not transcoding_enabled():
+        return
+    for audio in Audio.objects.filter(pk__in=ids).exclude(audio_file='').exclude(audio_file__isnull=True):
+        submit(audio)
@@ -1,16 +1,28 @@
-from django.shortcuts import render, redirect
+from django.conf import settings
+from django.http import Http404, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from .forms import UserRegistrationForm, ProfileEditForm
-from django.views.decorators.http import require_POST
-from .models import Profile, UserTasksProgress
+from .forms import AnalyticsFilterForm, HistoryFilterForm, SearchForm, UserRegistrationForm, ProfileEditForm
+from django.views.decorators.http import require_GET, require_POST, require_safe
+from .media import serve_file
+from .models import Audio, LanguageLevel, LessonStats, Profile, Task
+from .conditional import conditional_page
+from .content_cache import get_lessons, get_tasks
+from .grading import collect_answers, grade
+from .history import history_page, history_queryset, iter_csv, iter_json
+from .progress import LEVEL_ORDER, PASS_RESULT, get_snapshot, record_result
+from .rendering import cache_for_anonymous
+from .search import search
 
 @require_POST
 def custom_logout(request):
     logout(request)
     return redirect('main_page')
 
+@cache_for_anonymous(settings.PAGE_CACHE_TIMEOUT, 'main_page')
 def main_page(request):
     return render(request, 'html/pages/main_page.html')
 
@@ -40,42 +52,94 @@ def register_view(request):
     return render(request, 'html/pages/registry_page.html', {'form': form})
 
 #@login_required
-def tasks_view(request, lesson):
+def tasks_view(request, level, lesson):
+    if level.upper() not in LEVEL_ORDER:
+        raise Http404('Уровень не найден')
+    tasks = get_tasks(level.upper(), lesson)
     context = {
+        'level': level,
         'lesson': lesson,
+        'tasks': tasks,
     }
+    if request.method == 'POST':
+        if not tasks:
+            raise Http404('Урок не найден')  # иначе record_result запишет результат несуществующего урока
+        score, correct_count = grade(tasks, collect_answers(tasks, request.POST))
+        if request.user.is_authenticated:
+            record_result(request.user, level.upper(), lesson, score, tasks)
+        context.update({
+            'show_answers': True,
+            'score': score,
+            'correct_count': correct_count,
+        })
     return render(request, 'html/pages/tasks_page.html', context)
 
+RECENT_HISTORY_SIZE = 10
+
+
 @login_required
 @login_required
+@conditional_page('account')
 def profile_view(request):
     profile, created = Profile.objects.get_or_create(user=request.user)
-    return render(request, 'html/pages/account_page.html', {'profile': profile})
+    task_progress, next_cursor = history_page(history_queryset(request.user), limit=RECENT_HISTORY_SIZE)
+    return render(request, 'html/pages/account_page.html', {
+        'profile': profile,
+        'task_progress': task_progress,
+        'has_more_history': next_cursor is not None,
+    })
 
 @login_required
+@conditional_page('langlevel')
 def langlevel_view(request):
-    return render(request, 'html/pages/langlevel_page.html')
+    snapshot = get_snapshot(request.user)
+    levels_data = [
+        {
+            'level': level,
+            'is_completed': level.level in snapshot.completed_levels,
+            'is_unlocked': level.level in snapshot.unlocked_levels,
+        }
+        for level in LanguageLevel.objects.order_by('level')
+    ]
+    context = {
+        'levels_data': levels_data,
+    }
+    return render(request, 'html/pages/langlevel_page.html', context)
 
 @login_required
 def accountedit_view(request):
     return render(request, 'html/pages/accountedit_page.html')
 
 @login_required
+@conditional_page('lessons')
 def lessons_view(request, level):
+    level = level.upper()
+    snapshot = get_snapshot(request.user)
+    lessons_data = []
+    for lesson in get_lessons(level):
+        score = snapshot.get_score(level, lesson.lesson_number)
+        lessons_data.append({
+            'lesson': lesson,
+            'score': score,
+            'is_completed': score >= PASS_RESULT,
+        })
     context = {
-        'level': level.upper(),
+        'level': level,
+        'lessons_data': lessons_data,
     }
     return render(request, 'html/pages/lessons_page.html', context)
 
 @login_required
 @login_required
+@conditional_page('account')
 def profile(request):
     profile, created = Profile.objects.get_or_create(user=request.user)
-    task_progress = UserTasksProgress.objects.filter(user=request.user)
+    task_progress, next_cursor = history_page(history_queryset(request.user), limit=RECENT_HISTORY_SIZE)
     return render(request, 'html/pages/account_page.html', {
         'user': request.user,
         'profile': profile,
         'task_progress': task_progress,
+        'has_more_history': next_cursor is not None,
     })
 
 @login_required
@@ -94,6 +158,116 @@ def edit_profile(request):
 
     return render(request, 'html/pages/accountedit_page.html', {'form': form})
 
+def _filtered_history(request):
+    form = HistoryFilterForm(request.GET)
+    if not form.is_valid():
+        return form, None
+    data = form.cleaned_data
+    queryset = history_queryset(request.user, data['level'], data['date_from'], data['date_to'])
+    return form, queryset
+
+
 @login_required
 def profile_history(request):
-    return render(request, 'html/pages/profile_history.html')
\ No newline at end of file
+    form, queryset = _filtered_history(request)
+    rows, next_cursor = [], None
+    if queryset is not None:
+        try:
+            rows, next_cursor = history_page(queryset, form.cleaned_data['cursor'])
+        except ValueError:
+            return HttpResponseBadRequest('Некорректный курсор')
+    query = request.GET.copy()
+    query['cursor'] = next_cursor or ''
+    return render(request, 'html/pages/profile_history.html', {
+        'form': form,
+        'history': rows,
+        'next_query': query.urlencode() if next_cursor else None,
+    })
+
+
+@login_required
+def profile_history_api(request):
+    form, queryset = _filtered_history(request)
+    if queryset is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    try:
+        rows, next_cursor = history_page(queryset, form.cleaned_data['cursor'])
+    except ValueError as exc:
+        return JsonResponse({'errors': {'cursor': [str(exc)]}}, status=400)
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
+
+
+@login_required
+def profile_history_export(request):
+    form, queryset = _filtered_history(request)
+    if queryset is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    # Потоковая выгрузка: строки читаются из БД порциями через iterator()
+    if form.cleaned_data['format'] == 'json':
+        response = StreamingHttpResponse(iter_json(queryset), content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename="history.json"'
+    else:
+        response = StreamingHttpResponse(iter_csv(queryset), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="history.csv"'
+    return response
+
+
+@login_required
+@require_GET
+def search_api(request):
+    form = SearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    # Ученикам - без поиска по правильным ответам, иначе поиск подсказывает ответы
+    results = search(data['q'], data['level'] or None, data['limit'] or 20, answers=request.user.is_staff)
+    return JsonResponse({'results': results})
+
+
+@staff_member_required
+@require_GET
+def analytics_api(request):
+    # Только таблицы счётчиков (analytics.py), без агрегатов по прогрессу пользователей
+    form = AnalyticsFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    level, lesson = form.cleaned_data['level'], form.cleaned_data['lesson']
+
+    stats = LessonStats.objects.order_by('level', 'lesson')
+    if level:
+        stats = stats.filter(level=level)
+    if lesson:
+        stats = stats.filter(lesson=lesson)
+    data = {'lessons': [
+        {
+            'level': row.level, 'lesson': row.lesson, 'attempts': row.attempts,
+            'average': row.average, 'histogram': row.get_histogram(),
+        }
+        for row in stats
+    ]}
+
+    if lesson:
+        tasks = Task.objects.filter(lesson__language_level__level=level, lesson__lesson_number=lesson)
+        data['tasks'] = []
+        for task in tasks.select_related('stats').order_by('position'):
+            task_stats = getattr(task, 'stats', None)
+            data['tasks'].append({
+                'id': task.id, 'position': task.position, 'question': task.question,
+                'attempts': task_stats.attempts if task_stats else 0,
+                'correct': task_stats.correct if task_stats else 0,
+                'correct_rate': task_stats.correct_rate if task_stats else None,
+            })
+    return JsonResponse(data)
+
+
+@require_safe  # HEAD - плееры проверяют размер и Accept-Ranges
+def audio_view(request, pk):
+    audio = get_object_or_404(Audio, pk=pk)
+    rendition = audio.get_renditions().get(request.GET.get('rendition', ''))
+    if rendition:
+        return serve_file(request, rendition['name'])
+    if audio.audio_file:
+        return serve_file(request, audio.audio_file.name)
+    if audio.audio_url:
+        return redirect(audio.audio_url)
+    raise Http404('Аудиофайл не найден')
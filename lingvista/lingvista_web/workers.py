@@ -0,0 +1,18 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+_executor = None
+
+
+def get_executor():
+    """Общий пул процессов для фоновой обработки загрузок (аудио, фото)."""
+    global _executor
+    if _executor is None:
+        # spawn: дочерние процессы не наследуют соединения с БД
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _executor